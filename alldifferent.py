@@ -0,0 +1,210 @@
+import variable
+import domain
+import assignment
+import space
+from relation import DiscreteRelation
+from collections import deque
+from collections.abc import Iterator, Iterable
+from typing import Optional
+
+
+def _distinct(*values) -> bool:
+    return len(set(values)) == len(values)
+
+
+class AllDifferentRelation(DiscreteRelation):
+    """
+    Every input takes a different value, filtered to generalized arc consistency in one revision (Régin):
+    a value stays in a domain only if some maximum matching of the inputs to their values uses it, which is
+    found from one matching through the strongly connected components of its alternating graph
+    The matching is kept between revisions and only repaired where values it used were removed
+    """
+    _transient = DiscreteRelation._transient + ("_matching",)
+
+    def __init__(self, variables: Iterable[variable.Variable]):
+        variables = list(variables)
+        if len(set(variables)) != len(variables):
+            raise ValueError("All different relations can't repeat variables")
+        super().__init__(variables, _distinct)
+
+    def _reset_transient(self) -> None:
+        super()._reset_transient()
+        # Value matched to each input, or None
+        self._matching: list = [None] * len(self._inputs)
+
+    def _match(self, doms: list[domain.Domain]) -> Optional[int]:
+        """
+        Repairs the matching to a maximum one within doms
+        Returns the position of an input that can't be matched, or None if every input is
+        """
+        matching = self._matching
+        owner = {}
+        for i, val in enumerate(matching):
+            if val is not None and val in doms[i]:
+                owner[val] = i
+            else:
+                matching[i] = None
+        for start in range(len(doms)):
+            if matching[start] is not None:
+                continue
+            # Breadth first search for an augmenting path: parent maps each value reached to the input it was reached from
+            parent = {}
+            queue = deque([start])
+            end = None
+            while queue and end is None:
+                i = queue.popleft()
+                for val in doms[i]:
+                    if val in parent:
+                        continue
+                    parent[val] = i
+                    if val not in owner:
+                        end = val
+                        break
+                    queue.append(owner[val])
+            if end is None:
+                return start
+            val = end
+            while True:
+                i = parent[val]
+                previous = matching[i]
+                matching[i] = val
+                owner[val] = i
+                if i == start:
+                    break
+                val = previous
+        return None
+
+    def _consistent_values(self, doms: list[domain.Domain]) -> list[set]:
+        """
+        For each input, the values of its domain that belong to some maximum matching
+        Nodes of the alternating graph are inputs 0..n-1 and values n..; matched edges go from inputs
+        to their values, the others from values to the inputs that could take them
+        """
+        n = len(doms)
+        matching = self._matching
+        value_ids = {}
+        for dom in doms:
+            for val in dom:
+                if val not in value_ids:
+                    value_ids[val] = n + len(value_ids)
+        adjacency: list[list[int]] = [[value_ids[matching[i]]] for i in range(n)] + [[] for _ in value_ids]
+        for i, dom in enumerate(doms):
+            for val in dom:
+                if val != matching[i]:
+                    adjacency[value_ids[val]].append(i)
+
+        # Values reachable from a free value can be freed by swapping along the path that reaches them
+        free = set(value_ids.values()) - {value_ids[val] for val in matching}
+        reachable = set(free)
+        queue = deque(free)
+        while queue:
+            for node in adjacency[queue.popleft()]:
+                if node not in reachable:
+                    reachable.add(node)
+                    queue.append(node)
+
+        component = _strongly_connected_components(adjacency)
+        ret = []
+        for i, dom in enumerate(doms):
+            ret.append({val for val in dom if val == matching[i] or value_ids[val] in reachable
+                        or component[value_ids[val]] == component[i]})
+        return ret
+
+    def revise(self, given_space: space.TrailedSpace, modified: Optional[set[variable.Variable]] = None) -> list[variable.Variable]:
+        inputs = self._inputs
+        doms = [given_space[var] for var in inputs]
+        unmatched = self._match(doms)
+        if unmatched is not None:
+            # Not enough values to go around: wipe out the input that couldn't be matched
+            var = inputs[unmatched]
+            for val in list(doms[unmatched]):
+                given_space.remove(var, val)
+            return [var]
+        changed = []
+        for var, dom, consistent in zip(inputs, doms, self._consistent_values(doms)):
+            if len(consistent) < len(dom):
+                for val in [val for val in dom if val not in consistent]:
+                    given_space.remove(var, val)
+                changed.append(var)
+        return changed
+
+    def revision_cost(self, given_space: space.Space) -> float:
+        # Linear in the edges of the value graph, with a few passes over them
+        return 4 * sum(len(given_space[var]) for var in self._inputs)
+
+    def satisfying_assignments(self, given_space: Optional[space.DiscreteSpace] = None) -> Iterator[assignment.Assignment]:
+        if given_space is None:
+            given_space = self._space_type()
+        doms = [given_space[var] for var in self._inputs]
+        if not doms:
+            yield assignment.Assignment()
+            return
+        # Smallest domains first, skipping values already taken
+        order = sorted(range(len(doms)), key=lambda i: len(doms[i]))
+        values = [None] * len(doms)
+        used = set()
+        stack = [iter(doms[order[0]])]
+        while stack:
+            depth = len(stack) - 1
+            if values[order[depth]] is not None:
+                used.discard(values[order[depth]])
+                values[order[depth]] = None
+            val = next((v for v in stack[-1] if v not in used), _EXHAUSTED)
+            if val is _EXHAUSTED:
+                stack.pop()
+                continue
+            values[order[depth]] = val
+            used.add(val)
+            if depth + 1 == len(doms):
+                yield assignment.Assignment(dict(zip(self._inputs, values)))
+            else:
+                stack.append(iter(doms[order[depth + 1]]))
+
+
+_EXHAUSTED = object()
+
+
+def _strongly_connected_components(adjacency: list[list[int]]) -> list[int]:
+    """
+    Iterative Tarjan, returns the component id of every node
+    """
+    n = len(adjacency)
+    index = [-1] * n
+    low = [0] * n
+    component = [-1] * n
+    on_stack = [False] * n
+    stack = []
+    counter = 0
+    components = 0
+    for root in range(n):
+        if index[root] != -1:
+            continue
+        work = [(root, 0)]
+        while work:
+            node, edge = work[-1]
+            if edge == 0:
+                index[node] = low[node] = counter
+                counter += 1
+                stack.append(node)
+                on_stack[node] = True
+            if edge < len(adjacency[node]):
+                work[-1] = (node, edge + 1)
+                nxt = adjacency[node][edge]
+                if index[nxt] == -1:
+                    work.append((nxt, 0))
+                elif on_stack[nxt]:
+                    low[node] = min(low[node], index[nxt])
+                continue
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                low[parent] = min(low[parent], low[node])
+            if low[node] == index[node]:
+                while True:
+                    member = stack.pop()
+                    on_stack[member] = False
+                    component[member] = components
+                    if member == node:
+                        break
+                components += 1
+    return component
@@ -0,0 +1,99 @@
+import asyncio
+import relation
+import network
+import assignment
+import solver
+from collections.abc import AsyncIterator, Iterable
+from typing import Optional
+
+
+class AsyncSearch:
+    """
+    BacktrackingSearch for asyncio code: the search runs in the event loop thread, handing control back to
+    the loop every yield_interval nodes, so other tasks keep running while it does
+    Cancelling the task that awaits it stops the search at its next pause, and so does cancel;
+    timeout and max_nodes end it without an error, leaving stopped and stop_reason set
+    """
+
+    def __init__(self, constraints: Iterable[relation.DiscreteRelation] | network.ConstraintNetwork,
+                 propagation: solver.Propagation = solver.Propagation.MAC, yield_interval: int = 64, **options):
+        """
+        options are passed on to solver.BacktrackingSearch, e.g. timeout, max_nodes, on_progress and progress_interval
+        """
+        if yield_interval <= 0:
+            raise ValueError("yield_interval must be positive")
+        self._search = solver.BacktrackingSearch(constraints, propagation, **options)
+        self._yield_interval = yield_interval
+
+    @property
+    def search(self) -> solver.BacktrackingSearch:
+        """
+        The underlying search, for its counters
+        """
+        return self._search
+
+    @property
+    def stopped(self) -> bool:
+        return self._search.stopped
+
+    @property
+    def stop_reason(self) -> Optional[str]:
+        return self._search.stop_reason
+
+    def cancel(self) -> None:
+        self._search.cancel()
+
+    def progress(self) -> solver.Progress:
+        return self._search.progress()
+
+    async def solutions(self, limit: Optional[int] = None) -> AsyncIterator[assignment.Assignment]:
+        """
+        Yields every solution, or the first limit of them, for use with async for
+        """
+        if limit is not None and limit <= 0:
+            return
+        found = 0
+        steps = self._search._search(self._yield_interval)
+        try:
+            for values in steps:
+                if values is None:
+                    await asyncio.sleep(0)
+                    continue
+                found += 1
+                yield assignment.Assignment(values)
+                if found == limit:
+                    return
+        finally:
+            steps.close()
+
+    def __aiter__(self) -> AsyncIterator[assignment.Assignment]:
+        return self.solutions()
+
+    async def solve(self) -> assignment.Assignment:
+        """
+        Returns the first solution found, or an empty assignment if there is none or the search stopped first
+        """
+        async for ret in self.solutions(1):
+            return ret
+        return assignment.Assignment()
+
+    async def count_solutions(self, limit: Optional[int] = None) -> int:
+        count = 0
+        async for _ in self.solutions(limit):
+            count += 1
+        return count
+
+
+async def solve(constraints: Iterable[relation.DiscreteRelation] | network.ConstraintNetwork,
+                propagation: solver.Propagation = solver.Propagation.MAC, **options) -> assignment.Assignment:
+    """
+    options are passed on to AsyncSearch, e.g. yield_interval, timeout and max_nodes
+    Use AsyncSearch directly to tell a problem without solutions apart from a search that stopped early
+    """
+    return await AsyncSearch(constraints, propagation, **options).solve()
+
+
+def solutions(constraints: Iterable[relation.DiscreteRelation] | network.ConstraintNetwork,
+              propagation: solver.Propagation = solver.Propagation.MAC, limit: Optional[int] = None,
+              **options) -> AsyncIterator[assignment.Assignment]:
+    return AsyncSearch(constraints, propagation, **options).solutions(limit)
@@ -0,0 +1,4 @@
+"""
+Standard CSP workloads and a runner that times the solvers on them
+Run from the repository root: python -m benchmarks.runner --help
+"""
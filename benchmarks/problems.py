@@ -0,0 +1,167 @@
+import itertools
+import math
+import operator
+import random
+import domain
+import variable
+import relation
+import table
+from alldifferent import AllDifferentRelation
+from functools import partial
+from typing import Optional
+
+# Variable names are global, so every generated problem gets its own prefix
+_instances = itertools.count()
+
+
+class Problem:
+    """
+    A generated workload: its relations, its variables and the parameters it was generated from
+    task is "first" to look for one solution, or "count" to enumerate all of them
+    """
+
+    def __init__(self, name: str, params: dict, constraints: list[relation.DiscreteRelation],
+                 variables: list[variable.Variable], task: str = "first"):
+        self.name = name
+        self.params = params
+        self.constraints = constraints
+        self.variables = variables
+        self.task = task
+
+    @property
+    def space_size(self) -> int:
+        """
+        Number of complete assignments, which is what brute force enumerates
+        """
+        return math.prod(len(var.domain) for var in self.variables)
+
+    def __str__(self) -> str:
+        return self.name + "".join(f" {key}={val}" for key, val in self.params.items())
+
+
+def _variables(kind: str, count: int, values) -> list[variable.Variable]:
+    prefix = f"{kind}{next(_instances)}_"
+    return [variable.Variable(domain.BitsetDomain(values), f"{prefix}{i}") for i in range(count)]
+
+
+def _not_attacking(distance: int, a: int, b: int) -> bool:
+    return a != b and abs(a - b) != distance
+
+
+def _next_to(a: int, b: int) -> bool:
+    return abs(a - b) == 1
+
+
+def _right_of(a: int, b: int) -> bool:
+    return a == b + 1
+
+
+def _all_different(vars: list[variable.Variable], global_constraint: bool) -> list[relation.DiscreteRelation]:
+    if global_constraint:
+        return [AllDifferentRelation(vars)]
+    return [relation.DiscreteRelation([a, b], operator.ne) for a, b in itertools.combinations(vars, 2)]
+
+
+def queens(n: int = 8, task: str = "first") -> Problem:
+    """
+    n queens on an n x n board, one variable per column holding the row of its queen
+    """
+    vars = _variables("queen", n, range(n))
+    constraints = [relation.DiscreteRelation([vars[i], vars[j]], partial(_not_attacking, j - i))
+                   for i, j in itertools.combinations(range(n), 2)]
+    return Problem("queens", {"n": n}, constraints, vars, task)
+
+
+# Arto Inkala's "hardest sudoku", which arc consistency alone doesn't solve
+SUDOKU_GRID = "800000000003600000070090200050007000000045700000100030001000068008500010090000400"
+
+
+def sudoku(grid: str = SUDOKU_GRID, alldifferent: bool = False) -> Problem:
+    """
+    9 x 9 sudoku given row by row, with 0 (or .) for empty cells
+    Rows, columns and boxes are AllDifferentRelations if alldifferent, otherwise pairwise !=
+    """
+    grid = grid.replace(".", "0")
+    if len(grid) != 81:
+        raise ValueError("A sudoku grid has 81 cells")
+    prefix = f"cell{next(_instances)}_"
+    vars = [variable.Variable(domain.BitsetDomain(range(1, 10)) if c == "0" else domain.BitsetDomain([int(c)]), f"{prefix}{i}")
+            for i, c in enumerate(grid)]
+    units = [[r * 9 + c for c in range(9)] for r in range(9)]
+    units += [[r * 9 + c for r in range(9)] for c in range(9)]
+    units += [[(br + r) * 9 + bc + c for r in range(3) for c in range(3)] for br in range(0, 9, 3) for bc in range(0, 9, 3)]
+    if alldifferent:
+        constraints = [AllDifferentRelation([vars[i] for i in unit]) for unit in units]
+    else:
+        # Cells share both a row (or column) and a box, and only need one != between them
+        pairs = dict.fromkeys((min(a, b), max(a, b)) for unit in units for a, b in itertools.combinations(unit, 2))
+        constraints = [relation.DiscreteRelation([vars[a], vars[b]], operator.ne) for a, b in pairs]
+    return Problem("sudoku", {"clues": sum(c != "0" for c in grid), "alldifferent": alldifferent}, constraints, vars)
+
+
+def graph_coloring(nodes: int = 40, edge_probability: float = 0.25, colors: int = 4, seed: int = 0) -> Problem:
+    """
+    Coloring of a G(nodes, edge_probability) random graph
+    """
+    rnd = random.Random(seed)
+    vars = _variables("node", nodes, range(colors))
+    constraints = [relation.DiscreteRelation([vars[a], vars[b]], operator.ne)
+                   for a, b in itertools.combinations(range(nodes), 2) if rnd.random() < edge_probability]
+    return Problem("graph_coloring", {"nodes": nodes, "edge_probability": edge_probability, "colors": colors, "seed": seed},
+                   constraints, vars)
+
+
+def zebra(alldifferent: bool = False) -> Problem:
+    """
+    The classic zebra puzzle, with each attribute's variables holding the house (1 to 5) that has it
+    """
+    groups = {
+        "color": ["red", "green", "ivory", "yellow", "blue"],
+        "nationality": ["english", "spaniard", "ukrainian", "norwegian", "japanese"],
+        "drink": ["coffee", "tea", "milk", "orange_juice", "water"],
+        "smoke": ["old_gold", "kools", "chesterfield", "lucky_strike", "parliament"],
+        "pet": ["dog", "snails", "fox", "horse", "zebra"],
+    }
+    prefix = f"zebra{next(_instances)}_"
+    v = {name: variable.Variable(domain.BitsetDomain(range(1, 6)), prefix + name) for names in groups.values() for name in names}
+    constraints = [rel for names in groups.values() for rel in _all_different([v[name] for name in names], alldifferent)]
+
+    def same(a: str, b: str) -> relation.DiscreteRelation:
+        return relation.DiscreteRelation([v[a], v[b]], operator.eq)
+
+    constraints += [
+        same("english", "red"),
+        same("spaniard", "dog"),
+        same("coffee", "green"),
+        same("ukrainian", "tea"),
+        relation.DiscreteRelation([v["green"], v["ivory"]], _right_of),
+        same("old_gold", "snails"),
+        same("kools", "yellow"),
+        relation.DiscreteRelation([v["milk"]], partial(operator.eq, 3)),
+        relation.DiscreteRelation([v["norwegian"]], partial(operator.eq, 1)),
+        relation.DiscreteRelation([v["chesterfield"], v["fox"]], _next_to),
+        relation.DiscreteRelation([v["kools"], v["horse"]], _next_to),
+        same("lucky_strike", "orange_juice"),
+        same("japanese", "parliament"),
+        relation.DiscreteRelation([v["norwegian"], v["blue"]], _next_to),
+    ]
+    return Problem("zebra", {"alldifferent": alldifferent}, constraints, list(v.values()))
+
+
+def model_rb(n: int = 30, alpha: float = 0.8, r: float = 0.8, p: float = 0.55, seed: int = 0,
+             domain_size: Optional[int] = None) -> Problem:
+    """
+    Random binary CSP from model RB: n variables with domains of n^alpha values, r n ln(n) constraints
+    on random pairs, each forbidding a fraction p (the tightness) of the possible pairs of values
+    Instances get hard around p = 1 - exp(-alpha / r)
+    """
+    rnd = random.Random(seed)
+    d = domain_size if domain_size is not None else max(2, round(n ** alpha))
+    vars = _variables("rb", n, range(d))
+    pairs = list(itertools.product(range(d), repeat=2))
+    forbidden = round(p * d * d)
+    constraints = []
+    for _ in range(round(r * n * math.log(n))):
+        a, b = rnd.sample(range(n), 2)
+        constraints.append(table.TableRelation([vars[a], vars[b]], rnd.sample(pairs, forbidden), allowed=False))
+    return Problem("model_rb", {"n": n, "alpha": alpha, "r": r, "p": p, "seed": seed, "domain_size": d}, constraints, vars)
@@ -0,0 +1,225 @@
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import tracemalloc
+from datetime import datetime, timezone
+from time import perf_counter
+from collections.abc import Callable
+from typing import Optional
+import heuristics
+import main
+import parallel
+import relation
+import solver
+import stats
+from benchmarks import problems
+
+# Engines that go through (nearly) every complete assignment are skipped on problems with more of them than this
+# Brute force checks each relation as soon as its scope is bound, backtracking without propagation only at the leaves
+_BRUTE_FORCE_LIMIT = 10 ** 8
+_UNPROPAGATED_LIMIT = 10 ** 6
+
+
+class Engine:
+    """
+    A way of solving a problem, run either for the first solution or for all of them
+    first returns whether a solution was found, count the number of solutions
+    """
+
+    def __init__(self, name: str, first: Callable[[problems.Problem], bool], count: Optional[Callable[[problems.Problem], int]] = None,
+                 max_space: Optional[int] = None, in_process: bool = True, searches: bool = True):
+        self.name = name
+        self._first = first
+        self._count = count
+        self.max_space = max_space
+        # Memory can only be measured for engines that run in this process, and node counts only for those
+        # that also go through BacktrackingSearch
+        self.in_process = in_process
+        self.searches = searches and in_process
+
+    def supports(self, problem: problems.Problem) -> bool:
+        if problem.task == "count" and self._count is None:
+            return False
+        return self.max_space is None or problem.space_size <= self.max_space
+
+    def __call__(self, problem: problems.Problem) -> int:
+        if problem.task == "count":
+            return self._count(problem)
+        return int(self._first(problem))
+
+
+def _search_engine(name: str, propagation: solver.Propagation, max_space: Optional[int] = None, **options) -> Engine:
+    def first(problem: problems.Problem) -> bool:
+        return bool(main.backtracking_solver(problem.constraints, propagation, **options))
+
+    def count(problem: problems.Problem) -> int:
+        return solver.count_solutions(problem.constraints, propagation, **options)
+
+    return Engine(name, first, count, max_space)
+
+
+def _brute_force_first(problem: problems.Problem) -> bool:
+    return next(iter(relation.ConjunctionRelation(problem.constraints).satisfying_assignments()), None) is not None
+
+
+def _brute_force_count(problem: problems.Problem) -> int:
+    return sum(1 for _ in relation.ConjunctionRelation(problem.constraints).satisfying_assignments())
+
+
+def _parallel_first(problem: problems.Problem) -> bool:
+    return bool(parallel.solve(problem.constraints, solver.Propagation.MAC))
+
+
+def _parallel_count(problem: problems.Problem) -> int:
+    return parallel.count_solutions(problem.constraints, solver.Propagation.MAC)
+
+
+# Orderings keep state, so engines that use them build fresh ones on every run
+ENGINES: dict[str, Callable[[], Engine]] = {
+    "brute_force": lambda: Engine("brute_force", _brute_force_first, _brute_force_count, _BRUTE_FORCE_LIMIT, searches=False),
+    "backtracking": lambda: _search_engine("backtracking", solver.Propagation.NONE, _UNPROPAGATED_LIMIT),
+    "forward_checking": lambda: _search_engine("forward_checking", solver.Propagation.FORWARD_CHECKING),
+    "mac": lambda: _search_engine("mac", solver.Propagation.MAC),
+    "mac_domwdeg": lambda: _search_engine("mac_domwdeg", solver.Propagation.MAC, variable_ordering=heuristics.DomWDeg()),
+    "mac_backjumping": lambda: _search_engine("mac_backjumping", solver.Propagation.MAC, backjumping=True, nogood_store=1000),
+    "parallel": lambda: Engine("parallel", _parallel_first, _parallel_count, in_process=False),
+}
+
+SUITES: dict[str, list[Callable[[], problems.Problem]]] = {
+    "quick": [
+        lambda: problems.queens(6, task="count"),
+        lambda: problems.queens(8, task="count"),
+        lambda: problems.queens(20),
+        lambda: problems.sudoku(),
+        lambda: problems.sudoku(alldifferent=True),
+        lambda: problems.graph_coloring(40, 0.25, 4),
+        lambda: problems.zebra(),
+        lambda: problems.zebra(alldifferent=True),
+        lambda: problems.model_rb(30, p=0.55),
+    ],
+    "full": [
+        lambda: problems.queens(6, task="count"),
+        lambda: problems.queens(8, task="count"),
+        lambda: problems.queens(10, task="count"),
+        lambda: problems.queens(50),
+        lambda: problems.sudoku(),
+        lambda: problems.sudoku(alldifferent=True),
+        lambda: problems.graph_coloring(60, 0.15, 4),
+        lambda: problems.zebra(),
+        lambda: problems.zebra(alldifferent=True),
+        lambda: problems.model_rb(30, p=0.55),
+        lambda: problems.model_rb(30, p=0.6),
+        lambda: problems.model_rb(40, p=0.55),
+    ],
+}
+
+
+def measure(make_problem: Callable[[], problems.Problem], make_engine: Callable[[], Engine], repeat: int) -> Optional[dict]:
+    """
+    Median of repeat timed runs, then one run recording statistics and one tracking peak memory,
+    kept apart so that neither kind of measurement skews the times
+    Returns None if the engine doesn't handle the problem
+    """
+    problem = make_problem()
+    engine = make_engine()
+    if not engine.supports(problem):
+        return None
+    times = []
+    solutions = None
+    for _ in range(repeat):
+        # Relations remember how effective their revisions were, so every run gets a fresh problem
+        problem, engine = make_problem(), make_engine()
+        start = perf_counter()
+        solutions = engine(problem)
+        times.append(perf_counter() - start)
+
+    ret = {
+        "problem": problem.name,
+        "params": problem.params,
+        "task": problem.task,
+        "engine": engine.name,
+        "solutions": solutions,
+        "times": times,
+        "median_time": statistics.median(times),
+        "nodes": None,
+        "backtracks": None,
+        "revisions": None,
+        "predicate_calls": None,
+        "peak_memory": None,
+    }
+    if engine.searches:
+        problem, engine = make_problem(), make_engine()
+        with stats.SolverStats() as recorded:
+            engine(problem)
+        ret.update(nodes=recorded.nodes, backtracks=recorded.backtracks, revisions=recorded.revisions,
+                   predicate_calls=recorded.predicate_calls)
+    if engine.in_process:
+        problem, engine = make_problem(), make_engine()
+        tracemalloc.start()
+        try:
+            engine(problem)
+            ret["peak_memory"] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return ret
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(suite: str = "quick", engines: Optional[list[str]] = None, problem_names: Optional[list[str]] = None,
+        repeat: int = 3, log: Optional[Callable[[str], None]] = print) -> dict:
+    """
+    Runs every engine on every problem of the suite, returns the report that the command line writes out as JSON
+    """
+    results = []
+    for make_problem in SUITES[suite]:
+        problem = make_problem()
+        if problem_names and problem.name not in problem_names:
+            continue
+        for name in engines or ENGINES:
+            result = measure(make_problem, ENGINES[name], repeat)
+            if result is None:
+                continue
+            results.append(result)
+            if log is not None:
+                memory = "-" if result["peak_memory"] is None else f"{result['peak_memory'] / 1024:.0f} KiB"
+                nodes = "-" if result["nodes"] is None else result["nodes"]
+                log(f"{str(problem):<50} {name:<18} {result['median_time']:>9.4f}s {nodes:>10} nodes {memory:>12}")
+    return {
+        "meta": {
+            "suite": suite,
+            "repeat": repeat,
+            "date": datetime.now(timezone.utc).isoformat(),
+            "revision": _git_revision(),
+            "python": sys.version,
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+
+
+def main_cli(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Times the solvers on standard CSP workloads")
+    parser.add_argument("--suite", choices=sorted(SUITES), default="quick")
+    parser.add_argument("--engines", nargs="+", choices=sorted(ENGINES), help="engines to run, all by default")
+    parser.add_argument("--problems", nargs="+", help="problem names to run, e.g. queens sudoku, all by default")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per problem and engine")
+    parser.add_argument("--output", help="where to write the JSON report")
+    args = parser.parse_args(argv)
+
+    report = run(args.suite, args.engines, args.problems, args.repeat)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,213 @@
+import math
+import network
+import space
+import variable
+from collections import deque
+from enum import Enum
+from time import perf_counter
+from collections.abc import Iterable
+from typing import Optional
+
+
+class Consistency(Enum):
+    # What propagation already enforces: generalized arc consistency, as far as each relation's revise goes
+    ARC = "arc"
+    # Arc consistency, plus: a value with a single support on a binary relation loses it unless every third
+    # variable linked to both by binary relations has a value compatible with the pair
+    RESTRICTED_PATH = "restricted_path"
+    # A value stays only if assigning it and propagating doesn't wipe out a domain
+    SINGLETON_ARC = "singleton_arc"
+
+
+class ConsistencyReport:
+    """
+    How much one preprocessing level pruned, measured on the space as that level found it
+    Search space sizes are kept as log10 of the product of the domain sizes
+    """
+
+    def __init__(self, level: Consistency):
+        self.level = level
+        self.removed: int = 0
+        self.log_size_before: float = 0.0
+        self.log_size_after: float = 0.0
+        # Values tentatively assigned (singleton arc consistency) or pairs checked for a third value (restricted path)
+        self.checks: int = 0
+        self.time: float = 0.0
+        self.consistent: bool = True
+
+    @property
+    def reduction(self) -> float:
+        """
+        Orders of magnitude taken off the search space
+        """
+        return self.log_size_before - self.log_size_after
+
+    def as_dict(self) -> dict:
+        return {
+            "level": self.level.value,
+            "removed": self.removed,
+            "log_size_before": self.log_size_before,
+            "log_size_after": self.log_size_after,
+            "reduction": self.reduction,
+            "checks": self.checks,
+            "time": self.time,
+            "consistent": self.consistent,
+        }
+
+    def __str__(self) -> str:
+        if not self.consistent:
+            return f"{self.level.value}: inconsistent after {self.checks} checks, {self.time:.3f}s"
+        return (f"{self.level.value}: removed {self.removed} values, search space 10^{self.log_size_before:.1f} -> "
+                f"10^{self.log_size_after:.1f}, {self.checks} checks, {self.time:.3f}s")
+
+
+def _log_size(given_space: space.Space, vars: Iterable[variable.Variable]) -> float:
+    ret = 0.0
+    for var in vars:
+        size = len(given_space[var])
+        if not size:
+            return -math.inf
+        ret += math.log10(size)
+    return ret
+
+
+def _removed_values(given_space: space.TrailedSpace, checkpoint: int) -> Iterable[tuple[variable.Variable, object]]:
+    for i in range(checkpoint, given_space.checkpoint()):
+        var, val = given_space.trail_entry(i)
+        # Interval domains trail whole ranges of values at once
+        if isinstance(val, range):
+            for v in val:
+                yield var, v
+        else:
+            yield var, val
+
+
+def singleton_arc_consistency(constraints: network.ConstraintNetwork, given_space: space.TrailedSpace, report: ConsistencyReport) -> bool:
+    """
+    Prunes given_space in place to singleton arc consistency, returns False if some domain was wiped out
+    given_space must already be arc consistent
+    A value that passed its test only needs testing again once some value left after assigning it is removed,
+    since propagation from the assignment would otherwise reach the same fixpoint
+    """
+    vars = constraints.variables
+    pending = deque((var, val) for var in vars if len(given_space[var]) > 1 for val in given_space[var])
+    queued = set(pending)
+    # (var, val) -> the tested values whose propagation left val in the domain of var
+    dependents: dict[tuple[variable.Variable, object], list[tuple[variable.Variable, object]]] = {}
+    while pending:
+        tested = pending.popleft()
+        queued.discard(tested)
+        var, val = tested
+        if val not in given_space[var] or len(given_space[var]) == 1:
+            continue
+        report.checks += 1
+        checkpoint = given_space.checkpoint()
+        given_space.assign(var, val)
+        survives = constraints.propagate(given_space, updated_variable=var)
+        if survives:
+            for other in vars:
+                for kept in given_space[other]:
+                    dependents.setdefault((other, kept), []).append(tested)
+        given_space.restore(checkpoint)
+        if survives:
+            continue
+
+        given_space.remove(var, val)
+        if not given_space[var] or not constraints.propagate(given_space, updated_variable=var):
+            return False
+        for removed in _removed_values(given_space, checkpoint):
+            for retest in dependents.pop(removed, ()):
+                if retest not in queued:
+                    queued.add(retest)
+                    pending.append(retest)
+    return True
+
+
+def restricted_path_consistency(constraints: network.ConstraintNetwork, given_space: space.TrailedSpace, report: ConsistencyReport) -> bool:
+    """
+    Prunes given_space in place to restricted path consistency, returns False if some domain was wiped out
+    given_space must already be arc consistent
+    Only binary relations take part in the path checks, wider ones are still enforced through propagation
+    """
+    # Binary relations between each ordered pair of variables
+    pairs: dict[tuple[variable.Variable, variable.Variable], list] = {}
+    for rel in constraints:
+        scope = list(dict.fromkeys(rel._inputs))
+        if len(scope) != 2:
+            continue
+        x, y = scope
+        pairs.setdefault((x, y), []).append(rel)
+        pairs.setdefault((y, x), []).append(rel)
+    linked: dict[variable.Variable, set[variable.Variable]] = {}
+    for x, y in pairs:
+        linked.setdefault(x, set()).add(y)
+
+    def compatible(x: variable.Variable, a, y: variable.Variable, b) -> bool:
+        values = {x: a, y: b}
+        return all(rel._satisfies(*(values[v] for v in rel._inputs)) for rel in pairs[(x, y)])
+
+    def supported(x: variable.Variable, a) -> bool:
+        for y in linked.get(x, ()):
+            supports = []
+            for b in given_space[y]:
+                if compatible(x, a, y, b):
+                    supports.append(b)
+                    if len(supports) > 1:
+                        break
+            if not supports:
+                return False
+            if len(supports) > 1:
+                continue
+            # The only support has to extend to every variable linked to both
+            b = supports[0]
+            for z in linked[x] & linked.get(y, set()):
+                report.checks += 1
+                if not any(compatible(x, a, z, c) and compatible(y, b, z, c) for c in given_space[z]):
+                    return False
+        return True
+
+    changed = True
+    while changed:
+        changed = False
+        for x in list(linked):
+            unsupported = [a for a in given_space[x] if not supported(x, a)]
+            if not unsupported:
+                continue
+            changed = True
+            for a in unsupported:
+                given_space.remove(x, a)
+            if not given_space[x] or not constraints.propagate(given_space, updated_variable=x):
+                return False
+    return True
+
+
+def preprocess(relations: Iterable | network.ConstraintNetwork, current_space: Optional[space.Space] = None,
+               levels: Iterable[Consistency] = (Consistency.ARC,)) -> tuple[space.TrailedSpace, list[ConsistencyReport]]:
+    """
+    Prunes a copy of current_space with each level in turn, leaving current_space untouched
+    Returns the pruned space and a report per level, stopping after the first level that finds the problem
+    inconsistent (the space then has an empty domain)
+    Stronger levels first enforce arc consistency, which is attributed to them unless ARC comes before them
+    """
+    constraints = relations if isinstance(relations, network.ConstraintNetwork) else network.ConstraintNetwork(relations)
+    vars = constraints.variables if current_space is None else dict.fromkeys(constraints.variables) | dict.fromkeys(current_space.variables())
+    ret_space = space.TrailedSpace(vars) if current_space is None else space.TrailedSpace.from_space(current_space, vars)
+    reports = []
+    for level in levels:
+        report = ConsistencyReport(level)
+        reports.append(report)
+        start = perf_counter()
+        checkpoint = ret_space.checkpoint()
+        report.log_size_before = _log_size(ret_space, vars)
+        consistent = all(ret_space[var] for var in vars) and constraints.propagate(ret_space)
+        if consistent and level is Consistency.RESTRICTED_PATH:
+            consistent = restricted_path_consistency(constraints, ret_space, report)
+        elif consistent and level is Consistency.SINGLETON_ARC:
+            consistent = singleton_arc_consistency(constraints, ret_space, report)
+        report.consistent = consistent
+        report.removed = sum(1 for _ in _removed_values(ret_space, checkpoint))
+        report.log_size_after = _log_size(ret_space, vars)
+        report.time = perf_counter() - start
+        if not consistent:
+            break
+    return ret_space, reports
@@ -0,0 +1,420 @@
+import copy
+import itertools
+import network
+import relation
+import variable
+import domain
+import assignment
+import space
+import solver
+import heuristics
+import nogoods
+from collections import deque
+from collections.abc import Iterable, Iterator
+from typing import Optional
+
+
+def components(constraints: Iterable[relation.DiscreteRelation] | network.ConstraintNetwork) -> list[list[relation.DiscreteRelation]]:
+    """
+    Splits the relations into groups that share no variables, directly or through other relations
+    Groups come in the order of their first relation
+    """
+    if not isinstance(constraints, network.ConstraintNetwork):
+        constraints = network.ConstraintNetwork(constraints)
+    # Union-find over variable ids
+    parent = list(range(len(constraints.variables)))
+
+    def find(v: int) -> int:
+        while parent[v] != v:
+            parent[v] = parent[parent[v]]
+            v = parent[v]
+        return v
+
+    rels = constraints.relations
+    for r in range(len(rels)):
+        scope = constraints.scope(r)
+        for v in scope[1:]:
+            parent[find(v)] = find(scope[0])
+    groups: dict[int, list[relation.DiscreteRelation]] = {}
+    for r, rel in enumerate(rels):
+        scope = constraints.scope(r)
+        # Relations without variables are all put with the first group
+        root = find(scope[0]) if scope else next(iter(groups), -1)
+        groups.setdefault(root, []).append(rel)
+    return list(groups.values())
+
+
+class _Forest:
+    """
+    Binary relations without cycles, solved without backtracking: directional arc consistency from the leaves
+    up leaves every value of a parent with a support in each child, so values can be chosen from the roots down
+    Relations on a single variable filter its domain first
+    """
+
+    def __init__(self, vars: Iterable[variable.Variable], relations: Iterable[relation.DiscreteRelation]):
+        self._vars = list(dict.fromkeys(vars))
+        self._unary: dict[variable.Variable, list[relation.DiscreteRelation]] = {}
+        # Relations between each pair of linked variables, under both orders
+        self._edges: dict[tuple[variable.Variable, variable.Variable], list[relation.DiscreteRelation]] = {}
+        linked: dict[variable.Variable, list[variable.Variable]] = {var: [] for var in self._vars}
+        for rel in relations:
+            scope = list(dict.fromkeys(rel._inputs))
+            if len(scope) == 1:
+                self._unary.setdefault(scope[0], []).append(rel)
+                continue
+            x, y = scope
+            if (x, y) not in self._edges:
+                self._edges[(x, y)] = self._edges[(y, x)] = []
+                linked[x].append(y)
+                linked[y].append(x)
+            self._edges[(x, y)].append(rel)
+
+        # Roots first, then every variable after its parent
+        self._order: list[variable.Variable] = []
+        self._parent: dict[variable.Variable, Optional[variable.Variable]] = {}
+        for root in self._vars:
+            if root in self._parent:
+                continue
+            self._parent[root] = None
+            queue = deque([root])
+            while queue:
+                var = queue.popleft()
+                self._order.append(var)
+                for other in linked[var]:
+                    if other not in self._parent:
+                        self._parent[other] = var
+                        queue.append(other)
+        self._children: dict[variable.Variable, list[variable.Variable]] = {var: [] for var in self._vars}
+        for var in self._order:
+            if self._parent[var] is not None:
+                self._children[self._parent[var]].append(var)
+
+    @staticmethod
+    def acyclic(vars: Iterable[variable.Variable], relations: Iterable[relation.DiscreteRelation]) -> bool:
+        """
+        Whether relations are all binary (or unary) and their variables form a forest
+        """
+        parent = {var: var for var in vars}
+
+        def find(var: variable.Variable) -> variable.Variable:
+            while parent[var] != var:
+                parent[var] = parent[parent[var]]
+                var = parent[var]
+            return var
+
+        pairs = set()
+        for rel in relations:
+            scope = list(dict.fromkeys(rel._inputs))
+            if not scope or len(scope) > 2:
+                return False
+            if len(scope) < 2 or frozenset(scope) in pairs:
+                continue
+            pairs.add(frozenset(scope))
+            x, y = find(scope[0]), find(scope[1])
+            if x == y:
+                return False
+            parent[x] = y
+        return True
+
+    def _compatible(self, x: variable.Variable, a, y: variable.Variable, b) -> bool:
+        values = {x: a, y: b}
+        return all(rel._satisfies(*(values[v] for v in rel._inputs)) for rel in self._edges[(x, y)])
+
+    def _supports(self, x: variable.Variable, a, y: variable.Variable, candidates: list) -> Iterator:
+        return (b for b in candidates if self._compatible(x, a, y, b))
+
+    def _filtered(self, given_space: space.Space) -> Optional[dict[variable.Variable, list]]:
+        """
+        Domains of given_space made directionally arc consistent, None if one of them is wiped out
+        """
+        doms = {}
+        for var in self._vars:
+            rels = self._unary.get(var, ())
+            doms[var] = [val for val in given_space[var] if all(rel._satisfies(*(val for _ in rel._inputs)) for rel in rels)]
+            if not doms[var]:
+                return None
+        for child in reversed(self._order):
+            parent = self._parent[child]
+            if parent is None:
+                continue
+            doms[parent] = [a for a in doms[parent] if any(self._compatible(parent, a, child, b) for b in doms[child])]
+            if not doms[parent]:
+                return None
+        return doms
+
+    def solutions(self, given_space: space.Space) -> Iterator[dict[variable.Variable, object]]:
+        """
+        Yields the live var -> value dict for each solution within given_space
+        """
+        doms = self._filtered(given_space)
+        if doms is None:
+            return
+        order = self._order
+        parent = self._parent
+        values: dict[variable.Variable, object] = {}
+        if not order:
+            yield values
+            return
+        # Every value a choice iterator gives has a support in each child, so no branch dead ends
+        stack = [iter(doms[order[0]])]
+        while stack:
+            depth = len(stack) - 1
+            var = order[depth]
+            val = next(stack[-1], _EXHAUSTED)
+            if val is _EXHAUSTED:
+                stack.pop()
+                values.pop(var, None)
+                continue
+            values[var] = val
+            if depth + 1 == len(order):
+                yield values
+                continue
+            nxt = order[depth + 1]
+            up = parent[nxt]
+            if up is None:
+                stack.append(iter(doms[nxt]))
+            else:
+                stack.append(self._supports(up, values[up], nxt, doms[nxt]))
+
+    def count(self, given_space: space.Space) -> int:
+        """
+        Number of solutions within given_space, counted from the leaves up without enumerating them
+        """
+        doms = self._filtered(given_space)
+        if doms is None:
+            return 0
+        # Solutions of the subtree under each variable, for each of its values
+        counts: dict[variable.Variable, dict[object, int]] = {}
+        for var in reversed(self._order):
+            var_counts = {}
+            for a in doms[var]:
+                total = 1
+                for child in self._children[var]:
+                    total *= sum(n for b, n in counts[child].items() if self._compatible(var, a, child, b))
+                var_counts[a] = total
+            counts[var] = var_counts
+        ret = 1
+        for var in self._order:
+            if self._parent[var] is None:
+                ret *= sum(counts[var].values())
+        return ret
+
+
+_EXHAUSTED = object()
+
+
+def _cycle_cutset(vars: Iterable[variable.Variable], relations: Iterable[relation.DiscreteRelation]) -> list[variable.Variable]:
+    """
+    Variables whose removal leaves the binary relations without cycles: leaves are pruned repeatedly,
+    and the most linked remaining variable goes into the cutset whenever none is left
+    """
+    linked: dict[variable.Variable, set[variable.Variable]] = {var: set() for var in vars}
+    for rel in relations:
+        scope = list(dict.fromkeys(rel._inputs))
+        if len(scope) == 2:
+            x, y = scope
+            linked[x].add(y)
+            linked[y].add(x)
+
+    def drop(var: variable.Variable) -> None:
+        for other in linked.pop(var):
+            linked[other].discard(var)
+
+    ret = []
+    while linked:
+        leaves = [var for var, others in linked.items() if len(others) <= 1]
+        if leaves:
+            for var in leaves:
+                if var in linked and len(linked[var]) <= 1:
+                    drop(var)
+            continue
+        var = max(linked, key=lambda v: len(linked[v]))
+        ret.append(var)
+        drop(var)
+    return ret
+
+
+class _Cutset:
+    """
+    Binary relations made acyclic by assigning a few variables: every consistent assignment of the cutset
+    filters the domains of its neighbours, and the forest left over is solved without backtracking
+    """
+
+    def __init__(self, vars: Iterable[variable.Variable], relations: Iterable[relation.DiscreteRelation], cutset: list[variable.Variable]):
+        self._cutset = cutset
+        in_cutset = set(cutset)
+        self._inner: list[relation.DiscreteRelation] = []
+        self._crossing: list[relation.DiscreteRelation] = []
+        rest = []
+        for rel in relations:
+            inside = [var in in_cutset for var in rel._inputs]
+            if all(inside):
+                self._inner.append(rel)
+            elif any(inside):
+                self._crossing.append(rel)
+            else:
+                rest.append(rel)
+        self._forest = _Forest([var for var in vars if var not in in_cutset], rest)
+
+    def _assignments(self, given_space: space.Space) -> Iterator[tuple[dict[variable.Variable, object], space.DiscreteSpace]]:
+        """
+        Yields each assignment of the cutset consistent with the relations within it, along with the space
+        of the other variables filtered by the relations that cross over
+        """
+        for values in itertools.product(*(given_space[var] for var in self._cutset)):
+            fixed = dict(zip(self._cutset, values))
+            if not all(rel._satisfies(*(fixed[var] for var in rel._inputs)) for rel in self._inner):
+                continue
+            doms = {}
+            for rel in self._crossing:
+                free = next(var for var in rel._inputs if var not in fixed)
+                dom = doms.get(free, given_space[free])
+                doms[free] = domain.DiscreteDomain(val for val in dom if rel._satisfies(*(fixed.get(var, val) for var in rel._inputs)))
+            yield fixed, space.DiscreteSpace(doms)
+
+    def solutions(self, given_space: space.Space) -> Iterator[dict[variable.Variable, object]]:
+        for fixed, filtered in self._assignments(given_space):
+            for values in self._forest.solutions(_Overlay(filtered, given_space)):
+                yield fixed | values
+
+    def count(self, given_space: space.Space) -> int:
+        return sum(self._forest.count(_Overlay(filtered, given_space)) for _, filtered in self._assignments(given_space))
+
+
+class _Overlay:
+    """
+    Domains of top where it has them, of bottom otherwise
+    """
+
+    def __init__(self, top: space.DiscreteSpace, bottom: space.Space):
+        self._top = top
+        self._bottom = bottom
+        self._vars = set(top.variables())
+
+    def __getitem__(self, var: variable.Variable) -> domain.Domain:
+        return self._top[var] if var in self._vars else self._bottom[var]
+
+
+def _fresh(options: dict) -> dict:
+    """
+    options with copies of the orderings and nogood stores in them, which keep state for the search they're used in
+    """
+    return {name: copy.deepcopy(value) if isinstance(value, (heuristics.VariableOrdering, heuristics.ValueOrdering, nogoods.NogoodStore)) else value
+            for name, value in options.items()}
+
+
+class DecomposedSearch:
+    """
+    Solves each connected component of the relations on its own and combines their solutions lazily,
+    so that a dead end in one component never makes the search go through the solutions of another
+    Components of binary relations without cycles are solved without backtracking, and with max_cutset,
+    components that become acyclic once at most that many variables are assigned are solved by trying every
+    assignment of those variables; every other component gets its own BacktrackingSearch
+    """
+
+    def __init__(self, constraints: Iterable[relation.DiscreteRelation] | network.ConstraintNetwork, propagation: solver.Propagation = solver.Propagation.MAC,
+                 current_space: Optional[space.Space] = None, max_cutset: int = 0, **options):
+        """
+        options are passed on to the BacktrackingSearch of each component, each getting its own copy of any
+        ordering or nogood store
+        """
+        if not isinstance(constraints, network.ConstraintNetwork):
+            constraints = network.ConstraintNetwork(constraints)
+        self._space = space.DiscreteSpace() if current_space is None else current_space
+        # How each component is solved: "tree", "cutset" or "search"
+        self.kinds: list[str] = []
+        self._parts: list = []
+        self.components: list[list[relation.DiscreteRelation]] = components(constraints)
+        for rels in self.components:
+            vars = list(dict.fromkeys(var for rel in rels for var in rel._inputs))
+            if _Forest.acyclic(vars, rels):
+                self.kinds.append("tree")
+                self._parts.append(_Forest(vars, rels))
+                continue
+            if max_cutset > 0 and all(len(set(rel._inputs)) <= 2 for rel in rels):
+                cutset = _cycle_cutset(vars, rels)
+                if len(cutset) <= max_cutset:
+                    self.kinds.append("cutset")
+                    self._parts.append(_Cutset(vars, rels, cutset))
+                    continue
+            self.kinds.append("search")
+            self._parts.append(solver.BacktrackingSearch(rels, propagation, current_space=current_space, **_fresh(options)))
+
+    def _component_solutions(self, i: int) -> Iterator[dict[variable.Variable, object]]:
+        part = self._parts[i]
+        if isinstance(part, solver.BacktrackingSearch):
+            return part._search()
+        return part.solutions(self._space)
+
+    def _search(self) -> Iterator[dict[variable.Variable, object]]:
+        """
+        Yields the live var -> value dict for each solution
+        Each component's solutions are kept once found, so memory grows with their sum rather than their product
+        """
+        found: list[list[dict]] = [[] for _ in self._parts]
+        sources = [self._component_solutions(i) for i in range(len(self._parts))]
+        # The first solution of every component is found before combining any, so an unsolvable component
+        # ends the search at once
+        for i, source in enumerate(sources):
+            first = next(source, None)
+            if first is None:
+                return
+            found[i].append(dict(first))
+        values: dict[variable.Variable, object] = {}
+        for first in found:
+            values.update(first[0])
+        # Like an odometer: the last component moves fastest, and one that runs out of solutions goes back to
+        # its first while the one before it moves on
+        positions = [0] * len(sources)
+        while True:
+            yield values
+            i = len(sources) - 1
+            while True:
+                if i < 0:
+                    return
+                positions[i] += 1
+                if positions[i] == len(found[i]):
+                    nxt = next(sources[i], None)
+                    if nxt is not None:
+                        found[i].append(dict(nxt))
+                if positions[i] < len(found[i]):
+                    values.update(found[i][positions[i]])
+                    break
+                positions[i] = 0
+                values.update(found[i][0])
+                i -= 1
+
+    def solutions(self, limit: Optional[int] = None) -> Iterator[assignment.Assignment]:
+        """
+        Lazily yields every solution, or the first limit of them
+        """
+        if limit is not None and limit <= 0:
+            return
+        for n, values in enumerate(self._search(), 1):
+            yield assignment.Assignment(values)
+            if n == limit:
+                return
+
+    def count_solutions(self) -> int:
+        """
+        Product of the number of solutions of each component, none of which are combined
+        """
+        ret = 1
+        for part in self._parts:
+            ret *= part.count_solutions() if isinstance(part, solver.BacktrackingSearch) else part.count(self._space)
+            if not ret:
+                break
+        return ret
+
+
+def solutions(constraints: Iterable[relation.DiscreteRelation] | network.ConstraintNetwork, propagation: solver.Propagation = solver.Propagation.MAC,
+              limit: Optional[int] = None, **options) -> Iterator[assignment.Assignment]:
+    """
+    options are passed on to DecomposedSearch, e.g. max_cutset and the options of BacktrackingSearch
+    """
+    return DecomposedSearch(constraints, propagation, **options).solutions(limit)
+
+
+def count_solutions(constraints: Iterable[relation.DiscreteRelation] | network.ConstraintNetwork, propagation: solver.Propagation = solver.Propagation.MAC,
+                    **options) -> int:
+    return DecomposedSearch(constraints, propagation, **options).count_solutions()
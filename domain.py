@@ -1,3 +1,4 @@
+import bisect
 from collections.abc import Iterable, Iterator
 from typing import Optional
 from utils import Singleton
@@ -111,12 +112,16 @@ class DiscreteDomain(Domain):
             return NotImplemented
     
     def __iand__(self, other: "Domain") -> None:
-        self.elements.intersection_update(other.elements)
+        if type(other) is DiscreteDomain:
+            self.elements.intersection_update(other.elements)
+        else:
+            # Other domains, e.g. intervals, may be too large to materialize
+            self.elements = {val for val in self.elements if val in other}
         return self
     
     def __or__(self, other: "Domain") -> "Domain":
-        if isinstance(other, Domain):
-            return self.__class__(self.elements & other.elements)
+        if isinstance(other, DiscreteDomain):
+            return self.__class__(self.elements | other.elements)
         else:
             return NotImplemented
     
@@ -154,9 +159,11 @@ class SingletonDomain(Domain):
         if isinstance(other, SingletonDomain):
             return self.copy() if self.element == other.element else EMPTY_DOMAIN
         elif isinstance(other, DiscreteDomain):
-            return other.__class__(other.elements & {self.element})
+            return other.__class__([self.element] if self.element in other else [])
         else:
             return NotImplemented
+
+    __rand__ = __and__
     
     def __iand__(self, other: "DiscreteDomain") -> None:
         return NotImplemented
@@ -165,9 +172,13 @@ class SingletonDomain(Domain):
         if isinstance(other, SingletonDomain):
             return self.copy() if self.element == other.element else DiscreteDomain({self.element, other.element})
         if isinstance(other, DiscreteDomain):
-            return other.__class__(other.elements | {self.element})
+            ret = other.copy()
+            ret.add(self.element)
+            return ret
         else:
             return NotImplemented
+
+    __ror__ = __or__
     
     def __ior__(self, other: "DiscreteDomain") -> None:
         return NotImplemented
@@ -176,7 +187,7 @@ class SingletonDomain(Domain):
         if isinstance(other, SingletonDomain):
             return self.element == other.element
         if isinstance(other, DiscreteDomain):
-            return other.elements == {self.element}
+            return len(other) == 1 and self.element in other
         else:
             return NotImplemented
     
@@ -188,3 +199,347 @@ class SingletonDomain(Domain):
 
     def __len__(self) -> int:
         return 1
+
+
+class BitsetDomain(DiscreteDomain):
+    """
+    Discrete domain of non-negative integers stored as the bits of a single int
+    Value v is in the domain iff bit v of the mask is set, so set operations are int operations
+    """
+
+    def __init__(self, elts: Optional[Iterable[int]] = None):
+        mask = 0
+        if elts is not None:
+            if isinstance(elts, range) and elts.step == 1 and elts.start >= 0:
+                if elts.stop > elts.start:
+                    mask = ((1 << (elts.stop - elts.start)) - 1) << elts.start
+            else:
+                for val in elts:
+                    mask |= self._bit(val)
+        self._mask: int = mask
+
+    @staticmethod
+    def _bit(val) -> int:
+        if not isinstance(val, int) or val < 0:
+            raise ValueError("BitsetDomain can only hold non-negative integers")
+        return 1 << val
+
+    @classmethod
+    def from_mask(cls, mask: int) -> "BitsetDomain":
+        ret = cls.__new__(cls)
+        ret._mask = mask
+        return ret
+
+    @staticmethod
+    def _mask_of(other: Domain) -> Optional[int]:
+        """
+        Mask of the non-negative integers in other, None if other can't be represented
+        """
+        if isinstance(other, BitsetDomain):
+            return other._mask
+        if isinstance(other, SingletonDomain):
+            val = other.element
+            return 1 << val if isinstance(val, int) and val >= 0 else 0
+        if isinstance(other, IntervalDomain):
+            mask = 0
+            for r in other.intervals(0):
+                mask |= ((1 << len(r)) - 1) << r.start
+            return mask
+        if isinstance(other, DiscreteDomain):
+            mask = 0
+            for val in other.elements:
+                if isinstance(val, int) and val >= 0:
+                    mask |= 1 << val
+            return mask
+        if other is EMPTY_DOMAIN:
+            return 0
+        return None
+
+    @property
+    def mask(self) -> int:
+        return self._mask
+
+    @property
+    def elements(self) -> set:
+        return set(self)
+
+    def add(self, val) -> None:
+        self._mask |= self._bit(val)
+
+    def remove(self, val) -> None:
+        if isinstance(val, int) and val >= 0:
+            self._mask &= ~(1 << val)
+
+    def copy(self) -> "BitsetDomain":
+        return self.from_mask(self._mask)
+
+    def __contains__(self, val) -> bool:
+        return isinstance(val, int) and val >= 0 and (self._mask >> val) & 1 == 1
+
+    def __and__(self, other: Domain) -> Domain:
+        if isinstance(other, BitsetDomain):
+            return self.from_mask(self._mask & other._mask)
+        mask = self._mask_of(other)
+        if mask is None:
+            return NotImplemented
+        return self.from_mask(self._mask & mask)
+
+    __rand__ = __and__
+
+    def __iand__(self, other: Domain) -> "BitsetDomain":
+        if isinstance(other, BitsetDomain):
+            self._mask &= other._mask
+            return self
+        mask = self._mask_of(other)
+        if mask is None:
+            return NotImplemented
+        self._mask &= mask
+        return self
+
+    def __or__(self, other: Domain) -> Domain:
+        if isinstance(other, BitsetDomain):
+            return self.from_mask(self._mask | other._mask)
+        if isinstance(other, IntervalDomain):
+            return NotImplemented
+        if isinstance(other, (DiscreteDomain, SingletonDomain)):
+            # Values that don't fit in a bitset force a fallback to a set based domain
+            if all(isinstance(val, int) and val >= 0 for val in other):
+                return self.from_mask(self._mask | self._mask_of(other))
+            return DiscreteDomain(self.elements | set(other))
+        return NotImplemented
+
+    __ror__ = __or__
+
+    def __ior__(self, other: Domain) -> "BitsetDomain":
+        if isinstance(other, BitsetDomain):
+            self._mask |= other._mask
+        else:
+            for val in other:
+                self.add(val)
+        return self
+
+    def __eq__(self, other: Domain) -> bool:
+        if isinstance(other, BitsetDomain):
+            return self._mask == other._mask
+        if isinstance(other, SingletonDomain):
+            return other.element in self and self._mask.bit_count() == 1
+        if isinstance(other, DiscreteDomain):
+            return self.elements == other.elements
+        return NotImplemented
+
+    def __bool__(self) -> bool:
+        return self._mask != 0
+
+    def __iter__(self) -> Iterator[int]:
+        mask = self._mask
+        while mask:
+            low = mask & -mask
+            yield low.bit_length() - 1
+            mask ^= low
+
+    def __len__(self) -> int:
+        return self._mask.bit_count()
+
+
+class IntervalDomain(DiscreteDomain):
+    """
+    Discrete domain of integers stored as sorted, disjoint ranges rather than one value at a time,
+    so that large ranges like 0..10^6 cost as much as their bounds and holes
+    add and remove also take ranges of consecutive values, which is how bounds are tightened and restored
+    """
+
+    def __init__(self, elts: Optional[Iterable[int] | int] = None, hi: Optional[int] = None):
+        """
+        Either IntervalDomain(lo, hi) for lo..hi inclusive, or IntervalDomain(values) like other discrete domains
+        """
+        # Start and (inclusive) end of each range, sorted, with gaps of at least one value between ranges
+        self._starts: list[int] = []
+        self._ends: list[int] = []
+        self._size: int = 0
+        if hi is not None:
+            if elts <= hi:
+                self._starts, self._ends, self._size = [elts], [hi], hi - elts + 1
+        elif isinstance(elts, IntervalDomain):
+            self._starts, self._ends, self._size = elts._starts.copy(), elts._ends.copy(), elts._size
+        elif isinstance(elts, range) and elts.step == 1:
+            if elts:
+                self._starts, self._ends, self._size = [elts.start], [elts.stop - 1], len(elts)
+        elif elts is not None:
+            for val in sorted(set(elts)):
+                self._check(val)
+                if self._ends and self._ends[-1] == val - 1:
+                    self._ends[-1] = val
+                else:
+                    self._starts.append(val)
+                    self._ends.append(val)
+                self._size += 1
+
+    @staticmethod
+    def _check(val) -> None:
+        if not isinstance(val, int):
+            raise ValueError("IntervalDomain can only hold integers")
+
+    @property
+    def lo(self) -> int:
+        if not self._size:
+            raise ValueError("Empty domain has no bounds")
+        return self._starts[0]
+
+    @property
+    def hi(self) -> int:
+        if not self._size:
+            raise ValueError("Empty domain has no bounds")
+        return self._ends[-1]
+
+    @property
+    def elements(self) -> set:
+        return set(self)
+
+    def intervals(self, lo: Optional[int] = None, hi: Optional[int] = None) -> list[range]:
+        """
+        The ranges of values in the domain, clipped to lo..hi
+        """
+        starts, ends = self._starts, self._ends
+        i = 0 if lo is None else bisect.bisect_left(ends, lo)
+        j = len(starts) if hi is None else bisect.bisect_right(starts, hi)
+        ret = []
+        for k in range(i, j):
+            a = starts[k] if lo is None else max(starts[k], lo)
+            b = ends[k] if hi is None else min(ends[k], hi)
+            if a <= b:
+                ret.append(range(a, b + 1))
+        return ret
+
+    def _add_span(self, lo: int, hi: int) -> None:
+        starts, ends = self._starts, self._ends
+        # Ranges that overlap or touch lo..hi merge into a single one
+        i = bisect.bisect_left(ends, lo - 1)
+        j = bisect.bisect_right(starts, hi + 1)
+        if i < j:
+            lo = min(lo, starts[i])
+            hi = max(hi, ends[j - 1])
+        self._size += (hi - lo + 1) - sum(ends[k] - starts[k] + 1 for k in range(i, j))
+        starts[i:j] = [lo]
+        ends[i:j] = [hi]
+
+    def _remove_span(self, lo: int, hi: int) -> None:
+        starts, ends = self._starts, self._ends
+        i = bisect.bisect_left(ends, lo)
+        j = bisect.bisect_right(starts, hi)
+        if i >= j:
+            return
+        kept_starts, kept_ends = [], []
+        if starts[i] < lo:
+            kept_starts.append(starts[i])
+            kept_ends.append(lo - 1)
+        if ends[j - 1] > hi:
+            kept_starts.append(hi + 1)
+            kept_ends.append(ends[j - 1])
+        removed = sum(ends[k] - starts[k] + 1 for k in range(i, j)) - sum(b - a + 1 for a, b in zip(kept_starts, kept_ends))
+        starts[i:j] = kept_starts
+        ends[i:j] = kept_ends
+        self._size -= removed
+
+    def add(self, val: int | range) -> None:
+        if isinstance(val, range):
+            if val:
+                self._add_span(val.start, val.stop - 1)
+            return
+        self._check(val)
+        self._add_span(val, val)
+
+    def remove(self, val: int | range) -> None:
+        if isinstance(val, range):
+            if val:
+                self._remove_span(val.start, val.stop - 1)
+        elif isinstance(val, int):
+            self._remove_span(val, val)
+
+    def copy(self) -> "IntervalDomain":
+        return self.__class__(self)
+
+    def __contains__(self, val) -> bool:
+        if not isinstance(val, int):
+            return False
+        i = bisect.bisect_right(self._starts, val) - 1
+        return i >= 0 and val <= self._ends[i]
+
+    def __and__(self, other: Domain) -> Domain:
+        if isinstance(other, IntervalDomain):
+            ret = self.__class__()
+            for r in self.intervals():
+                for s in other.intervals(r.start, r.stop - 1):
+                    ret._starts.append(s.start)
+                    ret._ends.append(s.stop - 1)
+                    ret._size += len(s)
+            return ret
+        # Other domains are finite, so the intersection keeps their kind
+        if isinstance(other, BitsetDomain):
+            return other.from_mask(other.mask & BitsetDomain._mask_of(self))
+        if isinstance(other, DiscreteDomain):
+            return other.__class__([val for val in other if val in self])
+        if isinstance(other, SingletonDomain):
+            return other.copy() if other.element in self else EMPTY_DOMAIN
+        if other is EMPTY_DOMAIN:
+            return self.__class__()
+        return NotImplemented
+
+    __rand__ = __and__
+
+    def __iand__(self, other: Domain) -> "IntervalDomain":
+        if isinstance(other, IntervalDomain):
+            kept = self & other
+        else:
+            kept = self.__class__([val for val in other if val in self])
+        self._starts, self._ends, self._size = kept._starts, kept._ends, kept._size
+        return self
+
+    def __or__(self, other: Domain) -> Domain:
+        if isinstance(other, (DiscreteDomain, SingletonDomain)):
+            ret = self.copy()
+            ret |= other
+            return ret
+        return NotImplemented
+
+    __ror__ = __or__
+
+    def __ior__(self, other: Domain) -> "IntervalDomain":
+        for val in (other.intervals() if isinstance(other, IntervalDomain) else other):
+            self.add(val)
+        return self
+
+    def __eq__(self, other: Domain) -> bool:
+        if isinstance(other, IntervalDomain):
+            return self._starts == other._starts and self._ends == other._ends
+        if isinstance(other, (DiscreteDomain, SingletonDomain)):
+            return len(self) == len(other) and all(val in self for val in other)
+        return NotImplemented
+
+    def __bool__(self) -> bool:
+        return self._size != 0
+
+    def __iter__(self) -> Iterator[int]:
+        for start, end in zip(self._starts, self._ends):
+            yield from range(start, end + 1)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __repr__(self) -> str:
+        return f"IntervalDomain({', '.join(f'{a}..{b}' for a, b in zip(self._starts, self._ends))})"
+
+
+def bounds(dom: Domain) -> tuple:
+    """
+    Smallest and largest value of a non empty domain of comparable values, without going through
+    all of them for interval and bitset domains
+    """
+    if isinstance(dom, IntervalDomain):
+        return dom.lo, dom.hi
+    if isinstance(dom, BitsetDomain) and dom:
+        return (dom.mask & -dom.mask).bit_length() - 1, dom.mask.bit_length() - 1
+    if isinstance(dom, SingletonDomain):
+        return dom.element, dom.element
+    if not dom:
+        raise ValueError("Empty domain has no bounds")
+    return min(dom), max(dom)
@@ -0,0 +1,218 @@
+import heapq
+import random
+import network
+import space
+import variable
+from typing import Optional
+
+
+class VariableOrdering:
+    """
+    Chooses the next variable to branch on
+    Candidates are kept in a heap with lazy updates: a variable is pushed again whenever its key may have
+    gone down, and entries whose key has gone up are fixed when they reach the top, so choosing a variable
+    costs O(log n) per change instead of a scan over every variable
+    """
+
+    def __init__(self, randomize: bool = False):
+        self._randomize = randomize
+        self._network: Optional[network.ConstraintNetwork] = None
+        self._rng = random.Random()
+        self._heap: list[tuple[float, float, int]] = []
+        self._seen: int = 0
+
+    def key(self, var_id: int, given_space: space.TrailedSpace, values: dict[variable.Variable, object]) -> float:
+        """
+        Variables with the smallest key are chosen first
+        """
+        raise NotImplementedError
+
+    def start(self, constraints: network.ConstraintNetwork, given_space: space.TrailedSpace, seed: Optional[int] = None) -> None:
+        """
+        Called once before the search starts
+        """
+        self._network = constraints
+        self._rng.seed(seed)
+        self.new_run(given_space)
+
+    def new_run(self, given_space: space.TrailedSpace) -> None:
+        """
+        Called at the start of each run, i.e. on every restart, with nothing assigned
+        """
+        self._seen = given_space.checkpoint()
+        self._heap = []
+        for var_id in range(len(self._network.variables)):
+            self._push(var_id, given_space, {})
+
+    def _push(self, var_id: int, given_space: space.TrailedSpace, values: dict[variable.Variable, object]) -> None:
+        tiebreak = self._rng.random() if self._randomize else var_id
+        heapq.heappush(self._heap, (self.key(var_id, given_space, values), tiebreak, var_id))
+
+    def _push_var(self, var: variable.Variable, given_space: space.TrailedSpace, values: dict[variable.Variable, object]) -> None:
+        if var not in values:
+            self._push(self._network.var_id(var), given_space, values)
+
+    def select(self, given_space: space.TrailedSpace, values: dict[variable.Variable, object]) -> variable.Variable:
+        vars = self._network._variables
+        # Domains that shrank since the last choice have a smaller key than what the heap holds
+        for var in set(given_space.changed_since(self._seen)):
+            self._push_var(var, given_space, values)
+        self._seen = given_space.checkpoint()
+        if len(self._heap) > 4 * len(vars) + 64:
+            self._heap = []
+            for var_id, var in enumerate(vars):
+                if var not in values:
+                    self._push(var_id, given_space, values)
+
+        heap = self._heap
+        while True:
+            key, tiebreak, var_id = heap[0]
+            var = vars[var_id]
+            if var in values:
+                heapq.heappop(heap)
+                continue
+            current = self.key(var_id, given_space, values)
+            if current != key:
+                heapq.heapreplace(heap, (current, tiebreak, var_id))
+                continue
+            return var
+
+    def restored(self, checkpoint: int) -> None:
+        """
+        Called after the space was restored to checkpoint
+        """
+        self._seen = min(self._seen, checkpoint)
+
+    def unassigned(self, var: variable.Variable, given_space: space.TrailedSpace, values: dict[variable.Variable, object]) -> None:
+        """
+        Called when the search backtracks over var, which has already been removed from values
+        """
+        self._push_var(var, given_space, values)
+
+    def conflict(self, relation, given_space: space.TrailedSpace, values: dict[variable.Variable, object]) -> None:
+        """
+        Called when propagating through relation wiped out a domain
+        """
+        pass
+
+
+class Dom(VariableOrdering):
+    """
+    Minimum remaining values
+    """
+
+    def key(self, var_id: int, given_space: space.TrailedSpace, values: dict[variable.Variable, object]) -> float:
+        return len(given_space[self._network._variables[var_id]])
+
+
+class DomDeg(VariableOrdering):
+    """
+    Fewest remaining values relative to the number of relations on the variable
+    """
+
+    def key(self, var_id: int, given_space: space.TrailedSpace, values: dict[variable.Variable, object]) -> float:
+        return len(given_space[self._network._variables[var_id]]) / max(1, len(self._network.relations_of(var_id)))
+
+
+class DomWDeg(VariableOrdering):
+    """
+    Fewest remaining values relative to the weighted degree of the variable
+    Every relation starts with weight 1, bumped each time it wipes out a domain, and only relations that still
+    have another unassigned variable count toward the weighted degree
+    Weights are kept across restarts, which is what lets restarts learn where the hard part of a problem is
+    """
+
+    def start(self, constraints: network.ConstraintNetwork, given_space: space.TrailedSpace, seed: Optional[int] = None) -> None:
+        self._weights: list[int] = [1] * len(constraints)
+        super().start(constraints, given_space, seed)
+
+    def _weighted_degree(self, var_id: int, values: dict[variable.Variable, object]) -> int:
+        vars = self._network._variables
+        total = 0
+        for r in self._network.relations_of(var_id):
+            if any(v != var_id and vars[v] not in values for v in self._network.scope(r)):
+                total += self._weights[r]
+        return total
+
+    def key(self, var_id: int, given_space: space.TrailedSpace, values: dict[variable.Variable, object]) -> float:
+        return len(given_space[self._network._variables[var_id]]) / max(1, self._weighted_degree(var_id, values))
+
+    def unassigned(self, var: variable.Variable, given_space: space.TrailedSpace, values: dict[variable.Variable, object]) -> None:
+        super().unassigned(var, given_space, values)
+        # Relations through var count again toward the weighted degree of its neighbors
+        vars = self._network._variables
+        for u in self._network.neighbors(self._network.var_id(var)):
+            self._push_var(vars[u], given_space, values)
+
+    def conflict(self, relation, given_space: space.TrailedSpace, values: dict[variable.Variable, object]) -> None:
+        r = self._network.relation_id(relation)
+        self._weights[r] += 1
+        vars = self._network._variables
+        for v in self._network.scope(r):
+            self._push_var(vars[v], given_space, values)
+
+
+class ValueOrdering:
+    """
+    Chooses the order in which the values of a variable are tried
+    """
+
+    def start(self, constraints: network.ConstraintNetwork) -> None:
+        self._network = constraints
+
+    def order(self, var: variable.Variable, given_space: space.TrailedSpace) -> tuple:
+        # Domain order
+        return tuple(given_space[var])
+
+
+class Lexicographic(ValueOrdering):
+    def order(self, var: variable.Variable, given_space: space.TrailedSpace) -> tuple:
+        values = tuple(given_space[var])
+        try:
+            return tuple(sorted(values))
+        except TypeError:
+            # Values that can't be compared to each other keep the domain order
+            return values
+
+
+class LeastConstrainingValue(ValueOrdering):
+    """
+    Tries first the values that leave the most values in the domains of neighboring variables
+    Only binary relations are looked at, since counting supports of wider relations costs too much at every node
+    """
+
+    def order(self, var: variable.Variable, given_space: space.TrailedSpace) -> tuple:
+        values = tuple(given_space[var])
+        if len(values) < 2:
+            return values
+        var_id = self._network.var_id(var)
+        remaining = dict.fromkeys(values, 0)
+        for r in self._network.relations_of(var_id):
+            rel = self._network._relations[r]
+            if len(rel._inputs) != 2 or self._network.arity(r) != 2:
+                continue
+            other = next(v for v in rel._inputs if v != var)
+            other_dom = tuple(given_space[other])
+            first = rel._inputs[0] == var
+            for val in values:
+                if first:
+                    remaining[val] += sum(1 for b in other_dom if rel._satisfies(val, b))
+                else:
+                    remaining[val] += sum(1 for b in other_dom if rel._satisfies(b, val))
+        return tuple(sorted(values, key=lambda val: -remaining[val]))
+
+
+def luby(i: int) -> int:
+    """
+    i-th term (from 0) of the Luby sequence 1, 1, 2, 1, 1, 2, 4, 1, 1, 2, ...
+    """
+    k = 1
+    while (1 << k) - 1 < i + 1:
+        k += 1
+    while True:
+        if i + 1 == (1 << k) - 1:
+            return 1 << (k - 1)
+        i -= (1 << (k - 1)) - 1
+        k = 1
+        while (1 << k) - 1 < i + 1:
+            k += 1
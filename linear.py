@@ -0,0 +1,175 @@
+import operator
+import variable
+import domain
+import assignment
+import space
+from relation import DiscreteRelation
+from collections.abc import Iterator, Iterable
+from typing import Optional
+
+
+def _ceil_div(a: int, b: int) -> int:
+    return -(-a // b)
+
+
+class LinearRelation(DiscreteRelation):
+    """
+    Weighted sum of integer inputs compared to a bound: sum(coefficients[i] * inputs[i]) <= bound (or == or >=)
+    Revisions only tighten the bounds of the domains, which takes time linear in the arity however large
+    the domains are, so the inputs can have interval domains over huge ranges
+    """
+    _comparisons = {"<=": operator.le, "==": operator.eq, ">=": operator.ge}
+
+    def __init__(self, variables: Iterable[variable.Variable], coefficients: Optional[Iterable[int]] = None,
+                 bound: int = 0, comparison: str = "<="):
+        """
+        coefficients default to all 1, for a plain sum
+        """
+        variables = list(variables)
+        if len(set(variables)) != len(variables):
+            raise ValueError("Linear relations can't repeat variables, add up their coefficients instead")
+        self._coefficients: list[int] = [1] * len(variables) if coefficients is None else list(coefficients)
+        if len(self._coefficients) != len(variables):
+            raise ValueError("Every variable needs a coefficient")
+        if comparison not in self._comparisons:
+            raise ValueError(f"comparison must be one of {', '.join(self._comparisons)}")
+        self._bound = bound
+        self._comparison = comparison
+        # A bound method rather than a closure, so the relation can be pickled
+        super().__init__(variables, self._holds)
+
+    @property
+    def coefficients(self) -> list[int]:
+        return self._coefficients.copy()
+
+    @property
+    def bound(self) -> int:
+        return self._bound
+
+    @property
+    def comparison(self) -> str:
+        return self._comparison
+
+    def _holds(self, *values) -> bool:
+        total = sum(c * val for c, val in zip(self._coefficients, values))
+        return self._comparisons[self._comparison](total, self._bound)
+
+    def _term_bounds(self, doms: list[domain.Domain]) -> tuple[list[int], list[int]]:
+        """
+        Smallest and largest value each term can take
+        """
+        mins, maxs = [], []
+        for c, dom in zip(self._coefficients, doms):
+            lo, hi = domain.bounds(dom)
+            mins.append(c * lo if c >= 0 else c * hi)
+            maxs.append(c * hi if c >= 0 else c * lo)
+        return mins, maxs
+
+    def revise(self, given_space: space.TrailedSpace, modified: Optional[set[variable.Variable]] = None) -> list[variable.Variable]:
+        inputs = self._inputs
+        coefficients = self._coefficients
+        bound = self._bound
+        changed = []
+        while True:
+            doms = [given_space[var] for var in inputs]
+            if not all(doms):
+                return changed
+            mins, maxs = self._term_bounds(doms)
+            tightened = False
+            if self._comparison != ">=":
+                # Each term can be at most what the others leave when they are as small as they can be
+                slack = bound - sum(mins)
+                if slack < 0:
+                    given_space.wipe_out(inputs[0])
+                    return changed + [inputs[0]]
+                for var, c, term_min in zip(inputs, coefficients, mins):
+                    if c > 0:
+                        narrowed = given_space.restrict_bounds(var, hi=(slack + term_min) // c)
+                    elif c < 0:
+                        narrowed = given_space.restrict_bounds(var, lo=_ceil_div(slack + term_min, c))
+                    else:
+                        continue
+                    if narrowed:
+                        tightened = True
+                        if var not in changed:
+                            changed.append(var)
+            if self._comparison != "<=":
+                # And at least what the others leave when they are as large as they can be
+                excess = sum(maxs) - bound
+                if excess < 0:
+                    given_space.wipe_out(inputs[0])
+                    return changed + [inputs[0]]
+                for var, c, term_max in zip(inputs, coefficients, maxs):
+                    if c > 0:
+                        narrowed = given_space.restrict_bounds(var, lo=_ceil_div(term_max - excess, c))
+                    elif c < 0:
+                        narrowed = given_space.restrict_bounds(var, hi=(term_max - excess) // c)
+                    else:
+                        continue
+                    if narrowed:
+                        tightened = True
+                        if var not in changed:
+                            changed.append(var)
+            # A single inequality is done in one pass, but for an equality each side's tightening
+            # can make the other side tighten further
+            if not tightened or self._comparison != "==":
+                return changed
+
+    def revision_cost(self, given_space: space.Space) -> float:
+        return len(self._inputs)
+
+    def satisfying_assignments(self, given_space: Optional[space.DiscreteSpace] = None) -> Iterator[assignment.Assignment]:
+        if given_space is None:
+            given_space = self._space_type()
+        inputs = self._inputs
+        coefficients = self._coefficients
+        doms = [given_space[var] for var in inputs]
+        if not all(doms):
+            return
+        mins, maxs = self._term_bounds(doms)
+        # Smallest and largest sum of the terms from each position on
+        suffix_min = [0] * (len(inputs) + 1)
+        suffix_max = [0] * (len(inputs) + 1)
+        for i in reversed(range(len(inputs))):
+            suffix_min[i] = suffix_min[i + 1] + mins[i]
+            suffix_max[i] = suffix_max[i + 1] + maxs[i]
+        low = None if self._comparison == "<=" else self._bound
+        high = None if self._comparison == ">=" else self._bound
+        values = [None] * len(inputs)
+
+        def extend(depth: int, total: int) -> Iterator[assignment.Assignment]:
+            if depth == len(inputs):
+                # Terms with a zero coefficient don't narrow any window, so the sum is checked once more
+                if (low is None or total >= low) and (high is None or total <= high):
+                    yield assignment.Assignment(dict(zip(inputs, values)))
+                return
+            # Window of values for this input that leave the rest of the sum able to reach the bounds
+            c = coefficients[depth]
+            lo, hi = None, None
+            if high is not None and c != 0:
+                limit = high - total - suffix_min[depth + 1]
+                if c > 0:
+                    hi = limit // c
+                else:
+                    lo = _ceil_div(limit, c)
+            if low is not None and c != 0:
+                limit = low - total - suffix_max[depth + 1]
+                if c > 0:
+                    lo = _ceil_div(limit, c) if lo is None else max(lo, _ceil_div(limit, c))
+                else:
+                    hi = limit // c if hi is None else min(hi, limit // c)
+            for val in _values_between(doms[depth], lo, hi):
+                values[depth] = val
+                yield from extend(depth + 1, total + c * val)
+
+        yield from extend(0, 0)
+
+
+def _values_between(dom: domain.Domain, lo: Optional[int], hi: Optional[int]) -> Iterator[int]:
+    if isinstance(dom, domain.IntervalDomain):
+        for span in dom.intervals(lo, hi):
+            yield from span
+        return
+    for val in dom:
+        if (lo is None or val >= lo) and (hi is None or val <= hi):
+            yield val
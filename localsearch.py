@@ -0,0 +1,173 @@
+import random
+import relation
+import network
+import assignment
+import space
+from time import perf_counter
+from collections.abc import Iterable
+from typing import Optional
+
+
+class MinConflicts:
+    """
+    Local search over complete assignments: repeatedly picks a variable in some violated relation and moves it
+    to the value that violates the fewest relations, with random walk moves (noise) and a tabu list against
+    cycling, until no relation is violated or the budget runs out
+    Which relations are violated, and how many of them each variable is in, is kept up to date after every move
+    by checking only the relations on the variable that moved
+    Incomplete: a problem without solutions just runs out of moves
+    """
+
+    def __init__(self, constraints: Iterable[relation.DiscreteRelation] | network.ConstraintNetwork,
+                 current_space: Optional[space.Space] = None, prune: bool = False, noise: float = 0.1,
+                 tabu_tenure: int = 10, max_moves: Optional[int] = 100000, timeout: Optional[float] = None,
+                 seed: Optional[int] = None):
+        """
+        Values are picked from current_space, e.g. the result of pruned_space_for_all, or from a pruned copy
+        of it with prune
+        noise is the probability of moving to a random value instead of the best one
+        A move can't bring a variable back to a value it left during the last tabu_tenure moves, unless that
+        makes for fewer violated relations than ever before
+        """
+        if not isinstance(constraints, network.ConstraintNetwork):
+            constraints = network.ConstraintNetwork(constraints)
+        if not 0 <= noise <= 1:
+            raise ValueError("noise must be between 0 and 1")
+        self._network = constraints
+        if prune:
+            current_space = constraints.pruned_space(current_space)
+        self._space = space.DiscreteSpace() if current_space is None else current_space
+        self._noise = noise
+        self._tabu_tenure = tabu_tenure
+        self._max_moves = max_moves
+        self._timeout = timeout
+        self._rng = random.Random(seed)
+        self.moves: int = 0
+        self.elapsed: float = 0.0
+        # Fewest violated relations seen, and the assignment that had them
+        self.best_violations: Optional[int] = None
+        self.best: assignment.Assignment = assignment.Assignment()
+        self.solved: bool = False
+
+    @property
+    def moves_per_second(self) -> float:
+        return self.moves / self.elapsed if self.elapsed else 0.0
+
+    def solve(self) -> assignment.Assignment:
+        """
+        Returns a solution, or an empty assignment if none was found within the budget (best then holds the
+        assignment that came closest)
+        """
+        constraints = self._network
+        vars = constraints.variables
+        relations = constraints.relations
+        doms = [tuple(self._space[var]) for var in vars]
+        start = perf_counter()
+        self.moves = 0
+        if not all(doms):
+            self.elapsed = perf_counter() - start
+            return assignment.Assignment()
+
+        rng = self._rng
+        # A plain dict rather than an Assignment: every variable always has a value, so relations are checked
+        # by calling their predicates directly, which is what Relation.violated does on complete assignments
+        current = {var: rng.choice(dom) for var, dom in zip(vars, doms)}
+        scopes = [rel._inputs for rel in relations]
+        predicates = [rel._satisfies for rel in relations]
+
+        def is_violated(r: int) -> bool:
+            return not predicates[r](*[current[var] for var in scopes[r]])
+
+        violated = [is_violated(r) for r in range(len(relations))]
+        conflicts = [0] * len(vars)
+        for r, bad in enumerate(violated):
+            if bad:
+                for v in constraints.scope(r):
+                    conflicts[v] += 1
+        # Variables in at least one violated relation, as a list for random picks and the position of each in it
+        conflicted = [v for v in range(len(vars)) if conflicts[v]]
+        position = {v: i for i, v in enumerate(conflicted)}
+        total = sum(violated)
+        self.best_violations = total
+        self.best = assignment.Assignment(current)
+        # (variable id, value) -> move after which the variable may take the value again
+        tabu: dict[tuple[int, object], int] = {}
+
+        def count_change(v: int, change: int) -> None:
+            before = conflicts[v]
+            conflicts[v] += change
+            if not before:
+                position[v] = len(conflicted)
+                conflicted.append(v)
+            elif not conflicts[v]:
+                # Swap with the last one so removal stays constant time
+                i = position.pop(v)
+                last = conflicted.pop()
+                if last != v:
+                    conflicted[i] = last
+                    position[last] = i
+
+        while total:
+            if self._max_moves is not None and self.moves >= self._max_moves:
+                break
+            if self._timeout is not None and perf_counter() - start >= self._timeout:
+                break
+            v = conflicted[rng.randrange(len(conflicted))]
+            var = vars[v]
+            old = current[var]
+            watching = constraints.relations_of(v)
+            candidates = [val for val in doms[v] if val != old]
+            if not candidates:
+                # Nothing else to try for this variable, but another conflicted one may get picked next time
+                self.moves += 1
+                continue
+
+            if rng.random() < self._noise:
+                new = rng.choice(candidates)
+            else:
+                # Change in the number of violated relations for each value, the best non tabu ones kept
+                now = sum(violated[r] for r in watching)
+                best_delta = None
+                best_values = []
+                for val in candidates:
+                    current[var] = val
+                    delta = sum(is_violated(r) for r in watching) - now
+                    if tabu.get((v, val), -1) > self.moves and total + delta >= self.best_violations:
+                        continue
+                    if best_delta is None or delta < best_delta:
+                        best_delta = delta
+                        best_values = [val]
+                    elif delta == best_delta:
+                        best_values.append(val)
+                current[var] = old
+                if not best_values:
+                    self.moves += 1
+                    continue
+                new = rng.choice(best_values)
+
+            current[var] = new
+            tabu[(v, old)] = self.moves + self._tabu_tenure
+            self.moves += 1
+            for r in watching:
+                bad = is_violated(r)
+                if bad == violated[r]:
+                    continue
+                violated[r] = bad
+                change = 1 if bad else -1
+                total += change
+                for u in constraints.scope(r):
+                    count_change(u, change)
+            if total < self.best_violations:
+                self.best_violations = total
+                self.best = assignment.Assignment(current)
+
+        self.elapsed = perf_counter() - start
+        self.solved = not total
+        return assignment.Assignment(current) if self.solved else assignment.Assignment()
+
+
+def solve(constraints: Iterable[relation.DiscreteRelation] | network.ConstraintNetwork, **options) -> assignment.Assignment:
+    """
+    options are passed on to MinConflicts
+    """
+    return MinConflicts(constraints, **options).solve()
@@ -1,39 +1,42 @@
 import relation
 import variable
 import domain
-import itertools
 import assignment
+import solver
+import parallel
+import decomposition
 
-def backtracking_solver(constraints: list[relation.DiscreteRelation]):
-    vars = set(itertools.chain.from_iterable(relation._variables for relation in constraints))
-    curr_space = relation.DiscreteRelation.pruned_space_for_all(constraints)
-    curr_assignment = assignment.Assignment()
-
-    def helper():
-        if len(curr_assignment) == len(vars):
-            return all(relation.satisfied(curr_assignment) for relation in constraints)
-        
-        assign_var = min(vars, key=lambda var: float("inf") if var in curr_assignment else len(curr_space[var]))
-        for val in curr_space[assign_var]:
-            # FIXME: this checks for value validity, but I think we know guarantee that it's valid
-            curr_assignment[assign_var] = val
-            # TODO: Constraint propagation here?
-            if helper():
-                return True
-            curr_assignment.unassign(assign_var)
-        return False
-    
-    helper()
-    return curr_assignment
+# Kept here since this is where the solver started out
+Propagation = solver.Propagation
+propagate_assignment = solver.propagate_assignment
+
+
+def backtracking_solver(constraints: list[relation.DiscreteRelation], propagation: Propagation = Propagation.NONE, workers: int = 1,
+                        decompose: bool = False, **options):
+    """
+    Returns the first solution found, or an empty assignment if there is none
+    With more than one worker, the search space is split between that many processes, which search it with
+    the default options, so neither decompose nor options can be given then
+    With decompose, each connected component of the relations is solved on its own (see decomposition.DecomposedSearch)
+    options are passed on to solver.BacktrackingSearch, e.g. variable_ordering, value_ordering, restarts and backjumping
+    """
+    if workers > 1:
+        if decompose or options:
+            raise ValueError("Parallel search doesn't support decompose or search options")
+        return parallel.solve(constraints, propagation, max_workers=workers)
+    if decompose:
+        return next(decomposition.solutions(constraints, propagation, limit=1, **options), assignment.Assignment())
+    return next(solver.solutions(constraints, propagation, limit=1, **options), assignment.Assignment())
 
 if __name__ == '__main__':
     import space
+    import stats
     from time import time
 
     def lt(a, b): return a < b
     def is_5(a): return a == 5
 
-    dom = domain.DiscreteDomain(range(10))
+    dom = domain.BitsetDomain(range(10))
     x_dom = dom.copy(); y_dom = dom.copy(); z_dom = dom.copy()
     x_var = variable.Variable(x_dom, "x")
     y_var = variable.Variable(y_dom, "y")
@@ -72,3 +75,39 @@ if __name__ == '__main__':
     ans = backtracking_solver([r_x, r_xy, r_yz])
     print(ans)
     print("time:", time() - s)
+
+    for mode in (Propagation.FORWARD_CHECKING, Propagation.MAC):
+        s = time()
+        print(f"Answer from backtracking solver ({mode.value}):")
+        ans = backtracking_solver([r_x, r_xy, r_yz], propagation=mode)
+        print(ans)
+        print("time:", time() - s)
+
+    s = time()
+    print("Number of answers:", solver.count_solutions([r_x, r_xy, r_yz]))
+    print("First two answers:", ", ".join(str(ans) for ans in solver.solutions([r_x, r_xy, r_yz], limit=2)))
+    print("time:", time() - s)
+
+    # A loose chain next to an unsatisfiable pigeonhole: plain backtracking retries the pigeonhole
+    # under every labelling of the chain, backjumping sees that the chain never took part in the conflict
+    def ne(a, b): return a != b
+
+    chain = [variable.Variable(domain.BitsetDomain(range(3)), f"c{i}") for i in range(8)]
+    holes = [variable.Variable(domain.BitsetDomain(range(4)), f"p{i}") for i in range(5)]
+    structured = [relation.DiscreteRelation([a, b], ne) for a, b in zip(chain, chain[1:])]
+    structured += [relation.DiscreteRelation([a, b], ne) for i, a in enumerate(holes) for b in holes[i + 1:]]
+    print("Nodes on chain + pigeonhole:")
+    for mode in (Propagation.FORWARD_CHECKING, Propagation.MAC):
+        plain = solver.BacktrackingSearch(structured, mode)
+        jumping = solver.BacktrackingSearch(structured, mode, backjumping=True, nogood_store=100)
+        s = time()
+        plain.count_solutions()
+        plain_time = time() - s
+        s = time()
+        jumping.count_solutions()
+        print(f"{mode.value}: backtracking {plain.nodes} ({plain_time:.3f}s), backjumping {jumping.nodes} ({time() - s:.3f}s)")
+
+    with stats.SolverStats() as recorded:
+        backtracking_solver(structured, Propagation.MAC, backjumping=True)
+    print("Statistics for backjumping with MAC:")
+    print(recorded.report(top=5))
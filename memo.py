@@ -0,0 +1,74 @@
+from collections import OrderedDict
+from collections.abc import Callable
+from typing import Optional
+
+
+class MemoizedPredicate:
+    """
+    Predicate wrapper that caches results by argument tuple, evicting the least recently used once
+    it holds maxsize of them, so memory stays bounded whatever the search does
+    Once every tuple of a product of complete_size tuples has been seen without any eviction, the cache
+    is complete: on_complete is called once, and the wrapped predicate is never needed again
+    """
+
+    def __init__(self, predicate: Callable, maxsize: Optional[int] = 4096, complete_size: Optional[int] = None,
+                 on_complete: Optional[Callable[["MemoizedPredicate"], None]] = None):
+        """
+        maxsize None means unbounded
+        """
+        if maxsize is not None and maxsize <= 0:
+            raise ValueError("maxsize must be positive")
+        self.predicate = predicate
+        self.maxsize = maxsize
+        self._complete_size = complete_size
+        self._on_complete = on_complete
+        self._cache: OrderedDict[tuple, bool] = OrderedDict()
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+        self.complete: bool = False
+
+    def __call__(self, *args) -> bool:
+        cache = self._cache
+        ret = cache.get(args)
+        if ret is not None:
+            self.hits += 1
+            if not self.complete:
+                cache.move_to_end(args)
+            return ret
+        self.misses += 1
+        ret = bool(self.predicate(*args))
+        cache[args] = ret
+        if self.maxsize is not None and len(cache) > self.maxsize:
+            cache.popitem(last=False)
+            self.evictions += 1
+        elif not self.evictions and len(cache) == self._complete_size:
+            self.complete = True
+            if self._on_complete is not None:
+                self._on_complete(self)
+        return ret
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    @property
+    def hit_rate(self) -> float:
+        calls = self.hits + self.misses
+        return self.hits / calls if calls else 0.0
+
+    def satisfying(self) -> list[tuple]:
+        """
+        Argument tuples cached as satisfying the predicate
+        """
+        return [args for args, result in self._cache.items() if result]
+
+    def clear(self) -> None:
+        self._cache.clear()
+        self.hits = self.misses = self.evictions = 0
+        self.complete = False
+
+    def __getstate__(self):
+        # The callback is a bound method of the relation, which pickles the relation again, so it's restored by it
+        state = self.__dict__.copy()
+        state["_on_complete"] = None
+        return state
@@ -0,0 +1,190 @@
+import propagation
+import stats
+import variable
+import space
+from collections.abc import Iterable
+from typing import Optional
+
+
+class ConstraintNetwork:
+    """
+    A list of relations compiled once, so that repeated propagation and search don't have to rebuild
+    which relations watch which variables
+    Variables and relations get dense integer ids (their positions in variables and relations), and
+    the per id structures are plain lists indexed by them
+    """
+
+    def __init__(self, relations: Iterable):
+        self._relations: list = list(relations)
+        # First seen order, so ids are deterministic
+        self._variables: list[variable.Variable] = list(dict.fromkeys(var for rel in self._relations for var in rel._inputs))
+        self._var_ids: dict[variable.Variable, int] = {var: i for i, var in enumerate(self._variables)}
+        self._relation_ids: dict[object, int] = {rel: i for i, rel in enumerate(self._relations)}
+
+        # Distinct variable ids in each relation's scope, in input order
+        self._scopes: list[list[int]] = [list(dict.fromkeys(self._var_ids[var] for var in rel._inputs)) for rel in self._relations]
+        self._arities: list[int] = [len(scope) for scope in self._scopes]
+        # Relation ids on each variable, and variable ids sharing a relation with each variable
+        self._relations_of: list[list[int]] = [[] for _ in self._variables]
+        for r, scope in enumerate(self._scopes):
+            for v in scope:
+                self._relations_of[v].append(r)
+        self._neighbors: list[list[int]] = [
+            sorted({u for r in rels for u in self._scopes[r]} - {v}) for v, rels in enumerate(self._relations_of)
+        ]
+        # The same as _relations_of, keyed by variable and holding relations, which is what propagation needs
+        self._watchers: dict[variable.Variable, list] = {
+            var: [self._relations[r] for r in self._relations_of[v]] for v, var in enumerate(self._variables)
+        }
+        # Relation whose revision wiped out a domain the last time propagation failed
+        self.last_conflict = None
+
+    def __len__(self) -> int:
+        return len(self._relations)
+
+    def __iter__(self):
+        yield from self._relations
+
+    @property
+    def relations(self) -> list:
+        return self._relations.copy()
+
+    @property
+    def variables(self) -> list[variable.Variable]:
+        return self._variables.copy()
+
+    def var_id(self, var: variable.Variable) -> int:
+        return self._var_ids[var]
+
+    def relation_id(self, rel) -> int:
+        return self._relation_ids[rel]
+
+    def scope(self, relation_id: int) -> list[int]:
+        return self._scopes[relation_id]
+
+    def arity(self, relation_id: int) -> int:
+        return self._arities[relation_id]
+
+    def relations_of(self, var_id: int) -> list[int]:
+        return self._relations_of[var_id]
+
+    def neighbors(self, var_id: int) -> list[int]:
+        return self._neighbors[var_id]
+
+    def watchers(self, var: variable.Variable) -> list:
+        """
+        Relations that have var in their scope
+        """
+        return self._watchers.get(var, [])
+
+    def add_relation(self, rel) -> None:
+        """
+        Adds rel, giving it the next relation id and ids to any new variables in its scope
+        Networks must not be edited while a search over them is running
+        """
+        if rel in self._relation_ids:
+            raise ValueError("The relation is already in the network")
+        r = len(self._relations)
+        self._relations.append(rel)
+        self._relation_ids[rel] = r
+        for var in rel._inputs:
+            if var not in self._var_ids:
+                self._var_ids[var] = len(self._variables)
+                self._variables.append(var)
+                self._relations_of.append([])
+                self._neighbors.append([])
+                self._watchers[var] = []
+        scope = list(dict.fromkeys(self._var_ids[var] for var in rel._inputs))
+        self._scopes.append(scope)
+        self._arities.append(len(scope))
+        for v in scope:
+            self._relations_of[v].append(r)
+            self._watchers[self._variables[v]].append(rel)
+            self._neighbors[v] = sorted(set(self._neighbors[v]).union(scope) - {v})
+
+    def remove_relation(self, rel) -> None:
+        """
+        Removes rel, moving the last relation into its id so that ids stay dense
+        Variables keep their ids even once no relation is left on them
+        """
+        r = self._relation_ids.pop(rel)
+        scope = self._scopes[r]
+        for v in scope:
+            self._relations_of[v].remove(r)
+            self._watchers[self._variables[v]].remove(rel)
+        last = len(self._relations) - 1
+        if r != last:
+            moved = self._relations[last]
+            self._relations[r] = moved
+            self._relation_ids[moved] = r
+            self._scopes[r] = self._scopes[last]
+            self._arities[r] = self._arities[last]
+            for v in self._scopes[r]:
+                rels = self._relations_of[v]
+                rels[rels.index(last)] = r
+        self._relations.pop()
+        self._scopes.pop()
+        self._arities.pop()
+        for v in scope:
+            self._neighbors[v] = sorted({u for other in self._relations_of[v] for u in self._scopes[other]} - {v})
+
+    def propagate(self, given_space: space.TrailedSpace, updated_variable: Optional[variable.Variable] = None,
+                  relations: Iterable = ()) -> bool:
+        """
+        Inspired by AC3
+        Same basic concept:
+        - have a queue of constraints to deal with
+        - pick the one that looks cheapest to revise
+        - prune its domain
+        - add to the queue the other constraints on the variables that actually changed
+        - repeat until queue is empty
+        Only the relations on updated_variable are revised at first if it's given, all of them otherwise,
+        along with relations, which are fully revised (e.g. new ones, or ones on variables that regained values)
+        given_space is pruned in place, returns False if some domain was wiped out
+        """
+        watchers = self._watchers
+        recorder = stats.current
+        if recorder is not None:
+            recorder.propagation_rounds += 1
+        queue = propagation.PropagationQueue(given_space)
+        relations = list(relations)
+        if updated_variable is None and not relations:
+            for rel in self._relations:
+                queue.push(rel)
+        elif updated_variable is not None:
+            for rel in watchers.get(updated_variable, ()):
+                queue.push(rel, (updated_variable,))
+        for rel in relations:
+            queue.push(rel)
+
+        # Removals are attributed to the relation being revised, unless a cause is already set: the network of a
+        # relation such as a conjunction leaves them to that relation, which is the one retracted or blamed for them
+        outer_cause = given_space.cause
+        try:
+            while queue:
+                curr, modified = queue.pop()
+                given_space.cause = curr if outer_cause is None else outer_cause
+                if recorder is None:
+                    changed = curr.revise(given_space, modified or None)
+                else:
+                    changed = recorder.revise(curr, given_space, modified or None)
+                propagation.PropagationQueue.record(curr, bool(changed))
+                for var in changed:
+                    if not given_space[var]:
+                        self.last_conflict = curr
+                        return False
+                    for rel in watchers[var]:
+                        if rel is not curr:
+                            queue.push(rel, (var,))
+            return True
+        finally:
+            given_space.cause = outer_cause
+
+    def pruned_space(self, current_space: Optional[space.Space] = None, updated_variable: Optional[variable.Variable] = None) -> space.TrailedSpace:
+        """
+        Same as propagate, but leaves current_space untouched and returns the pruned copy
+        """
+        vars = self._variables if current_space is None else dict.fromkeys(self._variables) | dict.fromkeys(current_space.variables())
+        ret_space = space.TrailedSpace(vars) if current_space is None else space.TrailedSpace.from_space(current_space, vars)
+        self.propagate(ret_space, updated_variable)
+        return ret_space
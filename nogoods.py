@@ -0,0 +1,131 @@
+import space
+import variable
+import domain
+from collections import OrderedDict
+from collections.abc import Iterable, Mapping
+from typing import Optional
+
+
+class Nogood:
+    """
+    A combination of var -> value assignments that was shown to have no solution
+    """
+
+    __slots__ = ("literals", "_variables")
+
+    def __init__(self, literals: Mapping[variable.Variable, object]):
+        self.literals: tuple[tuple[variable.Variable, object], ...] = tuple(literals.items())
+        # Same name as on relations, so removals made by a nogood can be explained like any other
+        self._variables: set[variable.Variable] = set(literals)
+
+    def __len__(self) -> int:
+        return len(self.literals)
+
+    def __repr__(self) -> str:
+        return f"Nogood({dict(self.literals)})"
+
+
+class NogoodStore:
+    """
+    Bounded store of nogoods learned during search, evicting the least recently useful one when full
+    Propagation consults it: a nogood whose literals all hold is a conflict, and one with a single
+    literal left undecided forbids that last value
+    Nogoods only hold for the relations and domains they were learned under, which the store is bound to
+    by the first search that uses it
+    """
+
+    def __init__(self, capacity: int = 1000, max_size: Optional[int] = None):
+        """
+        Nogoods with more than max_size literals are too specific to be worth keeping, and are dropped
+        """
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self._capacity = capacity
+        self._max_size = max_size
+        self._nogoods: OrderedDict[frozenset, Nogood] = OrderedDict()
+        self._watchers: dict[variable.Variable, set[frozenset]] = {}
+        self.learned: int = 0
+        self.evicted: int = 0
+        self.prunings: int = 0
+        self.conflicts: int = 0
+        self.last_conflict: Optional[Nogood] = None
+        # Ids of the relations and domains of the variables at the root of the search the nogoods hold for
+        self._root: Optional[tuple[frozenset[int], dict[variable.Variable, domain.Domain]]] = None
+
+    def bind(self, relations: Iterable, root_space: space.Space, vars: Iterable[variable.Variable]) -> None:
+        """
+        Ties the store to a problem: relations, and the domains of vars in root_space before any pruning
+        Raises ValueError if the store is already tied to another one
+        """
+        ids = frozenset(rel._id for rel in relations)
+        vars = list(vars)
+        if self._root is None:
+            self._root = (ids, {var: root_space[var].copy() for var in vars})
+            return
+        root_ids, root_domains = self._root
+        if ids != root_ids or root_domains.keys() != set(vars) or any(root_space[var] != dom for var, dom in root_domains.items()):
+            raise ValueError("Nogoods learned for other relations or domains don't hold for this search")
+
+    def __len__(self) -> int:
+        return len(self._nogoods)
+
+    def __iter__(self):
+        return iter(self._nogoods.values())
+
+    def add(self, literals: Mapping[variable.Variable, object]) -> Optional[Nogood]:
+        """
+        Records a nogood, returns it unless it was already known or too large
+        """
+        if not literals or (self._max_size is not None and len(literals) > self._max_size):
+            return None
+        key = frozenset(literals.items())
+        if key in self._nogoods:
+            self._nogoods.move_to_end(key)
+            return None
+        nogood = self._nogoods[key] = Nogood(literals)
+        for var in nogood._variables:
+            self._watchers.setdefault(var, set()).add(key)
+        self.learned += 1
+        if len(self._nogoods) > self._capacity:
+            old_key, old = self._nogoods.popitem(last=False)
+            for var in old._variables:
+                self._watchers[var].discard(old_key)
+            self.evicted += 1
+        return nogood
+
+    def propagate(self, given_space: space.TrailedSpace, changed: Iterable[variable.Variable]) -> Optional[list[variable.Variable]]:
+        """
+        Checks the nogoods on the changed variables, pruning given_space in place
+        Returns the variables it pruned, or None if some nogood is violated; the offending nogood is left in last_conflict
+        """
+        keys = set()
+        for var in changed:
+            keys |= self._watchers.get(var, set())
+        pruned = []
+        outer_cause = given_space.cause
+        try:
+            for key in keys:
+                nogood = self._nogoods[key]
+                open_literal = None
+                for var, val in nogood.literals:
+                    dom = given_space[var]
+                    if val not in dom:
+                        break
+                    if len(dom) == 1:
+                        continue
+                    if open_literal is not None:
+                        break
+                    open_literal = (var, val)
+                else:
+                    self._nogoods.move_to_end(key)
+                    if open_literal is None:
+                        self.conflicts += 1
+                        self.last_conflict = nogood
+                        return None
+                    given_space.cause = nogood
+                    given_space.remove(*open_literal)
+                    self.prunings += 1
+                    pruned.append(open_literal[0])
+        finally:
+            given_space.cause = outer_cause
+        return pruned
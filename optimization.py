@@ -0,0 +1,249 @@
+import math
+import itertools
+import relation
+import network
+import variable
+import assignment
+import space
+import solver
+import heuristics
+from time import perf_counter
+from collections.abc import Callable, Iterable, Mapping
+from typing import Optional
+
+
+class Objective:
+    """
+    Cost to minimize: a sum of per-variable costs and of costs over small groups of variables
+    Variable costs are functions of the value, or mappings from values to costs
+    Group costs are (variables, function of their values) pairs, or (relation, weight) pairs that cost weight
+    whenever the relation is violated
+    Maximize something by minimizing its negation
+    """
+    # Groups whose domains have more combinations than this are bounded by their lowest possible cost instead
+    _max_combinations: int = 4096
+
+    def __init__(self, variable_costs: Optional[Mapping[variable.Variable, Callable[[object], float] | Mapping]] = None,
+                 group_costs: Iterable[tuple[Iterable[variable.Variable] | relation.Relation, Callable[..., float] | float]] = ()):
+        self._unary: dict[variable.Variable, Callable[[object], float]] = {}
+        for var, cost in (variable_costs or {}).items():
+            self._unary[var] = cost.__getitem__ if isinstance(cost, Mapping) else cost
+        self._groups: list[tuple[list[variable.Variable], Callable[..., float], float]] = []
+        for scope, cost in group_costs:
+            if isinstance(scope, relation.Relation):
+                self._groups.append((list(dict.fromkeys(scope._inputs)), _Penalty(scope, cost), min(0.0, cost)))
+            else:
+                self._groups.append((list(scope), cost, -math.inf))
+        self._variables: list[variable.Variable] = list(dict.fromkeys(itertools.chain(self._unary, *(scope for scope, _, _ in self._groups))))
+        self._groups_of: dict[variable.Variable, list[int]] = {var: [] for var in self._variables}
+        for g, (scope, _, _) in enumerate(self._groups):
+            for var in dict.fromkeys(scope):
+                self._groups_of[var].append(g)
+
+    @property
+    def variables(self) -> list[variable.Variable]:
+        return self._variables.copy()
+
+    def value(self, values: Mapping[variable.Variable, object] | assignment.Assignment) -> float:
+        ret = sum(cost(values[var]) for var, cost in self._unary.items())
+        for scope, cost, _ in self._groups:
+            ret += cost(*(values[var] for var in scope))
+        return ret
+
+    def _group_bound(self, g: int, given_space: space.Space, fixed: Optional[variable.Variable] = None, val=None) -> float:
+        scope, cost, floor = self._groups[g]
+        doms = [(val,) if var is fixed else given_space[var] for var in scope]
+        if math.prod(len(dom) for dom in doms) > self._max_combinations:
+            return floor
+        return min((cost(*values) for values in itertools.product(*doms)), default=math.inf)
+
+    def _var_bound(self, var: variable.Variable, given_space: space.Space) -> float:
+        """
+        Lowest cost of the terms on var
+        """
+        cost = self._unary.get(var)
+        ret = 0.0 if cost is None else min((cost(a) for a in given_space[var]), default=math.inf)
+        return ret + sum(self._group_bound(g, given_space) for g in self._groups_of[var])
+
+    def _value_bound(self, var: variable.Variable, val, given_space: space.Space) -> float:
+        """
+        Lowest cost of the terms on var once it takes val
+        """
+        cost = self._unary.get(var)
+        ret = 0.0 if cost is None else cost(val)
+        return ret + sum(self._group_bound(g, given_space, var, val) for g in self._groups_of[var])
+
+    def lower_bound(self, given_space: space.Space) -> float:
+        """
+        No assignment within given_space costs less than this
+        """
+        ret = sum(min((cost(a) for a in given_space[var]), default=math.inf) for var, cost in self._unary.items())
+        return ret + sum(self._group_bound(g, given_space) for g in range(len(self._groups)))
+
+
+class _Penalty:
+    """
+    Cost of violating a relation, as a function of the distinct variables of its scope
+    """
+
+    def __init__(self, rel: relation.Relation, weight: float):
+        scope = list(dict.fromkeys(rel._inputs))
+        self._rel = rel
+        self._positions = [scope.index(var) for var in rel._inputs]
+        self._weight = weight
+
+    def __call__(self, *values) -> float:
+        return 0.0 if self._rel._satisfies(*(values[i] for i in self._positions)) else self._weight
+
+
+class _BoundRelation(relation.DiscreteRelation):
+    """
+    Objective strictly below the incumbent's cost, which is lowered by the search after every improvement
+    Revising it removes the values that can't lead below the incumbent, and wipes out a domain once even the
+    optimistic bound of the whole space can't
+    """
+
+    def __init__(self, objective: Objective):
+        self._objective = objective
+        self.incumbent: float = math.inf
+        super().__init__(objective.variables, self._improves)
+
+    def _improves(self, *values) -> bool:
+        return self._objective.value(dict(zip(self._inputs, values))) < self.incumbent
+
+    def revise(self, given_space: space.TrailedSpace, modified: Optional[set[variable.Variable]] = None) -> list[variable.Variable]:
+        objective = self._objective
+        incumbent = self.incumbent
+        if incumbent == math.inf:
+            return []
+        changed = []
+        removed = True
+        # Removals only raise the bound, so each pass can go on with the total it started from
+        while removed:
+            removed = False
+            total = objective.lower_bound(given_space)
+            if total >= incumbent:
+                var = self._inputs[0]
+                given_space.wipe_out(var)
+                return [var]
+            for var in self._inputs:
+                dom = given_space[var]
+                if len(dom) <= 1:
+                    continue
+                rest = total - objective._var_bound(var, given_space)
+                losing = [val for val in dom if rest + objective._value_bound(var, val, given_space) >= incumbent]
+                if losing:
+                    for val in losing:
+                        given_space.remove(var, val)
+                    if var not in changed:
+                        changed.append(var)
+                    removed = True
+        return changed
+
+    def revision_cost(self, given_space: space.Space) -> float:
+        return sum(len(given_space[var]) for var in self._inputs)
+
+
+class CheapestValue(heuristics.ValueOrdering):
+    """
+    Tries first the values with the lowest optimistic cost, so that good incumbents are found early
+    Variables outside the objective keep the domain order
+    """
+
+    def __init__(self, objective: Objective):
+        self._objective = objective
+
+    def order(self, var: variable.Variable, given_space: space.TrailedSpace) -> tuple:
+        values = tuple(given_space[var])
+        if len(values) < 2 or var not in self._objective._groups_of:
+            return values
+        return tuple(sorted(values, key=lambda val: self._objective._value_bound(var, val, given_space)))
+
+
+class OptimizationResult:
+    """
+    Best solution found and how far it's known to be from the optimum
+    optimal means the search went through the whole space, which proves no solution costs less than best;
+    otherwise lower_bound is the optimistic bound of the root, and the optimum lies between it and cost
+    best is empty and cost infinite if no solution was found
+    """
+
+    def __init__(self, best: assignment.Assignment, cost: float, optimal: bool, lower_bound: float,
+                 improvements: list[tuple[float, int, float]], search: solver.BacktrackingSearch):
+        self.best = best
+        self.cost = cost
+        self.optimal = optimal
+        self.lower_bound = cost if optimal else lower_bound
+        # (cost, nodes, seconds) at each improvement
+        self.improvements = improvements
+        self.nodes = search.nodes
+        self.stop_reason = search.stop_reason
+
+    @property
+    def gap(self) -> float:
+        if self.optimal:
+            return 0.0
+        return self.cost - self.lower_bound
+
+    def __repr__(self) -> str:
+        return (f"OptimizationResult(cost={self.cost}, optimal={self.optimal}, lower_bound={self.lower_bound}, "
+                f"improvements={len(self.improvements)}, nodes={self.nodes})")
+
+
+class BranchAndBound:
+    """
+    Depth first branch and bound: the search looks for solutions cheaper than the best one so far, whose cost
+    is posted to propagation as a bound that prunes every subtree whose optimistic cost can't beat it
+    Pruning happens through propagation, so Propagation.NONE only compares the costs of complete assignments
+    """
+
+    def __init__(self, constraints: Iterable[relation.DiscreteRelation] | network.ConstraintNetwork, objective: Objective,
+                 propagation: solver.Propagation = solver.Propagation.MAC, current_space: Optional[space.Space] = None, **options):
+        """
+        options are passed on to solver.BacktrackingSearch, e.g. timeout and max_nodes to get the best solution
+        within a budget, or variable_ordering; values are tried cheapest first unless value_ordering is given
+        """
+        options.setdefault("value_ordering", CheapestValue(objective))
+        constraints = constraints.relations if isinstance(constraints, network.ConstraintNetwork) else list(constraints)
+        self._objective = objective
+        self._bound = _BoundRelation(objective)
+        self._current_space = current_space
+        self._search = solver.BacktrackingSearch(constraints + [self._bound], propagation, current_space=current_space, **options)
+
+    @property
+    def search(self) -> solver.BacktrackingSearch:
+        return self._search
+
+    def cancel(self) -> None:
+        self._search.cancel()
+
+    def solve(self, on_improvement: Optional[Callable[[assignment.Assignment, float], None]] = None) -> OptimizationResult:
+        """
+        Searches until the best solution is proven optimal, or the search is stopped
+        on_improvement is called with each new best solution and its cost
+        """
+        start = perf_counter()
+        root = self._search._network.pruned_space(self._current_space)
+        lower_bound = self._objective.lower_bound(root)
+        best = assignment.Assignment()
+        improvements = []
+        for values in self._search._search():
+            best = assignment.Assignment(values)
+            cost = self._objective.value(values)
+            self._bound.incumbent = cost
+            improvements.append((cost, self._search.nodes, perf_counter() - start))
+            if on_improvement is not None:
+                on_improvement(best, cost)
+            if cost <= lower_bound:
+                # Nothing can do better than the root bound, so there's no need to prove it
+                break
+        cost = improvements[-1][0] if improvements else math.inf
+        return OptimizationResult(best, cost, not self._search.stopped, lower_bound, improvements, self._search)
+
+
+def minimize(constraints: Iterable[relation.DiscreteRelation] | network.ConstraintNetwork, objective: Objective,
+             propagation: solver.Propagation = solver.Propagation.MAC, **options) -> OptimizationResult:
+    """
+    options are passed on to BranchAndBound
+    """
+    return BranchAndBound(constraints, objective, propagation, **options).solve()
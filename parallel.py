@@ -0,0 +1,152 @@
+import math
+import os
+import pickle
+import multiprocessing
+import relation
+import variable
+import assignment
+import space
+import solver
+import network
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from collections.abc import Iterable
+from typing import Optional
+
+try:
+    import cloudpickle
+except ImportError:
+    cloudpickle = None
+
+
+# A worker only gives part of its search away after exploring this many nodes itself,
+# so that freshly started subproblems aren't split straight away
+_MIN_SPLIT_NODES = 1024
+
+
+def dumps_problem(constraints: Iterable[relation.DiscreteRelation]) -> bytes:
+    """
+    Serializes relations so they can be shipped to worker processes
+    Variables and relations pickle by value, and variables compare by name, so they match up on both sides
+    Predicates must be picklable: module level functions (or functools.partial of them) with plain pickle,
+    or anything, lambdas included, when cloudpickle is installed
+    """
+    pickler = cloudpickle if cloudpickle is not None else pickle
+    try:
+        return pickler.dumps(list(constraints))
+    except (pickle.PicklingError, AttributeError, TypeError) as e:
+        raise ValueError("Relations solved in parallel need picklable predicates: "
+                         "use module level functions or install cloudpickle") from e
+
+
+# Per worker state, set by _init_worker
+_network: Optional[network.ConstraintNetwork] = None
+_cancel = None
+_hungry = None
+
+
+def _init_worker(payload: bytes, cancel, hungry) -> None:
+    global _network, _cancel, _hungry
+    # Compiled once per worker and shared by all the subproblems it runs
+    _network = network.ConstraintNetwork(pickle.loads(payload))
+    _cancel = cancel
+    _hungry = hungry
+
+
+def _solve_subproblem(restrictions: dict[variable.Variable, tuple], propagation: solver.Propagation, first_only: bool):
+    """
+    Searches the part of the problem where each variable in restrictions only takes the given values
+    Returns the solution found (first_only) or number of solutions, and the subproblems this worker gave away
+    because other workers were idle
+    """
+    current_space = space.DiscreteSpace({var: var.domain.__class__(vals) for var, vals in restrictions.items()})
+
+    def should_stop() -> bool:
+        if _cancel.is_set():
+            return True
+        # Having backtracked at least once means part of this subproblem is done, so what is given away is
+        # strictly smaller than what was received, even when reaching the frontier takes many nodes
+        if search.nodes >= _MIN_SPLIT_NODES and search.backtracks and _hungry.is_set():
+            _hungry.clear()
+            return True
+        return False
+
+    search = solver.BacktrackingSearch(_network, propagation, current_space, should_stop=should_stop)
+    if first_only:
+        found = next(search._search(), None)
+        result = None if found is None else dict(found)
+    else:
+        result = sum(1 for _ in search._search())
+    if not search.stopped or _cancel.is_set():
+        return result, []
+    return result, [{**restrictions, **sub} for sub in search.frontier()]
+
+
+def split_space(constraints: network.ConstraintNetwork, target: int) -> list[dict[variable.Variable, tuple]]:
+    """
+    Splits the pruned search space into at least target disjoint subproblems (when it has that many values to
+    split) by partitioning the domains of the variables with the fewest values first
+    """
+    pruned = constraints.pruned_space()
+    vars = constraints.variables
+    if not all(pruned[var] for var in vars):
+        return []
+    subproblems = [{}]
+    for var in sorted((var for var in vars if len(pruned[var]) > 1), key=lambda var: len(pruned[var])):
+        if len(subproblems) >= target:
+            break
+        vals = tuple(pruned[var])
+        parts = min(len(vals), math.ceil(target / len(subproblems)))
+        chunks = [vals[i::parts] for i in range(parts)]
+        subproblems = [{**sub, var: chunk} for sub in subproblems for chunk in chunks]
+    return subproblems
+
+
+def _run(constraints: Iterable[relation.DiscreteRelation] | network.ConstraintNetwork, propagation: solver.Propagation, first_only: bool,
+         max_workers: Optional[int], split_factor: int):
+    if not isinstance(constraints, network.ConstraintNetwork):
+        constraints = network.ConstraintNetwork(constraints)
+    payload = dumps_problem(constraints)
+    workers = max_workers or os.cpu_count() or 1
+    context = multiprocessing.get_context()
+    cancel = context.Event()
+    hungry = context.Event()
+    count = 0
+
+    # More subproblems than workers, so that workers finishing early pick up the rest
+    subproblems = split_space(constraints, workers * split_factor)
+    with ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker, initargs=(payload, cancel, hungry)) as pool:
+        try:
+            pending = {pool.submit(_solve_subproblem, sub, propagation, first_only) for sub in subproblems}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    result, given_away = future.result()
+                    if first_only and result is not None:
+                        for other in pending:
+                            other.cancel()
+                        return assignment.Assignment(result)
+                    if not first_only:
+                        count += result
+                    pending.update(pool.submit(_solve_subproblem, sub, propagation, first_only) for sub in given_away)
+                # Fewer tasks than workers means some are idle, so ask the busy ones to give away part of their search
+                if len(pending) < workers:
+                    hungry.set()
+                else:
+                    hungry.clear()
+        finally:
+            # Running searches check this, so leaving the pool doesn't wait for them to finish
+            cancel.set()
+    return assignment.Assignment() if first_only else count
+
+
+def solve(constraints: Iterable[relation.DiscreteRelation] | network.ConstraintNetwork, propagation: solver.Propagation = solver.Propagation.MAC,
+          max_workers: Optional[int] = None, split_factor: int = 4) -> assignment.Assignment:
+    """
+    Returns the first solution any worker finds, or an empty assignment if there is none
+    """
+    return _run(constraints, propagation, True, max_workers, split_factor)
+
+
+def count_solutions(constraints: Iterable[relation.DiscreteRelation] | network.ConstraintNetwork, propagation: solver.Propagation = solver.Propagation.MAC,
+                    max_workers: Optional[int] = None, split_factor: int = 4) -> int:
+    return _run(constraints, propagation, False, max_workers, split_factor)
@@ -0,0 +1,264 @@
+import array
+import itertools
+import json
+import math
+import mmap
+import os
+import struct
+import sys
+import variable
+import domain
+import space
+import relation
+import table
+from collections.abc import Iterable
+from typing import Optional
+
+# File layout: a fixed header, then 8-byte aligned blocks of domain bitmaps, tuple tables and the bitmaps of the
+# tuples that have each value of each column, then a JSON index of the variables and relations that points into the blocks
+# The blocks are only ever read through a shared read-only mapping, so every process loading the same file
+# uses the same pages of the page cache for them
+_MAGIC = b"CSPTABLE"
+_VERSION = 2
+_HEADER = struct.Struct("<8sIIQQ")
+_ALIGNMENT = 8
+
+# Mappings of the files loaded by this process, shared by all the relations read from each of them,
+# along with the file identity they were made for
+_maps: dict[str, tuple[tuple[int, int], memoryview]] = {}
+
+
+def _mapped(path: str) -> memoryview:
+    with open(path, "rb") as f:
+        stat = os.fstat(f.fileno())
+        identity = (stat.st_ino, stat.st_mtime_ns)
+        cached = _maps.get(path)
+        if cached is not None and cached[0] == identity:
+            return cached[1]
+        # A file replaced since it was mapped gets a new mapping, relations still using the old one keep it alive
+        ret = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+    _maps[path] = (identity, ret)
+    return ret
+
+
+class MappedTableRelation(table.TableRelation):
+    """
+    Table relation whose tuples are read from a memory-mapped problem file
+    The per-value bitmasks that filtering uses are read from the file as well, so loading one costs a copy of
+    them rather than a pass over the tuples, and pickling sends the location of the table instead of its tuples
+    so that worker processes share the pages
+    The tuples only become Python objects if asked for
+    """
+    _transient = table.TableRelation._transient + ("_data", "_rows", "_tuples")
+
+    def __init__(self, variables: Iterable[variable.Variable], path: str, offset: int, count: int, typecode: str,
+                 allowed: bool = True, mask_columns: Optional[list[tuple[list[int], int]]] = None):
+        """
+        mask_columns has, for each input, its values and the offset of their bitmasks, stored one after the other
+        """
+        variables = list(variables)
+        if len(set(variables)) != len(variables):
+            raise ValueError("Table relations can't repeat variables")
+        self._path = os.path.abspath(path)
+        self._offset = offset
+        self._count = count
+        self._typecode = typecode
+        self._allowed = allowed
+        self._mask_columns = mask_columns
+        # TableRelation.__init__ would read the tuples straight away, so its own parent sets the relation up
+        relation.DiscreteRelation.__init__(self, variables, self._in_table)
+
+    def _reset_transient(self) -> None:
+        super()._reset_transient()
+        size = array.array(self._typecode).itemsize * self._count * len(self._inputs)
+        # The mapping the relation was loaded from, kept even if the file is replaced
+        self._data: memoryview = _mapped(self._path)
+        # Flat row-major view of the tuples, one value per item
+        self._rows: memoryview = self._data[self._offset:self._offset + size].cast(self._typecode)
+
+    def __getattr__(self, name: str):
+        # Only called for attributes that aren't set, which are the tuples until they're first asked for
+        if name == "_tuples":
+            self._tuples = [self._tuple(k) for k in range(self._count)]
+            return self._tuples
+        raise AttributeError(name)
+
+    def _tuple_count(self) -> int:
+        return self._count
+
+    def _column(self, i: int) -> Iterable:
+        return self._rows[i::len(self._inputs)]
+
+    def _tuple(self, k: int) -> tuple:
+        arity = len(self._inputs)
+        return tuple(self._rows[k * arity:(k + 1) * arity])
+
+    def _index(self) -> list[dict[object, int]]:
+        if self._masks is None and self._mask_columns is not None:
+            size = (self._count + 7) // 8
+            data = self._data
+            self._masks = [{val: int.from_bytes(data[offset + k * size:offset + (k + 1) * size], "little") for k, val in enumerate(values)}
+                           for values, offset in self._mask_columns]
+        return super()._index()
+
+    def _in_table(self, *args) -> bool:
+        if not args:
+            return bool(self._count) == self._allowed
+        # The tuples containing every one of the values, which is at most the one equal to args
+        index = self._index()
+        found = index[0].get(args[0], 0)
+        for masks, val in zip(index[1:], args[1:]):
+            if not found:
+                break
+            found &= masks.get(val, 0)
+        return bool(found) == self._allowed
+
+
+class Problem:
+    """
+    Variables, domains and relations loaded from a problem file
+    """
+
+    def __init__(self, variables: list[variable.Variable], relations: list[relation.DiscreteRelation], domains: space.DiscreteSpace):
+        self.variables = variables
+        self.relations = relations
+        self.space = domains
+
+
+def _domain_entry(dom: domain.Domain, blocks: list[bytes], position: int) -> tuple[dict, int]:
+    """
+    Index entry of dom, adding its bitmap to blocks if it has one
+    Returns the entry and where the next block goes
+    """
+    if isinstance(dom, domain.IntervalDomain):
+        return {"kind": "interval", "ranges": [[r.start, r.stop] for r in dom.intervals()]}, position
+    if not isinstance(dom, domain.DiscreteDomain) and not isinstance(dom, domain.SingletonDomain):
+        raise ValueError("Only finite domains can be written to a problem file")
+    values = list(dom)
+    if not all(isinstance(val, int) for val in values):
+        raise ValueError("Problem files only hold integer values")
+    lo = min(values, default=0)
+    mask = 0
+    for val in values:
+        mask |= 1 << (val - lo)
+    size = (mask.bit_length() + 7) // 8
+    blocks.append(mask.to_bytes(size, "little"))
+    kind = "bitset" if isinstance(dom, domain.BitsetDomain) else "set"
+    return {"kind": kind, "lo": lo, "offset": position, "size": size}, _aligned(position + size)
+
+
+def _table_entry(rel: relation.DiscreteRelation, scope: list[variable.Variable], given_space: space.DiscreteSpace) -> tuple[list[tuple], bool]:
+    """
+    Tuples over scope of a table equivalent to rel within given_space, and whether they are the allowed ones
+    Predicates are materialized as whichever of their satisfying and violating tuples there are fewer of
+    """
+    if isinstance(rel, table.TableRelation) and rel._inputs == scope:
+        return rel._tuples, rel._allowed
+    doms = [given_space[var] for var in scope]
+    if not all(isinstance(dom, (domain.DiscreteDomain, domain.SingletonDomain)) for dom in doms):
+        raise ValueError("Relations can only be materialized over finite domains")
+    allowed = list(dict.fromkeys(tuple(assign[var] for var in scope) for assign in rel.satisfying_assignments(given_space)))
+    if 2 * len(allowed) <= math.prod(len(dom) for dom in doms):
+        return allowed, True
+    allowed_set = set(allowed)
+    return [values for values in itertools.product(*doms) if values not in allowed_set], False
+
+
+def _aligned(position: int) -> int:
+    return -(-position // _ALIGNMENT) * _ALIGNMENT
+
+
+def write(path: str, relations: Iterable[relation.DiscreteRelation], current_space: Optional[space.DiscreteSpace] = None) -> None:
+    """
+    Writes relations to path as extensional tables, with the domains of their variables in current_space
+    (their own domains by default); variables of current_space outside the relations are written too
+    Relations that aren't tables are materialized, which goes through the product of their domains
+    """
+    relations = list(relations)
+    if current_space is None:
+        current_space = space.DiscreteSpace()
+    vars = list(dict.fromkeys(itertools.chain((var for rel in relations for var in rel._inputs), current_space.variables())))
+    var_ids = {var: i for i, var in enumerate(vars)}
+
+    blocks: list[bytes] = []
+    position = _aligned(_HEADER.size)
+    var_entries = []
+    for var in vars:
+        entry, position = _domain_entry(current_space[var], blocks, position)
+        entry["name"] = str(var)
+        var_entries.append(entry)
+
+    rel_entries = []
+    for rel in relations:
+        scope = list(dict.fromkeys(rel._inputs))
+        tuples, allowed = _table_entry(rel, scope, current_space)
+        values = [val for t in tuples for val in t]
+        if not all(isinstance(val, int) for val in values):
+            raise ValueError("Problem files only hold integer values")
+        typecode = "i" if all(-2 ** 31 <= val < 2 ** 31 for val in values) else "q"
+        data = array.array(typecode, values).tobytes()
+        blocks.append(data)
+        entry = {"scope": [var_ids[var] for var in scope], "allowed": allowed, "typecode": typecode,
+                 "offset": position, "count": len(tuples), "masks": []}
+        position = _aligned(position + len(data))
+        for i in range(len(scope)):
+            masks = table.column_masks((t[i] for t in tuples), len(tuples))
+            data = b"".join(masks.values())
+            blocks.append(data)
+            entry["masks"].append([list(masks), position])
+            position = _aligned(position + len(data))
+        rel_entries.append(entry)
+
+    index = json.dumps({"byteorder": sys.byteorder, "variables": var_entries, "relations": rel_entries}).encode()
+    # Written beside the target and moved over it, so processes that mapped the previous file keep reading it intact
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "wb") as f:
+        f.write(_HEADER.pack(_MAGIC, _VERSION, 0, position, len(index)))
+        for block in blocks:
+            f.write(bytes(_aligned(f.tell()) - f.tell()))
+            f.write(block)
+        f.write(bytes(position - f.tell()))
+        f.write(index)
+    os.replace(temporary, path)
+
+
+def load(path: str, variables: Iterable[variable.Variable] = ()) -> Problem:
+    """
+    Maps the file at path, making a variable for each one in it unless a variable with its name is given
+    Variable names are unique within a process, so a process that already has the variables has to pass them
+    Relations unpickled in other processes map the file again by path, so it must still be there
+    """
+    path = os.path.abspath(path)
+    data = _mapped(path)
+    magic, version, _, index_offset, index_size = _HEADER.unpack_from(data)
+    if magic != _MAGIC:
+        raise ValueError(f"{path} is not a problem file")
+    if version != _VERSION:
+        raise ValueError(f"Unsupported problem file version {version}")
+    index = json.loads(bytes(data[index_offset:index_offset + index_size]))
+    if index["byteorder"] != sys.byteorder:
+        raise ValueError("The problem file was written on a machine with a different byte order")
+
+    known = {str(var): var for var in variables}
+    vars = []
+    doms = {}
+    for entry in index["variables"]:
+        if entry["kind"] == "interval":
+            dom = domain.IntervalDomain()
+            for lo, hi in entry["ranges"]:
+                dom.add(range(lo, hi))
+        else:
+            mask = int.from_bytes(data[entry["offset"]:entry["offset"] + entry["size"]], "little")
+            if entry["kind"] == "bitset":
+                dom = domain.BitsetDomain.from_mask(mask << entry["lo"])
+            else:
+                dom = domain.DiscreteDomain(val + entry["lo"] for val in domain.BitsetDomain.from_mask(mask))
+        var = known.get(entry["name"])
+        if var is None:
+            var = variable.Variable(dom.copy(), entry["name"])
+        vars.append(var)
+        doms[var] = dom
+
+    rels = [MappedTableRelation([vars[i] for i in entry["scope"]], path, entry["offset"], entry["count"],
+                                entry["typecode"], entry["allowed"], entry["masks"]) for entry in index["relations"]]
+    return Problem(vars, rels, space.DiscreteSpace(doms))
@@ -0,0 +1,57 @@
+import heapq
+import itertools
+import variable
+from collections.abc import Iterable
+from typing import Optional
+
+
+class PropagationQueue:
+    """
+    Priority queue of relations waiting to be revised
+    Each pending relation remembers which of its variables changed since it was queued, and relations
+    that are cheap to revise, or whose recent revisions pruned something, come out first
+    """
+    # How much of a relation's effectiveness is kept after each of its revisions
+    _decay: float = 0.5
+
+    def __init__(self, space):
+        self._space = space
+        self._heap: list[tuple[float, int, object]] = []
+        self._modified: dict[object, Optional[set[variable.Variable]]] = {}
+        self._counter = itertools.count()
+
+    def __bool__(self) -> bool:
+        return bool(self._modified)
+
+    def __len__(self) -> int:
+        return len(self._modified)
+
+    def push(self, relation, modified: Iterable[variable.Variable] = ()) -> None:
+        """
+        Queues relation for a revision limited to the variables in modified, or a full one if modified is empty
+        """
+        modified = set(modified) or None
+        if relation in self._modified:
+            pending = self._modified[relation]
+            # A pending full revision stays full, and a full one absorbs a pending partial one
+            if pending is not None:
+                if modified is None:
+                    self._modified[relation] = None
+                else:
+                    pending.update(modified)
+            return
+        self._modified[relation] = modified
+        priority = relation.revision_cost(self._space) / (1 + relation._recent_effect)
+        heapq.heappush(self._heap, (priority, next(self._counter), relation))
+
+    def pop(self) -> tuple[object, Optional[set[variable.Variable]]]:
+        """
+        Returns the next relation along with the variables that changed since it was queued
+        None instead of the variables means the relation has to be fully revised
+        """
+        _, _, relation = heapq.heappop(self._heap)
+        return relation, self._modified.pop(relation)
+
+    @classmethod
+    def record(cls, relation, effective: bool) -> None:
+        relation._recent_effect = relation._recent_effect * cls._decay + effective
@@ -1,8 +1,13 @@
 import itertools
+import math
 import variable
 import domain
 import assignment
 import space
+import network
+import stats
+import memo
+import consistency
 from collections.abc import Iterator, Iterable
 from typing import Optional
 
@@ -17,11 +22,32 @@ class Relation:
         self._variables: set[variable.Variable] = set(self._inputs)
         self._satisfies = satisfies
         self._default_space = self._space_type(self._variables)
+        # Decayed count of the recent revisions that pruned something, used to schedule propagation
+        self._recent_effect: float = 0.0
 
         # Sequential id for each relation for hashing
         self._id: int = Relation._count
         Relation._count += 1
 
+    # Caches that are rebuilt on demand, so they are left out when pickling
+    _transient: tuple[str, ...] = ()
+
+    def __getstate__(self):
+        # Relations are pickled to ship them to other processes, where the predicate has to be importable
+        # (module level functions, not lambdas or closures) unless a pickler like cloudpickle is used
+        state = self.__dict__.copy()
+        state["_recent_effect"] = 0.0
+        for name in self._transient:
+            state.pop(name, None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._reset_transient()
+
+    def _reset_transient(self) -> None:
+        pass
+
     def __hash__(self):
         return hash(self._id)
     
@@ -29,10 +55,7 @@ class Relation:
         return self._id == other._id
     
     def __and__(self, other: "Relation"):
-        return self.__class__(
-            self._inputs + other._inputs,
-            lambda *args: self._satisfies(*args[:self.arity]) and other._satisfies(*args[self.arity:])
-        )
+        return ConjunctionRelation([self, other])
     
     def __or__(self, other: "Relation"):
         return self.__class__(
@@ -72,55 +95,100 @@ class Relation:
     def pruned_space(self, given_space: Optional[_space_type] = None) -> _space_type:
         raise NotImplementedError
 
-    @classmethod
-    def pruned_space_for_all(cls, relations: Iterable["Relation"], current_space: space.Space = None, updated_variable: variable.Variable = None) -> _space_type:
+    def revise(self, given_space: space.TrailedSpace, modified: Optional[set[variable.Variable]] = None) -> list[variable.Variable]:
         """
-        Inspired by AC3
-        Same basic concept:
-        - have a list of constraints to deal with
-        - pick one
-        - prune its domain
-        - add to the list any other constraints that share a domain
-        - repeat until list is empty
+        Prunes given_space in place, returns the variables whose domains changed
+        modified is the set of variables that changed since the last revision, None (or empty) if unknown
+        Subclasses should override this to avoid going through pruned_space
         """
+        new_space = self.pruned_space(given_space)
+        return [var for var in self._variables if given_space.restrict(var, new_space[var])]
 
-        # Setup
-        all_vars = set(itertools.chain.from_iterable(relation._variables for relation in relations))
-        ret_space = cls._space_type(all_vars) if current_space is None else current_space
-
-        # TODO: maybe put something to not recreate this if set of constraints remains the same?
-        relations_by_var = {var: [] for var in all_vars}
-        for relation in relations:
-            for var in relation._variables:
-                relations_by_var[var].append(relation)
-
-        # Main loop
-        remaining = set(relations) if updated_variable is None else set(relations_by_var[updated_variable])
-        while remaining:
-            for curr in remaining:
-                break
-
-            new_space = curr.pruned_space(ret_space)
-            if new_space == ret_space:
-                remaining.discard(curr)
-                continue
-            ret_space = new_space
+    def revision_cost(self, given_space: space.Space) -> float:
+        """
+        Rough estimate of how much work a revision takes, used to order the propagation queue
+        """
+        cost = 1
+        for var in self._variables:
+            cost *= len(given_space[var])
+        return cost
 
-            for var in curr._inputs:
-                remaining.update(relations_by_var[var])
-            remaining.discard(curr)
+    @classmethod
+    def propagate(cls, relations: Iterable["Relation"] | network.ConstraintNetwork, given_space: space.TrailedSpace, updated_variable: variable.Variable = None) -> bool:
+        """
+        Prunes given_space in place, returns False if some domain was wiped out
+        Pass a ConstraintNetwork instead of a list of relations to avoid recompiling it on every call
+        """
+        if not isinstance(relations, network.ConstraintNetwork):
+            relations = network.ConstraintNetwork(relations)
+        return relations.propagate(given_space, updated_variable)
 
-        return ret_space
+    @classmethod
+    def pruned_space_for_all(cls, relations: Iterable["Relation"] | network.ConstraintNetwork, current_space: space.Space = None, updated_variable: variable.Variable = None,
+                             level: consistency.Consistency = consistency.Consistency.ARC) -> _space_type:
+        """
+        Same as propagate, but leaves current_space untouched and returns the pruned copy
+        Stronger levels than ARC prune the whole space, ignoring updated_variable; see consistency.preprocess for
+        how much each one removed
+        """
+        if level is not consistency.Consistency.ARC:
+            return consistency.preprocess(relations, current_space, [level])[0]
+        if not isinstance(relations, network.ConstraintNetwork):
+            relations = network.ConstraintNetwork(relations)
+        return relations.pruned_space(current_space, updated_variable)
 
 
 class DiscreteRelation(Relation):
     _domain_type = domain.Domain
     _space_type = space.DiscreteSpace
+    # Relations over at most this many variables are revised by searching for supports (AC3 with residues)
+    # Wider relations enumerate the product of their domains once per revision
+    _residue_max_arity: int = 3
+    _transient = ("_residues",)
 
     def __init__(self, variables: Iterable[variable.Variable], satisfies):
         if not all(isinstance(var.domain, self._domain_type) for var in variables):
             raise ValueError("All variables must have discrete domains")
         super().__init__(variables, satisfies)
+        # Fixed order for the variables, and the position in it of each input
+        # Conjunctions can repeat variables in _inputs, so the two differ
+        self._vars: list[variable.Variable] = list(self._variables)
+        self._positions: list[int] = [self._vars.index(var) for var in self._inputs]
+        # Set by memoize: the cached predicate, and the table it was promoted to once complete
+        self._memo: Optional[memo.MemoizedPredicate] = None
+        self._table: Optional[DiscreteRelation] = None
+        self._reset_transient()
+
+    def _reset_transient(self) -> None:
+        # (position in _vars, value) -> last tuple over _vars found to support that value
+        self._residues: dict[tuple[int, object], tuple] = {}
+        if self._memo is not None and self._memo._complete_size is not None:
+            self._memo._on_complete = self._promote
+
+    def memoize(self, maxsize: Optional[int] = 4096, promote: bool = False) -> "DiscreteRelation":
+        """
+        Caches the results of the predicate by input values, keeping at most maxsize of them (None for no bound)
+        With promote, once every tuple of the product of the variables' domains has been cached, the relation
+        is revised as an extensional table of its satisfying tuples from then on
+        Returns the relation itself
+        """
+        if promote and len(self._variables) != len(self._inputs):
+            raise ValueError("Relations that repeat inputs can't be promoted to tables")
+        predicate = self._satisfies if self._memo is None else self._memo.predicate
+        complete_size = math.prod(len(var.domain) for var in self._inputs) if promote else None
+        self._memo = memo.MemoizedPredicate(predicate, maxsize, complete_size, self._promote if promote else None)
+        self._satisfies = self._memo
+        self._table = None
+        return self
+
+    @property
+    def cache(self) -> Optional[memo.MemoizedPredicate]:
+        return self._memo
+
+    def _promote(self, cache: memo.MemoizedPredicate) -> None:
+        # Imported here since table builds on this module
+        import table
+        self._table = table.TableRelation(self._inputs, cache.satisfying())
 
     def __iter__(self) -> Iterator[assignment.Assignment]:
         return self.satisfying_assignments()
@@ -136,17 +204,191 @@ class DiscreteRelation(Relation):
             given_space = self._space_type()
         return (assign for assign in given_space[self._variables] if not self.violated(assign))
 
+    def _check(self, values: tuple) -> bool:
+        return self._satisfies(*(values[i] for i in self._positions))
+
+    def revise(self, given_space: space.TrailedSpace, modified: Optional[set[variable.Variable]] = None) -> list[variable.Variable]:
+        if self._table is not None:
+            return self._table.revise(given_space, modified)
+        if len(self._vars) <= self._residue_max_arity:
+            return self._revise_with_residues(given_space, modified)
+        return self._revise_by_enumeration(given_space)
+
+    def revision_cost(self, given_space: space.Space) -> float:
+        if self._table is not None:
+            return self._table.revision_cost(given_space)
+        return super().revision_cost(given_space)
+
+    def _find_support(self, i: int, val, doms: list[domain.Domain]) -> Optional[tuple]:
+        if len(doms) == 2:
+            # itertools.product reads all of its inputs up front, which would cost a full pass over the
+            # other domain even when its first value is a support
+            for other in doms[1 - i]:
+                values = (val, other) if i == 0 else (other, val)
+                if self._check(values):
+                    return values
+            return None
+        for values in itertools.product(*doms[:i], (val,), *doms[i + 1:]):
+            if self._check(values):
+                return values
+        return None
+
+    def _revise_with_residues(self, given_space: space.TrailedSpace, modified: Optional[set[variable.Variable]] = None) -> list[variable.Variable]:
+        """
+        For each value, first check whether its last support is still valid, and only search for a new one
+        if it isn't. Supports are recorded for every value in them, since a tuple supports all of its values
+        """
+        vars = self._vars
+        residues = self._residues
+        doms = [given_space[var] for var in vars]
+        changed = []
+        for i, var in enumerate(vars):
+            # Values only lose supports when some other variable loses values
+            if modified and not changed and modified == {var}:
+                continue
+            unsupported = []
+            # The value itself is in its domain, so only the other positions of a residue need checking
+            others = [j for j in range(len(vars)) if j != i]
+            single = others[0] if len(others) == 1 else None
+            for val in doms[i]:
+                residue = residues.get((i, val))
+                if residue is not None:
+                    if single is not None:
+                        if residue[single] in doms[single]:
+                            continue
+                    elif all(residue[j] in doms[j] for j in others):
+                        continue
+                support = self._find_support(i, val, doms)
+                if support is None:
+                    unsupported.append(val)
+                    continue
+                for j, v in enumerate(support):
+                    residues[(j, v)] = support
+            if unsupported:
+                for val in unsupported:
+                    given_space.remove(var, val)
+                doms[i] = given_space[var]
+                changed.append(var)
+        return changed
+
+    def _revise_by_enumeration(self, given_space: space.TrailedSpace) -> list[variable.Variable]:
+        vars = self._vars
+        supported = [set() for _ in vars]
+        for values in itertools.product(*(given_space[var] for var in vars)):
+            if self._check(values):
+                for i, val in enumerate(values):
+                    supported[i].add(val)
+                # TODO: add loopbreaker for when every value is supported
+
+        changed = []
+        for var, sup in zip(vars, supported):
+            unsupported = [val for val in given_space[var] if val not in sup]
+            for val in unsupported:
+                given_space.remove(var, val)
+            if unsupported:
+                changed.append(var)
+        return changed
+
     def pruned_space(self, given_space: Optional[_space_type] = None) -> _space_type:
-        ret_space = self._space_type.empty(self._variables)
-        for assign in self.nonviolating_assignments(given_space):
-            for var in assign:
-                ret_space.add(var, assign[var])
-                # TODO: add loopbreaker for when ret_space is full
-        return ret_space & given_space[set(given_space.variables()) - self._variables]
-        # last line is equivalent to this:
-        # return ret_space & given_space
-        # but the way I wrote it should be faster
-    
+        if given_space is None:
+            given_space = self._space_type(self._variables)
+        ret_space = space.TrailedSpace.from_space(given_space, self._variables | set(given_space.variables()))
+        if stats.current is None:
+            self.revise(ret_space)
+        else:
+            stats.current.revise(self, ret_space)
+        return ret_space
+
+
+
+class ConjunctionRelation(DiscreteRelation):
+    """
+    Conjunction of relations that keeps its children instead of wrapping them in one predicate
+    Nested conjunctions are flattened, and every variable appears once in the inputs
+    """
+
+    def __init__(self, relations: Iterable[Relation]):
+        self._children: list[Relation] = []
+        for rel in relations:
+            if isinstance(rel, ConjunctionRelation):
+                self._children.extend(rel._children)
+            else:
+                self._children.append(rel)
+        inputs = list(dict.fromkeys(itertools.chain.from_iterable(rel._inputs for rel in self._children)))
+        self._network = network.ConstraintNetwork(self._children)
+        index = {var: i for i, var in enumerate(inputs)}
+        self._child_positions: list[list[int]] = [[index[var] for var in rel._inputs] for rel in self._children]
+        # A bound method rather than a closure, so the conjunction can be pickled
+        super().__init__(inputs, self._all_satisfied)
+
+    def _all_satisfied(self, *args) -> bool:
+        return all(rel._satisfies(*(args[i] for i in positions)) for rel, positions in zip(self._children, self._child_positions))
+
+    @property
+    def children(self) -> list[Relation]:
+        return self._children.copy()
+
+    def satisfied(self, assign: assignment.Assignment) -> bool:
+        return all(rel.satisfied(assign) for rel in self._children)
+
+    def violated(self, assign: assignment.Assignment) -> bool:
+        return any(rel.violated(assign) for rel in self._children)
+
+    def revise(self, given_space: space.TrailedSpace, modified: Optional[set[variable.Variable]] = None) -> list[variable.Variable]:
+        sizes = {var: len(given_space[var]) for var in self._vars}
+        self._network.propagate(given_space)
+        return [var for var, size in sizes.items() if len(given_space[var]) != size]
+
+    def revision_cost(self, given_space: space.Space) -> float:
+        return sum(rel.revision_cost(given_space) for rel in self._children)
+
+    def _binding_order(self) -> tuple[list[variable.Variable], list[list[Relation]]]:
+        """
+        Greedy variable order that completes the scopes of children as early as possible
+        Returns the order, and for each position the children whose scope is complete once it is bound
+        """
+        unbound = {id(rel): set(rel._variables) for rel in self._children}
+        remaining = list(self._inputs)
+        order, checks = [], []
+        while remaining:
+            var = max(remaining, key=lambda v: (
+                sum(1 for rel in self._children if unbound[id(rel)] == {v}),
+                sum(1 for rel in self._children if v in unbound[id(rel)]),
+            ))
+            remaining.remove(var)
+            order.append(var)
+            done = []
+            for rel in self._children:
+                scope = unbound[id(rel)]
+                if var in scope:
+                    scope.discard(var)
+                    if not scope:
+                        done.append(rel)
+            checks.append(done)
+        return order, checks
+
+    def satisfying_assignments(self, given_space: Optional[space.DiscreteSpace] = None) -> Iterator[assignment.Assignment]:
+        """
+        Extends partial assignments one variable at a time, checking each child as soon as its scope is bound
+        """
+        if given_space is None:
+            given_space = self._space_type()
+        order, checks = self._binding_order()
+        doms = [given_space[var] for var in order]
+        values: dict[variable.Variable, object] = {}
+
+        def extend(depth: int) -> Iterator[assignment.Assignment]:
+            if depth == len(order):
+                yield assignment.Assignment(values)
+                return
+            var = order[depth]
+            for val in doms[depth]:
+                values[var] = val
+                if all(rel._satisfies(*(values[v] for v in rel._inputs)) for rel in checks[depth]):
+                    yield from extend(depth + 1)
+            values.pop(var, None)
+
+        return extend(0)
 
 
 if __name__ == "__main__":
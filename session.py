@@ -0,0 +1,140 @@
+import relation
+import network
+import variable
+import domain
+import assignment
+import space
+import solver
+from collections.abc import Iterable, Iterator
+from typing import Optional
+
+
+class SolverSession:
+    """
+    Keeps a problem pruned across a stream of edits, so that each one costs about as much as its effect:
+    - a new relation is revised, and propagation only goes on from the variables it pruned
+    - a restricted domain propagates from that variable only
+    - a retracted relation puts back the values it justified pruning, along with the values pruned later
+      by relations that had seen those removals, then revises only the relations on the variables that regained values
+    Every removal in the pruned space is trailed along with the relation that made it, which is the justification
+    """
+
+    def __init__(self, relations: Iterable[relation.DiscreteRelation] = (), current_space: Optional[space.Space] = None):
+        self._network = network.ConstraintNetwork(relations)
+        vars = self._network.variables if current_space is None else dict.fromkeys(self._network.variables) | dict.fromkeys(current_space.variables())
+        self._space = space.TrailedSpace(vars) if current_space is None else space.TrailedSpace.from_space(current_space, vars)
+        self._space.record_causes()
+        # Domains the user narrowed variables to, which hold whatever relations are retracted
+        self._restrictions: dict[variable.Variable, domain.Domain] = {}
+        # Trail position of the first removal each relation made, where replaying for its retraction starts
+        self._first_removal: dict[relation.DiscreteRelation, int] = {}
+        self.consistent: bool = self._network.propagate(self._space)
+        self._index_removals(0)
+
+    def _index_removals(self, checkpoint: int) -> None:
+        trail_space = self._space
+        for i in range(checkpoint, trail_space.checkpoint()):
+            cause = trail_space.cause_at(i)
+            if cause is not None:
+                self._first_removal.setdefault(cause, i)
+
+    @property
+    def relations(self) -> list[relation.DiscreteRelation]:
+        return self._network.relations
+
+    @property
+    def space(self) -> space.TrailedSpace:
+        """
+        The current pruned space, which must not be modified directly
+        """
+        return self._space
+
+    def __getitem__(self, var: variable.Variable) -> domain.Domain:
+        return self._space[var]
+
+    def add_relation(self, rel: relation.DiscreteRelation) -> bool:
+        """
+        Returns whether the problem can still be consistent
+        """
+        self._network.add_relation(rel)
+        checkpoint = self._space.checkpoint()
+        if self.consistent:
+            self.consistent = self._network.propagate(self._space, relations=[rel])
+        self._index_removals(checkpoint)
+        return self.consistent
+
+    def restrict(self, var: variable.Variable, dom: domain.Domain) -> bool:
+        """
+        Narrows the domain of var to dom, for good: retracting relations never puts these values back
+        Returns whether the problem can still be consistent
+        """
+        self._restrictions[var] = self._restrictions[var] & dom if var in self._restrictions else dom
+        self._space.cause = None
+        checkpoint = self._space.checkpoint()
+        changed = self._space.restrict(var, dom)
+        if not self._space[var]:
+            self.consistent = False
+        elif changed and self.consistent:
+            self.consistent = self._network.propagate(self._space, updated_variable=var)
+        self._index_removals(checkpoint)
+        return self.consistent
+
+    def remove_relation(self, rel: relation.DiscreteRelation) -> bool:
+        """
+        Retracts rel, putting back the values its removals justified
+        Returns whether the problem can be consistent now
+        """
+        self._network.remove_relation(rel)
+        trail_space = self._space
+        # Replay the trail from the first removal rel made, collecting its removals, and the ones that relations
+        # made after some other variable in their scope lost a value that is being put back
+        start = self._first_removal.pop(rel, trail_space.checkpoint())
+        retracted = []
+        regaining: set[variable.Variable] = set()
+        # Relations with removals past start, whose first positions may move once entries are dropped
+        moved = set()
+        for i in range(start, trail_space.checkpoint()):
+            cause = trail_space.cause_at(i)
+            if cause is None:
+                continue
+            moved.add(cause)
+            var, _ = trail_space.trail_entry(i)
+            if cause is rel or any(other in regaining for other in cause._variables if other != var):
+                retracted.append(i)
+                regaining.add(var)
+        regained = trail_space.reinstate(retracted)
+        for cause in moved:
+            if self._first_removal.get(cause, -1) >= start:
+                del self._first_removal[cause]
+        # Some of the values put back may have been removed by a relation before the user restricted them away too
+        trail_space.cause = None
+        for var in regained:
+            if var in self._restrictions:
+                trail_space.restrict(var, self._restrictions[var])
+
+        if not self.consistent:
+            # Propagation stopped at a wipeout, so there is no fixpoint to start again from
+            self.consistent = all(trail_space[var] for var in trail_space.variables()) and self._network.propagate(trail_space)
+        elif regained:
+            # Values came back, so every relation on those variables has to look at them again
+            affected = dict.fromkeys(other for var in regained for other in self._network.watchers(var))
+            self.consistent = self._network.propagate(trail_space, relations=affected)
+        self._index_removals(start)
+        return self.consistent
+
+    def solutions(self, limit: Optional[int] = None, propagation: solver.Propagation = solver.Propagation.MAC,
+                  **options) -> Iterator[assignment.Assignment]:
+        """
+        Searches from the current pruned space without propagating it again
+        options are passed on to solver.BacktrackingSearch
+        """
+        if not self.consistent:
+            return iter(())
+        return solver.BacktrackingSearch(self._network, propagation, current_space=self._space, propagated=True,
+                                         **options).solutions(limit)
+
+    def solve(self, propagation: solver.Propagation = solver.Propagation.MAC, **options) -> assignment.Assignment:
+        """
+        Returns the first solution found, or an empty assignment if there is none
+        """
+        return next(self.solutions(1, propagation, **options), assignment.Assignment())
@@ -1,5 +1,423 @@
 import relation
+import network
+import variable
+import assignment
+import space
+import heuristics
+import nogoods
+import stats
+import bisect
+from time import perf_counter
+from enum import Enum
+from collections.abc import Callable, Iterable, Iterator
+from typing import Optional
 
 
-def discrete_solver():
-    pass
+class Propagation(Enum):
+    NONE = "none"
+    # Revise only the relations that involve the variable that was just assigned
+    FORWARD_CHECKING = "forward_checking"
+    # Maintain arc consistency: propagate until nothing else can be pruned
+    MAC = "mac"
+
+
+def propagate_assignment(constraints: network.ConstraintNetwork, curr_space: space.TrailedSpace, var: variable.Variable, val,
+                         propagation: Propagation) -> bool:
+    """
+    Assigns val to var in curr_space and prunes it in place
+    Returns False if some domain was wiped out
+    """
+    curr_space.assign(var, val)
+    if propagation is Propagation.FORWARD_CHECKING:
+        outer_cause = curr_space.cause
+        recorder = stats.current
+        if recorder is not None:
+            recorder.propagation_rounds += 1
+        try:
+            for rel in constraints.watchers(var):
+                curr_space.cause = rel
+                changed_vars = rel.revise(curr_space, {var}) if recorder is None else recorder.revise(rel, curr_space, {var})
+                for changed in changed_vars:
+                    if not curr_space[changed]:
+                        constraints.last_conflict = rel
+                        return False
+        finally:
+            curr_space.cause = outer_cause
+    elif propagation is Propagation.MAC:
+        return constraints.propagate(curr_space, updated_variable=var)
+    return True
+
+
+class Progress:
+    """
+    Snapshot of a running search, passed to progress callbacks
+    best is the latest solution found, if any
+    """
+
+    __slots__ = ("nodes", "backtracks", "fails", "depth", "solutions", "elapsed", "best")
+
+    def __init__(self, nodes: int, backtracks: int, fails: int, depth: int, solutions: int, elapsed: float,
+                 best: Optional[assignment.Assignment]):
+        self.nodes = nodes
+        self.backtracks = backtracks
+        self.fails = fails
+        self.depth = depth
+        self.solutions = solutions
+        self.elapsed = elapsed
+        self.best = best
+
+    def __repr__(self) -> str:
+        return (f"Progress(nodes={self.nodes}, backtracks={self.backtracks}, fails={self.fails}, depth={self.depth}, "
+                f"solutions={self.solutions}, elapsed={self.elapsed:.3f})")
+
+
+class BacktrackingSearch:
+    """
+    Depth first search over the solutions of a list of relations
+    The search keeps a single TrailedSpace and an explicit stack, so it can be suspended after any solution
+    and resumed later without redoing work, and deep problems don't hit the recursion limit
+    """
+
+    # How many nodes to explore between calls to should_stop
+    _stop_check_interval: int = 256
+
+    def __init__(self, constraints: Iterable[relation.DiscreteRelation] | network.ConstraintNetwork, propagation: Propagation = Propagation.MAC,
+                 current_space: Optional[space.Space] = None, should_stop: Optional[Callable[[], bool]] = None,
+                 variable_ordering: Optional[heuristics.VariableOrdering] = None, value_ordering: Optional[heuristics.ValueOrdering] = None,
+                 restarts: Optional[int] = None, seed: Optional[int] = None,
+                 backjumping: bool = False, nogood_store: Optional[int | nogoods.NogoodStore] = None, propagated: bool = False,
+                 timeout: Optional[float] = None, max_nodes: Optional[int] = None,
+                 on_progress: Optional[Callable[[Progress], None]] = None, progress_interval: int = 10000):
+        """
+        restarts is the number of dead ends allowed in the first run before restarting, scaled by the Luby
+        sequence for later runs. Restarts stop once a solution is found, so enumeration stays complete and
+        never repeats a solution; pair them with a randomized or learning (DomWDeg) variable ordering
+        backjumping tracks which earlier assignments explain each dead end (conflict-directed backjumping),
+        and jumps straight back to the latest of them instead of the previous level
+        nogood_store is a NogoodStore, or the capacity of a new one, in which backjumping records the assignments
+        that explained each exhausted variable; propagation then checks them so the dead end isn't revisited
+        propagated says current_space is already pruned by the constraints, so the search starts from a copy
+        of it instead of propagating everything again
+        timeout (seconds from the start of the search) and max_nodes stop the search like should_stop does,
+        and so does cancel; stop_reason then says which one it was
+        on_progress is called every progress_interval nodes
+        """
+        if nogood_store is not None and not backjumping:
+            raise ValueError("nogoods are learned from the conflict sets of backjumping")
+        if isinstance(nogood_store, int):
+            nogood_store = nogoods.NogoodStore(nogood_store)
+        if not isinstance(constraints, network.ConstraintNetwork):
+            constraints = network.ConstraintNetwork(constraints)
+        self._network = constraints
+        self._constraints = constraints.relations
+        self._propagation = propagation
+        self._vars: list[variable.Variable] = constraints.variables
+        self._current_space = current_space
+        self._should_stop = should_stop
+        self._variable_ordering = heuristics.Dom() if variable_ordering is None else variable_ordering
+        self._value_ordering = heuristics.ValueOrdering() if value_ordering is None else value_ordering
+        self._restarts = restarts
+        self._seed = seed
+        self._backjumping = backjumping
+        self._propagated = propagated
+        self._timeout = timeout
+        self._max_nodes = max_nodes
+        self._on_progress = on_progress
+        self._progress_interval = progress_interval
+        self._cancelled = False
+        self.nogoods: Optional[nogoods.NogoodStore] = nogood_store
+        if nogood_store is not None:
+            nogood_store.bind(self._constraints, space.DiscreteSpace() if current_space is None else current_space, self._vars)
+        # Search state, kept on the search so that it can be inspected once the search stops early
+        self._values: dict[variable.Variable, object] = {}
+        self._stack: list[list] = []
+        self.stopped: bool = False
+        # "should_stop", "timeout", "max_nodes" or "cancelled" once the search has stopped early
+        self.stop_reason: Optional[str] = None
+        self.solutions_found: int = 0
+        self._best: Optional[assignment.Assignment] = None
+        self._started: float = 0.0
+        self.nodes: int = 0
+        self.backtracks: int = 0
+        self.fails: int = 0
+        self.restarts: int = 0
+        # Levels skipped by backjumping on top of the usual one level per backtrack
+        self.backjumps: int = 0
+
+    def cancel(self) -> None:
+        """
+        Stops the search the next time it checks whether to, which may be from another thread
+        """
+        self._cancelled = True
+
+    def progress(self) -> Progress:
+        return Progress(self.nodes, self.backtracks, self.fails, len(self._stack), self.solutions_found,
+                        perf_counter() - self._started, self._best)
+
+    def _stop_reason(self) -> Optional[str]:
+        if self._cancelled:
+            return "cancelled"
+        if self._max_nodes is not None and self.nodes >= self._max_nodes:
+            return "max_nodes"
+        if self._timeout is not None and perf_counter() - self._started >= self._timeout:
+            return "timeout"
+        if self._should_stop is not None and self._should_stop():
+            return "should_stop"
+        return None
+
+    def _consistent(self, values: dict[variable.Variable, object]) -> bool:
+        return all(rel._satisfies(*(values[var] for var in rel._inputs)) for rel in self._constraints)
+
+    def _violated(self, values: dict[variable.Variable, object]) -> Optional[relation.Relation]:
+        return next((rel for rel in self._constraints if not rel._satisfies(*(values[var] for var in rel._inputs))), None)
+
+    def _propagate(self, curr_space: space.TrailedSpace, var: variable.Variable, val, checkpoint: int) -> Optional[Iterable[variable.Variable]]:
+        """
+        Assigns val to var and propagates it, along with the nogoods
+        Returns None if nothing was wiped out, otherwise the variables whose removals explain the failure
+        """
+        if self._propagation is Propagation.NONE:
+            return None
+        if not propagate_assignment(self._network, curr_space, var, val, self._propagation):
+            self._variable_ordering.conflict(self._network.last_conflict, curr_space, self._values)
+            return (curr_space.last_wiped,)
+        store = self.nogoods
+        if store is None:
+            return None
+        changed = set(curr_space.changed_since(checkpoint))
+        while changed:
+            pruned = store.propagate(curr_space, changed)
+            if pruned is None:
+                return store.last_conflict._variables
+            changed = set(pruned)
+            if self._propagation is Propagation.MAC:
+                for var in pruned:
+                    mark = curr_space.checkpoint()
+                    if not self._network.propagate(curr_space, updated_variable=var):
+                        self._variable_ordering.conflict(self._network.last_conflict, curr_space, self._values)
+                        return (curr_space.last_wiped,)
+                    changed.update(curr_space.changed_since(mark))
+        return None
+
+    def _conflict_levels(self, curr_space: space.TrailedSpace, culprits: Iterable[variable.Variable], levels: dict[variable.Variable, int]) -> int:
+        """
+        Bitmask of the search levels whose assignments explain why the culprits lost their values
+        Replays the trail of the current branch: a value removed by assigning is explained by that level,
+        and one removed by a relation by whatever explains the removals from the rest of its scope
+        """
+        checkpoints = [frame[2] for frame in self._stack]
+        explanations: dict[variable.Variable, int] = {}
+        for i in range(checkpoints[0], curr_space.checkpoint()):
+            var, _ = curr_space.trail_entry(i)
+            cause = curr_space.cause_at(i)
+            if cause is None:
+                reason = 1 << (bisect.bisect_right(checkpoints, i) - 1)
+            else:
+                reason = 0
+                for other in cause._variables:
+                    if other is not var:
+                        reason |= explanations.get(other, 0)
+            explanations[var] = explanations.get(var, 0) | reason
+        ret = 0
+        for var in culprits:
+            ret |= explanations.get(var, 0)
+            if var in self._values:
+                ret |= 1 << levels[var]
+        return ret
+
+    def _search(self, pause_interval: Optional[int] = None) -> Iterator[Optional[dict[variable.Variable, object]]]:
+        """
+        Yields the live var -> value dict each time it holds a solution
+        Callers must copy it if they keep it, since it changes as soon as the search resumes
+        With pause_interval, None is also yielded every that many nodes, so that callers can do something else in between
+        """
+        self._started = perf_counter()
+        if self._propagated and self._current_space is not None:
+            vars = dict.fromkeys(self._vars) | dict.fromkeys(self._current_space.variables())
+            curr_space = space.TrailedSpace.from_space(self._current_space, vars)
+        else:
+            curr_space = self._network.pruned_space(self._current_space)
+        if not all(curr_space[var] for var in self._vars):
+            return
+        if not self._vars:
+            self.solutions_found += 1
+            yield {}
+            return
+
+        values = self._values = {}
+        should_stop = self._should_stop
+        # Checking the clock costs little next to a node, so the deadline is checked at every one
+        deadline = None if self._timeout is None else self._started + self._timeout
+        interval = self._stop_check_interval
+        on_progress = self._on_progress
+        progress_interval = self._progress_interval
+        paused_at = -1
+        variable_ordering = self._variable_ordering
+        value_ordering = self._value_ordering
+        variable_ordering.start(self._network, curr_space, self._seed)
+        value_ordering.start(self._network)
+        backjumping = self._backjumping
+        recorder = stats.current
+        # Depth at which each variable was assigned, only kept up to date for backjumping
+        levels: dict[variable.Variable, int] = {}
+        if backjumping:
+            curr_space.record_causes()
+        root = curr_space.checkpoint()
+        found = False
+        run = 0
+
+        while True:
+            fail_limit = None
+            if self._restarts is not None and not found:
+                fail_limit = self.fails + heuristics.luby(run) * self._restarts
+            # Frames of [variable, values left to try, checkpoint taken before the variable was assigned,
+            # bitmask of the earlier levels that explain the values of the variable that failed,
+            # whether some value of the variable led to a solution]
+            var = variable_ordering.select(curr_space, values)
+            stack = self._stack = [[var, iter(value_ordering.order(var, curr_space)), curr_space.checkpoint(), 0, False]]
+            while stack:
+                if (self._cancelled or self.nodes == self._max_nodes or (deadline is not None and perf_counter() >= deadline)
+                        or (should_stop is not None and self.nodes % interval == 0)):
+                    reason = self._stop_reason()
+                    if reason is not None:
+                        self.stopped = True
+                        self.stop_reason = reason
+                        return
+                if pause_interval is not None and self.nodes % pause_interval == 0 and self.nodes != paused_at:
+                    paused_at = self.nodes
+                    yield None
+                if fail_limit is not None and self.fails >= fail_limit and not found:
+                    break
+                frame = stack[-1]
+                var, candidates, checkpoint, conflict, solved = frame
+                curr_space.restore(checkpoint)
+                variable_ordering.restored(checkpoint)
+                val = next(candidates, _EXHAUSTED)
+                if val is _EXHAUSTED:
+                    self.backtracks += 1
+                    if recorder is not None:
+                        recorder.backtrack(var, len(stack) - 1)
+                    if not backjumping:
+                        values.pop(var, None)
+                        stack.pop()
+                        variable_ordering.unassigned(var, curr_space, values)
+                        continue
+                    # The levels of a subtree with solutions are kept as culprits, but don't make a nogood
+                    if self.nogoods is not None and not solved:
+                        self.nogoods.add({stack[d][0]: values[stack[d][0]] for d in range(len(stack)) if conflict >> d & 1})
+                    # Nothing between the latest culprit and here can change the outcome; with no culprit at all,
+                    # the dead end holds whatever was assigned, so the search is over
+                    target = conflict.bit_length() - 1
+                    self.backjumps += len(stack) - 2 - target if target >= 0 else 0
+                    while len(stack) > target + 1:
+                        popped = stack.pop()
+                        curr_space.restore(popped[2])
+                        variable_ordering.restored(popped[2])
+                        values.pop(popped[0], None)
+                        variable_ordering.unassigned(popped[0], curr_space, values)
+                    if stack:
+                        stack[-1][3] |= conflict & ~(1 << target)
+                    continue
+
+                self.nodes += 1
+                if on_progress is not None and self.nodes % progress_interval == 0:
+                    on_progress(self.progress())
+                values[var] = val
+                levels[var] = len(stack) - 1
+                if recorder is not None:
+                    recorder.node(var, val, len(stack) - 1)
+                culprits = self._propagate(curr_space, var, val, checkpoint)
+                if culprits is not None:
+                    self.fails += 1
+                    if recorder is not None:
+                        recorder.fails += 1
+                    if backjumping:
+                        frame[3] |= self._conflict_levels(curr_space, culprits, levels) & ~(1 << levels[var])
+                    continue
+                if len(values) == len(self._vars):
+                    violated = self._violated(values)
+                    if violated is None:
+                        found = True
+                        # Backjumping past a level that led to a solution would skip other solutions
+                        for d, solved in enumerate(stack):
+                            solved[3] |= (1 << d) - 1
+                            solved[4] = True
+                        self.solutions_found += 1
+                        if on_progress is not None:
+                            self._best = assignment.Assignment(values)
+                        yield values
+                    else:
+                        self.fails += 1
+                        if recorder is not None:
+                            recorder.fails += 1
+                        if backjumping:
+                            frame[3] |= self._conflict_levels(curr_space, violated._variables, levels) & ~(1 << levels[var])
+                    continue
+
+                var = variable_ordering.select(curr_space, values)
+                # Domains are mutated and restored, so values are tried from a snapshot of the domain
+                stack.append([var, iter(value_ordering.order(var, curr_space)), curr_space.checkpoint(), 0, False])
+            else:
+                return
+
+            # Restart from the root, keeping whatever the orderings (and nogoods) learned
+            curr_space.restore(root)
+            values.clear()
+            variable_ordering.new_run(curr_space)
+            run += 1
+            self.restarts += 1
+
+    def frontier(self) -> list[dict[variable.Variable, tuple]]:
+        """
+        Once the search has stopped early, splits the part of the search space it hasn't explored yet
+        into disjoint subproblems, each given as var -> values it is restricted to
+        """
+        ret = []
+        fixed = {}
+        for var, candidates, *_ in self._stack:
+            rest = tuple(candidates)
+            if rest:
+                ret.append({**fixed, var: rest})
+            if var in self._values:
+                fixed[var] = (self._values[var],)
+        return ret
+
+    def solutions(self, limit: Optional[int] = None) -> Iterator[assignment.Assignment]:
+        """
+        Lazily yields every solution, or the first limit of them
+        """
+        if limit is not None and limit <= 0:
+            return
+        for n, values in enumerate(self._search(), 1):
+            yield assignment.Assignment(values)
+            if n == limit:
+                return
+
+    def count_solutions(self, limit: Optional[int] = None) -> int:
+        """
+        Counts solutions without building an Assignment for any of them
+        """
+        count = 0
+        if limit is not None and limit <= 0:
+            return count
+        for _ in self._search():
+            count += 1
+            if count == limit:
+                break
+        return count
+
+
+_EXHAUSTED = object()
+
+
+def solutions(constraints: Iterable[relation.DiscreteRelation] | network.ConstraintNetwork, propagation: Propagation = Propagation.MAC,
+              limit: Optional[int] = None, **options) -> Iterator[assignment.Assignment]:
+    """
+    options are passed on to BacktrackingSearch, e.g. variable_ordering, value_ordering, restarts and backjumping
+    """
+    return BacktrackingSearch(constraints, propagation, **options).solutions(limit)
+
+
+def count_solutions(constraints: Iterable[relation.DiscreteRelation] | network.ConstraintNetwork, propagation: Propagation = Propagation.MAC,
+                    limit: Optional[int] = None, **options) -> int:
+    return BacktrackingSearch(constraints, propagation, **options).count_solutions(limit)
@@ -87,7 +87,8 @@ class DiscreteSpace(Space):
 
     @classmethod
     def empty(cls, vars: Iterable[variable.Variable]) -> "DiscreteSpace":
-        return cls({var: cls._domain_type() for var in vars})
+        # Use the same kind of domain as each variable so e.g. bitset domains stay bitsets
+        return cls({var: var.domain.__class__() for var in vars})
     
     def __iand__(self, other: "DiscreteSpace") -> "DiscreteSpace":
         vars = set(self._domains) | set(other._domains)
@@ -100,3 +101,198 @@ class DiscreteSpace(Space):
         for var in vars:
             self[var] |= other[var]
         return self
+
+
+class TrailedSpace(DiscreteSpace):
+    """
+    Mutable space that records every value it removes on a trail, so that search can undo
+    its changes by restoring to an earlier checkpoint instead of copying the space at every node
+    """
+
+    def __init__(self, var_to_val: Optional[Mapping[variable.Variable, domain.Domain] | Iterable[variable.Variable]] = None):
+        super().__init__(var_to_val)
+        # The domains are mutated in place, so they must never be shared with the variables
+        self._domains = {var: self._own_copy(var, dom) for var, dom in self._domains.items()}
+        self._trail: list[tuple[variable.Variable, object]] = []
+        # Only kept once record_causes is called: the relation (or nogood) that made each removal on the trail,
+        # and the last variable whose domain was wiped out
+        self._causes: Optional[list] = None
+        self.cause = None
+        self.last_wiped: Optional[variable.Variable] = None
+        # State that relations keep between revisions: key -> (trail position it was stored at, value), valid for
+        # the domains left by the removals before that position; earlier states are trailed to come back on restore
+        self._states: dict = {}
+        self._state_trail: list[tuple[int, object, Optional[tuple[int, object]]]] = []
+
+    @staticmethod
+    def _own_copy(var: variable.Variable, dom: domain.Domain) -> domain.DiscreteDomain:
+        if isinstance(dom, domain.DiscreteDomain):
+            return dom.copy()
+        # Same kind of domain as the variable, e.g. singletons from an assignment become bitsets for bitset variables
+        return var.domain.__class__(dom) if dom else var.domain.__class__()
+
+    @classmethod
+    def from_space(cls, given_space: Space, vars: Iterable[variable.Variable]) -> "TrailedSpace":
+        return cls({var: given_space[var] for var in vars})
+
+    def remove(self, var: variable.Variable, val) -> bool:
+        """
+        Removes val from the domain of var, returns whether the domain changed
+        """
+        if var not in self._domains:
+            self._domains[var] = self._own_copy(var, var.domain)
+        dom = self._domains[var]
+        if val not in dom:
+            return False
+        dom.remove(val)
+        self._trail.append((var, val))
+        if self._causes is not None:
+            self._causes.append(self.cause)
+            if not dom:
+                self.last_wiped = var
+        return True
+
+    def restrict(self, var: variable.Variable, dom: domain.Domain) -> bool:
+        """
+        Same behavior as self[var] &= dom, but the removals are trailed
+        Returns whether the domain of var changed
+        """
+        removed = [val for val in self[var] if val not in dom]
+        for val in removed:
+            self.remove(var, val)
+        return bool(removed)
+
+    def restrict_bounds(self, var: variable.Variable, lo=None, hi=None) -> bool:
+        """
+        Removes the values of var below lo or above hi (None for no bound), returns whether its domain changed
+        Interval domains lose whole ranges at once, which are trailed as single entries
+        """
+        dom = self[var]
+        if not isinstance(dom, domain.IntervalDomain):
+            removed = [val for val in dom if (lo is not None and val < lo) or (hi is not None and val > hi)]
+            for val in removed:
+                self.remove(var, val)
+            return bool(removed)
+        if not dom:
+            return False
+        if lo is not None and hi is not None and lo > hi:
+            removed = dom.intervals()
+        else:
+            removed = []
+            if lo is not None and lo > dom.lo:
+                removed += dom.intervals(hi=lo - 1)
+            if hi is not None and hi < dom.hi:
+                removed += dom.intervals(lo=hi + 1)
+        for span in removed:
+            dom.remove(span)
+            self._trail.append((var, span))
+            if self._causes is not None:
+                self._causes.append(self.cause)
+        if removed and not dom and self._causes is not None:
+            self.last_wiped = var
+        return bool(removed)
+
+    def wipe_out(self, var: variable.Variable) -> bool:
+        """
+        Removes every value of var, which is how relations report that they can't be satisfied
+        """
+        dom = self[var]
+        if isinstance(dom, domain.IntervalDomain):
+            return self.restrict_bounds(var, dom.hi + 1) if dom else False
+        removed = list(dom)
+        for val in removed:
+            self.remove(var, val)
+        return bool(removed)
+
+    def assign(self, var: variable.Variable, val) -> bool:
+        if isinstance(self[var], domain.IntervalDomain):
+            return self.restrict_bounds(var, val, val) if val in self[var] else self.wipe_out(var)
+        return self.restrict(var, domain.SingletonDomain(val))
+
+    def record_causes(self) -> None:
+        """
+        From now on, pair every removal with whatever self.cause is when it's made
+        Removals already on the trail have no cause
+        """
+        if self._causes is None:
+            self._causes = [None] * len(self._trail)
+
+    def cause_at(self, i: int):
+        return self._causes[i]
+
+    def trail_entry(self, i: int) -> tuple[variable.Variable, object]:
+        return self._trail[i]
+
+    def state(self, key) -> Optional[tuple[int, object]]:
+        """
+        Last value stored for key and the trail position it was stored at, or None
+        """
+        return self._states.get(key)
+
+    def set_state(self, key, value) -> None:
+        """
+        Stores value for key, until the removals before now are undone
+        """
+        position = len(self._trail)
+        previous = self._states.get(key)
+        # Only the first value stored at a position needs trailing, restoring goes back to what came before it
+        if previous is None or previous[0] != position:
+            self._state_trail.append((position, key, previous))
+        self._states[key] = (position, value)
+
+    def _drop_states(self, checkpoint: int) -> None:
+        """
+        Goes back to the states stored at or before checkpoint
+        """
+        states = self._state_trail
+        while states and states[-1][0] > checkpoint:
+            _, key, previous = states.pop()
+            if previous is None:
+                del self._states[key]
+            else:
+                self._states[key] = previous
+
+    def checkpoint(self) -> int:
+        return len(self._trail)
+
+    def changed_since(self, checkpoint: int) -> Iterator[variable.Variable]:
+        """
+        Variables that lost values since checkpoint was taken, once per removed value (or range of values)
+        """
+        for i in range(checkpoint, len(self._trail)):
+            yield self._trail[i][0]
+
+    def reinstate(self, positions: Iterable[int]) -> list[variable.Variable]:
+        """
+        Puts back the values removed by the trail entries at positions, whatever their order on the trail,
+        and drops those entries; only sound when nothing still on the trail depended on these removals
+        Returns the variables that regained values
+        """
+        positions = set(positions)
+        if not positions:
+            return []
+        regained = {}
+        for i in sorted(positions):
+            var, val = self._trail[i]
+            self._domains[var].add(val)
+            regained[var] = None
+        # Entries before the first one dropped keep their positions
+        first = min(positions)
+        self._drop_states(first)
+        self._trail[first:] = [entry for i, entry in enumerate(self._trail[first:], first) if i not in positions]
+        if self._causes is not None:
+            self._causes[first:] = [cause for i, cause in enumerate(self._causes[first:], first) if i not in positions]
+        return list(regained)
+
+    def restore(self, checkpoint: int) -> None:
+        """
+        Undoes every removal made since checkpoint was taken
+        """
+        trail = self._trail
+        domains = self._domains
+        while len(trail) > checkpoint:
+            var, val = trail.pop()
+            domains[var].add(val)
+        self._drop_states(checkpoint)
+        if self._causes is not None:
+            del self._causes[checkpoint:]
@@ -0,0 +1,174 @@
+import variable
+from time import perf_counter
+from collections.abc import Callable
+from typing import Optional
+
+# Statistics currently being recorded, if any
+# The hot paths only check this for None, so nothing is measured (or paid for) outside a SolverStats block
+current: Optional["SolverStats"] = None
+
+
+class RelationStats:
+    """
+    What a single relation cost while statistics were recorded
+    """
+
+    __slots__ = ("revisions", "effective", "pruned", "predicate_calls", "time")
+
+    def __init__(self):
+        self.revisions: int = 0
+        # Revisions that pruned at least one value
+        self.effective: int = 0
+        self.pruned: int = 0
+        self.predicate_calls: int = 0
+        self.time: float = 0.0
+
+    def as_dict(self) -> dict[str, int | float]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class _CountedPredicate:
+    """
+    Predicate that counts its calls in a RelationStats
+    A class rather than a closure, so that relations being recorded can still be pickled
+    """
+
+    __slots__ = ("predicate", "record")
+
+    def __init__(self, predicate: Callable[..., bool], record: RelationStats):
+        self.predicate = predicate
+        self.record = record
+
+    def __call__(self, *args) -> bool:
+        self.record.predicate_calls += 1
+        return self.predicate(*args)
+
+
+class SolverStats:
+    """
+    Opt-in statistics for search and propagation, recorded for everything run inside the with block:
+
+        with stats.SolverStats() as recorded:
+            backtracking_solver(constraints, Propagation.MAC)
+        print(recorded.report())
+
+    Hooks are called on every node (var, val, depth), backtrack (var, depth) and revision (relation, changed variables)
+    Only the current process is recorded, so parallel workers are not
+    """
+
+    def __init__(self, on_node: Optional[Callable[[variable.Variable, object, int], None]] = None,
+                 on_backtrack: Optional[Callable[[variable.Variable, int], None]] = None,
+                 on_propagate: Optional[Callable[[object, list[variable.Variable]], None]] = None):
+        self.on_node = on_node
+        self.on_backtrack = on_backtrack
+        self.on_propagate = on_propagate
+        self.nodes: int = 0
+        self.backtracks: int = 0
+        self.fails: int = 0
+        self.propagation_rounds: int = 0
+        self.wall_time: float = 0.0
+        self.relations: dict[object, RelationStats] = {}
+        # Original predicates of the relations whose predicates are being counted
+        self._predicates: dict[object, Callable] = {}
+        self._outer: Optional[SolverStats] = None
+        self._started: float = 0.0
+
+    def __enter__(self) -> "SolverStats":
+        global current
+        self._outer = current
+        current = self
+        self._started = perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        global current
+        self.wall_time += perf_counter() - self._started
+        for rel, predicate in self._predicates.items():
+            rel._satisfies = predicate
+        self._predicates.clear()
+        current = self._outer
+        self._outer = None
+
+    def of(self, rel) -> RelationStats:
+        """
+        Statistics of rel, which from now on has its predicate calls counted
+        """
+        ret = self.relations.get(rel)
+        if ret is None:
+            ret = self.relations[rel] = RelationStats()
+            predicate = self._predicates[rel] = rel._satisfies
+            rel._satisfies = _CountedPredicate(predicate, ret)
+        return ret
+
+    def revise(self, rel, given_space, modified=None) -> list[variable.Variable]:
+        """
+        Same as rel.revise(given_space, modified), recording what it cost
+        """
+        record = self.of(rel)
+        before = given_space.checkpoint()
+        start = perf_counter()
+        changed = rel.revise(given_space, modified)
+        record.time += perf_counter() - start
+        record.revisions += 1
+        record.pruned += given_space.checkpoint() - before
+        if changed:
+            record.effective += 1
+        if self.on_propagate is not None:
+            self.on_propagate(rel, changed)
+        return changed
+
+    def node(self, var: variable.Variable, val, depth: int) -> None:
+        self.nodes += 1
+        if self.on_node is not None:
+            self.on_node(var, val, depth)
+
+    def backtrack(self, var: variable.Variable, depth: int) -> None:
+        self.backtracks += 1
+        if self.on_backtrack is not None:
+            self.on_backtrack(var, depth)
+
+    @property
+    def revisions(self) -> int:
+        return sum(record.revisions for record in self.relations.values())
+
+    @property
+    def predicate_calls(self) -> int:
+        return sum(record.predicate_calls for record in self.relations.values())
+
+    @property
+    def pruned(self) -> int:
+        return sum(record.pruned for record in self.relations.values())
+
+    def as_dict(self) -> dict:
+        return {
+            "nodes": self.nodes,
+            "backtracks": self.backtracks,
+            "fails": self.fails,
+            "propagation_rounds": self.propagation_rounds,
+            "revisions": self.revisions,
+            "predicate_calls": self.predicate_calls,
+            "pruned": self.pruned,
+            "wall_time": self.wall_time,
+            "relations": {_label(rel): record.as_dict() for rel, record in self.relations.items()},
+        }
+
+    def report(self, top: Optional[int] = 10) -> str:
+        """
+        Summary followed by the top relations by time spent revising them
+        Time in nested relations (e.g. the children of a conjunction) is also counted in their parent
+        """
+        lines = [
+            f"nodes {self.nodes}, backtracks {self.backtracks}, fails {self.fails}, propagation rounds {self.propagation_rounds}",
+            f"revisions {self.revisions}, predicate calls {self.predicate_calls}, values pruned {self.pruned}, wall time {self.wall_time:.3f}s",
+        ]
+        ranked = sorted(self.relations.items(), key=lambda item: item[1].time, reverse=True)[:top]
+        if ranked:
+            lines.append(f"{'relation':<40} {'revisions':>10} {'effective':>10} {'pruned':>10} {'predicate':>12} {'time':>9}")
+        for rel, record in ranked:
+            lines.append(f"{_label(rel)[:40]:<40} {record.revisions:>10} {record.effective:>10} {record.pruned:>10} "
+                         f"{record.predicate_calls:>12} {record.time:>8.3f}s")
+        return "\n".join(lines)
+
+
+def _label(rel) -> str:
+    return f"{rel.__class__.__name__}#{rel._id}({', '.join(str(var) for var in rel._inputs)})"
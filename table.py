@@ -0,0 +1,197 @@
+import variable
+import domain
+import assignment
+import space
+from relation import DiscreteRelation
+from collections.abc import Iterator, Iterable
+from typing import Optional
+
+
+def column_masks(column: Iterable, count: int) -> dict[object, bytearray]:
+    """
+    Maps each value of a column of count tuples to the little-endian bitmap of the tuples that have it
+    """
+    # Setting bits in a bytearray keeps this linear in the number of tuples
+    n_bytes = (count + 7) // 8
+    ret: dict[object, bytearray] = {}
+    for k, val in enumerate(column):
+        bits = ret.get(val)
+        if bits is None:
+            bits = ret[val] = bytearray(n_bytes)
+        bits[k >> 3] |= 1 << (k & 7)
+    return ret
+
+
+class TableRelation(DiscreteRelation):
+    """
+    Relation given extensionally as a list of allowed (or forbidden) tuples over its inputs
+    Filtering uses compact table bitsets: every (variable, value) has a bitmask of the tuples containing it,
+    so finding the tuples still valid in a space and checking supports are operations on ints
+    The mask of the tuples still valid is trailed with the space, and each revision only takes out the tuples
+    of the values removed since the last one
+    """
+    _transient = DiscreteRelation._transient + ("_masks",)
+
+    def __init__(self, variables: Iterable[variable.Variable], tuples: Iterable[tuple], allowed: bool = True):
+        variables = list(variables)
+        if len(set(variables)) != len(variables):
+            raise ValueError("Table relations can't repeat variables")
+        # Duplicates would throw off the support counts for forbidden tuples
+        self._tuples: list[tuple] = list(dict.fromkeys(tuple(t) for t in tuples))
+        if any(len(t) != len(variables) for t in self._tuples):
+            raise ValueError("Every tuple must have one value per variable")
+        self._allowed = allowed
+        self._tuple_set: set[tuple] = set(self._tuples)
+        # A bound method rather than a closure, so the table can be pickled
+        super().__init__(variables, self._in_table)
+
+    def _reset_transient(self) -> None:
+        super()._reset_transient()
+        # Built the first time the relation is revised
+        self._masks: Optional[list[dict[object, int]]] = None
+
+    def _in_table(self, *args) -> bool:
+        return (args in self._tuple_set) == self._allowed
+
+    @property
+    def tuples(self) -> list[tuple]:
+        return self._tuples.copy()
+
+    @property
+    def allowed(self) -> bool:
+        return self._allowed
+
+    def _tuple_count(self) -> int:
+        return len(self._tuples)
+
+    def _column(self, i: int) -> Iterable:
+        """
+        Values of input i in each tuple, in order
+        """
+        return (t[i] for t in self._tuples)
+
+    def _tuple(self, k: int) -> tuple:
+        return self._tuples[k]
+
+    def _index(self) -> list[dict[object, int]]:
+        """
+        For each input, maps each value to the mask of the tuples that contain it
+        """
+        if self._masks is None:
+            self._masks = [{val: int.from_bytes(bits, "little") for val, bits in column_masks(self._column(i), self._tuple_count()).items()}
+                           for i in range(len(self._inputs))]
+        return self._masks
+
+    def _valid_tuples(self, doms: list[domain.Domain]) -> int:
+        """
+        Mask of the tuples whose values are all in doms
+        """
+        valid = (1 << self._tuple_count()) - 1
+        for masks, dom in zip(self._index(), doms):
+            col = 0
+            for val in dom:
+                col |= masks.get(val, 0)
+            valid &= col
+            if not valid:
+                break
+        return valid
+
+    def _current_table(self, given_space: space.TrailedSpace, doms: list[domain.Domain]) -> tuple[int, Optional[list[int]]]:
+        """
+        Mask of the tuples whose values are all in doms, and the inputs whose domains changed since the last
+        revision (None without one)
+        The mask is kept on the space, so that it's updated from the values removed since then instead of rebuilt,
+        and restoring the space brings back the mask that went with it
+        """
+        state = given_space.state(self)
+        if state is None:
+            return self._valid_tuples(doms), None
+        position, (valid, last_sizes) = state
+        changed = [i for i, (dom, size) in enumerate(zip(doms, last_sizes)) if len(dom) != size]
+        masks_by_input = self._index()
+        # A domain that lost fewer values than it kept is updated from its removals on the trail, others are reset
+        deltas: dict[variable.Variable, dict[object, int]] = {}
+        for i in changed:
+            if last_sizes[i] - len(doms[i]) < len(doms[i]):
+                deltas[self._inputs[i]] = masks_by_input[i]
+            else:
+                col = 0
+                for val in doms[i]:
+                    col |= masks_by_input[i].get(val, 0)
+                valid &= col
+        if deltas:
+            gone = 0
+            for k in range(position, given_space.checkpoint()):
+                var, val = given_space.trail_entry(k)
+                masks = deltas.get(var)
+                if masks is None:
+                    continue
+                # Interval domains trail whole ranges of values at once
+                for v in val if isinstance(val, range) else (val,):
+                    gone |= masks.get(v, 0)
+            valid &= ~gone
+        return valid, changed
+
+    def revise(self, given_space: space.TrailedSpace, modified: Optional[set[variable.Variable]] = None) -> list[variable.Variable]:
+        masks_by_input = self._index()
+        inputs = self._inputs
+        changed = []
+        doms = [given_space[var] for var in inputs]
+        valid, since = self._current_table(given_space, doms)
+        if since == []:
+            return changed
+        # When a single domain changed since the last revision, its remaining values keep all their valid tuples
+        unchanged_support = since[0] if since is not None and len(since) == 1 else None
+        while True:
+            if not self._allowed:
+                sizes = [len(dom) for dom in doms]
+                total = 1
+                for size in sizes:
+                    total *= size
+            # Tuples with a value removed in this pass
+            removed = 0
+            pruned = False
+            for i, (var, dom, masks) in enumerate(zip(inputs, doms, masks_by_input)):
+                if i == unchanged_support:
+                    continue
+                if self._allowed:
+                    unsupported = [val for val in dom if not masks.get(val, 0) & valid]
+                else:
+                    # A value is supported unless every combination of the other values is forbidden with it
+                    others = total // sizes[i] if sizes[i] else 0
+                    unsupported = [val for val in dom if (masks.get(val, 0) & valid).bit_count() >= others]
+                if unsupported:
+                    for val in unsupported:
+                        given_space.remove(var, val)
+                        removed |= masks.get(val, 0)
+                    if var not in changed:
+                        changed.append(var)
+                    pruned = True
+            doms = [given_space[var] for var in inputs]
+            if not all(doms):
+                return changed
+            valid &= ~removed
+            unchanged_support = None
+            # Values without a valid tuple are in none of them, so for allowed tuples one pass is enough; for
+            # forbidden ones, smaller domains lower the number of combinations a value needs forbidden to lose support
+            if self._allowed or not pruned:
+                break
+        given_space.set_state(self, (valid, [len(dom) for dom in doms]))
+        return changed
+
+    def revision_cost(self, given_space: space.Space) -> float:
+        return sum(len(given_space[var]) for var in self._inputs) * (1 + self._tuple_count() // 64)
+
+    def satisfying_assignments(self, given_space: Optional[space.DiscreteSpace] = None) -> Iterator[assignment.Assignment]:
+        if given_space is None:
+            given_space = self._space_type()
+        if not self._allowed:
+            return super().satisfying_assignments(given_space)
+        return self._allowed_assignments([given_space[var] for var in self._inputs])
+
+    def _allowed_assignments(self, doms: list[domain.Domain]) -> Iterator[assignment.Assignment]:
+        valid = self._valid_tuples(doms)
+        while valid:
+            low = valid & -valid
+            yield assignment.Assignment(dict(zip(self._inputs, self._tuple(low.bit_length() - 1))))
+            valid ^= low
@@ -0,0 +1,79 @@
+import itertools
+import random
+import assignment
+import domain
+import network
+import relation
+import space
+import variable
+from consistency import Consistency, preprocess
+
+
+def _random_problem(rng: random.Random, name: str) -> tuple[list, list, list]:
+    """
+    Random binary problem and the values of each variable that appear in some solution, found by brute force
+    """
+    vars = [variable.Variable(domain.BitsetDomain(range(4)), f"{name}_{i}") for i in range(5)]
+    relations = []
+    for x, y in itertools.combinations(vars, 2):
+        if rng.random() < 0.6:
+            allowed = {(a, b) for a in range(4) for b in range(4) if rng.random() < 0.65}
+            relations.append(relation.DiscreteRelation([x, y], lambda a, b, allowed=allowed: (a, b) in allowed))
+    used = [set() for _ in vars]
+    for values in itertools.product(range(4), repeat=len(vars)):
+        assign = assignment.Assignment(dict(zip(vars, values)))
+        if not any(rel.violated(assign) for rel in relations):
+            for seen, val in zip(used, values):
+                seen.add(val)
+    return vars, relations, used
+
+
+def _singleton_arc_consistent(constraints: network.ConstraintNetwork, given_space: space.TrailedSpace, vars: list) -> space.TrailedSpace:
+    """
+    Plain SAC-1: tests every value again until none is removed
+    """
+    removed = True
+    while removed:
+        removed = False
+        for var in vars:
+            for val in list(given_space[var]):
+                checkpoint = given_space.checkpoint()
+                given_space.assign(var, val)
+                survives = constraints.propagate(given_space, updated_variable=var)
+                given_space.restore(checkpoint)
+                if not survives:
+                    given_space.remove(var, val)
+                    removed = True
+                    if not given_space[var] or not constraints.propagate(given_space, updated_variable=var):
+                        return given_space
+    return given_space
+
+
+def test_preprocessing_keeps_solutions_and_reaches_its_level():
+    rng = random.Random(2)
+    for trial in range(60):
+        vars, relations, used = _random_problem(rng, f"preprocess_{trial}")
+        constraints = network.ConstraintNetwork(relations)
+        arc, _ = preprocess(relations)
+        singleton, (report,) = preprocess(relations, levels=[Consistency.SINGLETON_ARC])
+        path, _ = preprocess(relations, levels=[Consistency.RESTRICTED_PATH])
+        if not any(used):
+            continue
+        naive = _singleton_arc_consistent(constraints, constraints.pruned_space(), vars)
+        assert report.consistent
+        assert report.removed == sum(len(var.domain) - len(singleton[var]) for var in vars)
+        for var, seen in zip(vars, used):
+            assert seen <= set(path[var]) <= set(arc[var])
+            assert seen <= set(singleton[var]) <= set(arc[var])
+            assert set(singleton[var]) == set(naive[var])
+        again, (report,) = preprocess(relations, path, [Consistency.RESTRICTED_PATH])
+        assert report.removed == 0
+
+
+def test_inconsistency_is_reported():
+    vars = [variable.Variable(domain.BitsetDomain(range(2)), f"preprocess_triangle_{i}") for i in range(3)]
+    relations = [relation.DiscreteRelation([x, y], lambda a, b: a != b) for x, y in itertools.combinations(vars, 2)]
+    for level in (Consistency.RESTRICTED_PATH, Consistency.SINGLETON_ARC):
+        pruned, (report,) = preprocess(relations, levels=[level])
+        assert not report.consistent
+        assert not all(pruned[var] for var in vars)
@@ -0,0 +1,57 @@
+import itertools
+import random
+import assignment
+import decomposition
+import domain
+import relation
+import space
+import variable
+
+
+def test_many_components_combined_without_recursion():
+    vars = [variable.Variable(domain.BitsetDomain(range(3)), f"many_components_{i}") for i in range(2400)]
+    rels = [relation.DiscreteRelation(vars[i:i + 2], lambda a, b: a != b) for i in range(0, len(vars), 2)]
+    sols = list(itertools.islice(decomposition.solutions(rels), 10))
+    assert len({tuple(sol[var] for var in vars) for sol in sols}) == 10
+    assert all(sol[vars[i]] != sol[vars[i + 1]] for sol in sols for i in range(0, len(vars), 2))
+
+
+def _random_components(rng: random.Random, name: str) -> tuple[list, list]:
+    """
+    Variables split into a tree, a cycle and a group with a ternary relation, with random binary relations
+    """
+    vars = [variable.Variable(domain.BitsetDomain(range(3)), f"{name}_{i}") for i in range(8)]
+
+    def binary(x, y) -> relation.DiscreteRelation:
+        allowed = {(a, b) for a in range(3) for b in range(3) if rng.random() < 0.6}
+        return relation.DiscreteRelation([x, y], lambda a, b, allowed=allowed: (a, b) in allowed)
+
+    tree, cycle, rest = vars[:3], vars[3:6], vars[6:]
+    relations = [binary(tree[i], rng.choice(tree[:i])) for i in range(1, len(tree))]
+    relations += [binary(cycle[i], cycle[(i + 1) % len(cycle)]) for i in range(len(cycle))]
+    relations.append(relation.DiscreteRelation([rest[0], rest[1], tree[0]] if rng.random() < 0.3 else rest, lambda *values: sum(values) % 2 == 0))
+    rng.shuffle(relations)
+    return vars, relations
+
+
+def test_decomposed_search_matches_brute_force():
+    rng = random.Random(4)
+    kinds = set()
+    for trial in range(40):
+        vars, relations = _random_components(rng, f"decomposed_{trial}")
+        current_space = space.DiscreteSpace({vars[0]: domain.BitsetDomain([0, 2])}) if trial % 3 == 0 else None
+        expected = set()
+        for values in itertools.product(range(3), repeat=len(vars)):
+            assign = assignment.Assignment(dict(zip(vars, values)))
+            if current_space is not None and values[0] not in current_space[vars[0]]:
+                continue
+            if not any(rel.violated(assign) for rel in relations):
+                expected.add(values)
+        for max_cutset in (0, 2):
+            search = decomposition.DecomposedSearch(relations, current_space=current_space, max_cutset=max_cutset)
+            kinds.update(search.kinds)
+            found = [tuple(sol[var] for var in vars) for sol in search.solutions()]
+            assert len(found) == len(set(found))
+            assert set(found) == expected
+            assert decomposition.DecomposedSearch(relations, current_space=current_space, max_cutset=max_cutset).count_solutions() == len(expected)
+    assert kinds == {"tree", "cutset", "search"}
@@ -0,0 +1,69 @@
+import itertools
+import math
+import random
+import pytest
+import assignment
+import domain
+import optimization
+import relation
+import solver
+import variable
+
+
+def _random_problem(rng: random.Random, name: str) -> tuple[list, list, optimization.Objective, float]:
+    """
+    Small random problem with variable costs, group costs and soft relations, with its optimum found by brute force
+    """
+    vars = [variable.Variable(domain.BitsetDomain(range(4)), f"{name}_{i}") for i in range(5)]
+
+    def allowed_pairs(density: float) -> set:
+        return {(a, b) for a in range(4) for b in range(4) if rng.random() < density}
+
+    relations = []
+    for _ in range(3):
+        allowed = allowed_pairs(0.7)
+        relations.append(relation.DiscreteRelation(rng.sample(vars, 2), lambda a, b, allowed=allowed: (a, b) in allowed))
+    costs = {var: {val: rng.randint(-3, 5) for val in range(4)} for var in vars}
+    table = {values: rng.randint(0, 4) for values in itertools.product(range(4), repeat=2)}
+    soft = allowed_pairs(0.5)
+    group_costs = [(rng.sample(vars, 2), lambda a, b: table[a, b]),
+                   (relation.DiscreteRelation(rng.sample(vars, 2), lambda a, b: (a, b) in soft), rng.choice([-2, 3]))]
+    objective = optimization.Objective(costs, group_costs)
+    best = math.inf
+    for values in itertools.product(range(4), repeat=len(vars)):
+        assign = assignment.Assignment(dict(zip(vars, values)))
+        if not any(rel.violated(assign) for rel in relations):
+            best = min(best, objective.value(dict(zip(vars, values))))
+    return vars, relations, objective, best
+
+
+@pytest.mark.parametrize("propagation", list(solver.Propagation))
+def test_minimize_matches_brute_force(propagation):
+    rng = random.Random(24)
+    for trial in range(30):
+        vars, relations, objective, best = _random_problem(rng, f"minimize_{propagation.name}_{trial}")
+        result = optimization.minimize(relations, objective, propagation)
+        assert result.optimal and result.gap == 0
+        assert result.cost == best
+        if best < math.inf:
+            assert not any(rel.violated(result.best) for rel in relations)
+            assert objective.value(result.best) == best
+        costs = [cost for cost, _, _ in result.improvements]
+        assert costs == sorted(costs, reverse=True) and len(set(costs)) == len(costs)
+
+
+def test_budgeted_minimize_brackets_the_optimum():
+    rng = random.Random(240)
+    for trial in range(30):
+        vars, relations, objective, best = _random_problem(rng, f"budgeted_{trial}")
+        result = optimization.minimize(relations, objective, max_nodes=3)
+        assert result.lower_bound <= best <= result.cost
+        if not result.optimal:
+            assert result.gap == result.cost - result.lower_bound
+
+
+def test_minimize_without_solutions():
+    vars = [variable.Variable(domain.BitsetDomain(range(2)), f"minimize_pigeons_{i}") for i in range(3)]
+    relations = [relation.DiscreteRelation([x, y], lambda a, b: a != b) for x, y in itertools.combinations(vars, 2)]
+    result = optimization.minimize(relations, optimization.Objective({var: float for var in vars}))
+    assert result.optimal and result.cost == math.inf and not result.improvements
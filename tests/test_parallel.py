@@ -0,0 +1,10 @@
+import parallel
+import solver
+from benchmarks import problems
+
+
+def test_parallel_search_matches_sequential():
+    constraints = problems.queens(7).constraints
+    assert parallel.count_solutions(constraints, max_workers=2) == solver.count_solutions(constraints) == 40
+    solution = parallel.solve(constraints, max_workers=2)
+    assert solution and not any(rel.violated(solution) for rel in constraints)
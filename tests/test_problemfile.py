@@ -0,0 +1,42 @@
+import os
+import pickle
+import subprocess
+import sys
+import domain
+import problemfile
+import relation
+import solver
+import table
+import variable
+from benchmarks import problems
+
+
+def test_round_trip_keeps_solutions(tmp_path):
+    a = variable.Variable(domain.DiscreteDomain([-3, -1, 2]), "round_trip_a")
+    b = variable.Variable(domain.IntervalDomain(0, 5), "round_trip_b")
+    c = variable.Variable(domain.BitsetDomain(range(4)), "round_trip_c")
+    relations = [relation.DiscreteRelation([a, b], lambda x, y: x + y > 0),
+                 table.TableRelation([b, c], [(1, 1), (2, 3)], allowed=False),
+                 relation.DiscreteRelation([c, c, a], lambda x, y, z: x != z)]
+    path = str(tmp_path / "problem.csp")
+    problemfile.write(path, relations)
+    loaded = problemfile.load(path, [a, b, c])
+    assert all(set(loaded.space[var]) == set(var.domain) for var in (a, b, c))
+    expected = {tuple(sol[var] for var in (a, b, c)) for sol in solver.solutions(relations)}
+    assert {tuple(sol[var] for var in (a, b, c)) for sol in solver.solutions(loaded.relations, current_space=loaded.space)} == expected
+    for propagation in solver.Propagation:
+        copies = pickle.loads(pickle.dumps(loaded.relations))
+        assert solver.count_solutions(copies, propagation, current_space=loaded.space) == len(expected)
+
+
+def test_other_processes_load_the_same_problem(tmp_path):
+    path = str(tmp_path / "queens.csp")
+    constraints = problems.queens(6).constraints
+    problemfile.write(path, constraints)
+    script = ("import pickle, sys; import problemfile, solver; problem = problemfile.load(sys.argv[1]); "
+              "relations = pickle.loads(pickle.dumps(problem.relations)); "
+              "print(solver.count_solutions(relations, current_space=problem.space))")
+    root = os.path.dirname(os.path.abspath(problemfile.__file__))
+    out = subprocess.run([sys.executable, "-c", script, path], capture_output=True, text=True, check=True,
+                         env=dict(os.environ, PYTHONPATH=root))
+    assert int(out.stdout) == solver.count_solutions(constraints) == 4
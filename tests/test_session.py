@@ -0,0 +1,90 @@
+import random
+import domain
+import network
+import relation
+import solver
+import space
+import table
+import variable
+from session import SolverSession
+
+
+def test_retractions_after_earlier_removals_are_dropped():
+    x, y, z = (variable.Variable(domain.BitsetDomain(range(10)), f"retractions_{name}") for name in "xyz")
+    below = relation.DiscreteRelation([x, y], lambda a, b: a < b)
+    small = relation.DiscreteRelation([y, z], lambda a, b: a + b < 8)
+    session = SolverSession([below])
+    session.add_relation(small)
+    session.restrict(z, domain.BitsetDomain(range(3, 10)))
+    # Retracting below drops entries from the middle of the trail, moving small's removals
+    session.remove_relation(below)
+    assert set(session[x]) == set(range(10))
+    session.remove_relation(small)
+    assert set(session[y]) == set(range(10))
+    assert set(session[z]) == set(range(3, 10))
+
+
+def test_retracted_conjunction_puts_back_its_removals():
+    x, y, z = (variable.Variable(domain.BitsetDomain(range(6)), f"conjunction_{name}") for name in "xyz")
+    kept = relation.DiscreteRelation([y, z], lambda a, b: a != b)
+    conjunction = relation.ConjunctionRelation([relation.DiscreteRelation([x, y], lambda a, b: a + b == 5),
+                                                relation.DiscreteRelation([x], lambda a: a < 2)])
+    session = SolverSession([kept, conjunction])
+    assert set(session[y]) == {4, 5}
+    session.remove_relation(conjunction)
+    fresh = network.ConstraintNetwork([kept]).pruned_space()
+    assert all(set(session[var]) == set(fresh[var]) for var in (x, y, z))
+
+
+def test_wiped_out_variable_outside_relations_stays_inconsistent():
+    x, y, free = (variable.Variable(domain.BitsetDomain(range(3)), f"wiped_{name}") for name in ("x", "y", "free"))
+    rel = relation.DiscreteRelation([x, y], lambda a, b: a != b)
+    session = SolverSession([rel])
+    assert not session.restrict(free, domain.BitsetDomain())
+    assert not session.remove_relation(rel)
+
+
+def test_random_edits_match_a_fresh_propagation():
+    rng = random.Random(5)
+    for trial in range(150):
+        vars = [variable.Variable(domain.BitsetDomain(range(5)), f"edits_{trial}_{i}") for i in range(6)]
+
+        def random_relation() -> relation.DiscreteRelation:
+            allowed = {(a, b) for a in range(5) for b in range(5) if rng.random() < 0.6}
+            scope = rng.sample(vars[:5], 2)
+            kind = rng.random()
+            if kind < 0.2:
+                return relation.ConjunctionRelation([table.TableRelation(scope, allowed), random_relation()])
+            if kind < 0.5:
+                return table.TableRelation(scope, allowed, rng.random() < 0.5)
+            return relation.DiscreteRelation(scope, lambda a, b, allowed=allowed: (a, b) in allowed)
+
+        relations = [random_relation() for _ in range(2)]
+        restrictions = {}
+        session = SolverSession(relations)
+        for step in range(10):
+            edit = rng.random()
+            if edit < 0.4 or not relations:
+                rel = random_relation()
+                relations.append(rel)
+                session.add_relation(rel)
+            elif edit < 0.8:
+                rel = rng.choice(relations)
+                relations.remove(rel)
+                session.remove_relation(rel)
+            else:
+                var = rng.choice(vars)
+                dom = domain.BitsetDomain(rng.sample(range(5), rng.randint(0, 3)))
+                restrictions[var] = restrictions.get(var, var.domain) & dom
+                session.restrict(var, dom)
+            fresh = space.TrailedSpace({var: restrictions.get(var, var.domain) for var in vars})
+            consistent = all(fresh[var] for var in vars) and network.ConstraintNetwork(relations).propagate(fresh)
+            assert session.consistent == consistent
+            if consistent:
+                assert all(set(session[var]) == set(fresh[var]) for var in vars)
+        if session.consistent and relations:
+            # The session also assigns the variables of retracted relations, so solutions are compared on the others
+            scope = list(network.ConstraintNetwork(relations).variables)
+            current_space = space.DiscreteSpace({var: restrictions.get(var, var.domain) for var in vars})
+            expected = {tuple(sol[var] for var in scope) for sol in solver.solutions(relations, current_space=current_space)}
+            assert {tuple(sol[var] for var in scope) for sol in session.solutions()} == expected
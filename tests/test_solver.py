@@ -0,0 +1,85 @@
+import itertools
+import operator
+import random
+import pytest
+import assignment
+import domain
+import heuristics
+import main
+import nogoods
+import relation
+import solver
+import space
+import variable
+from alldifferent import AllDifferentRelation
+from benchmarks import problems
+
+
+def test_nogood_store_reused_across_enumerations():
+    # Levels that led to solutions must not end up in the store, or the next search would prune them
+    constraints = problems.queens(6).constraints
+    store = nogoods.NogoodStore(1000)
+    for propagation in (solver.Propagation.FORWARD_CHECKING, solver.Propagation.MAC):
+        for _ in range(2):
+            search = solver.BacktrackingSearch(constraints, propagation, backjumping=True, nogood_store=store)
+            assert search.count_solutions() == 4
+
+
+def test_nogood_store_refuses_other_root_domains():
+    constraints = problems.queens(6).constraints
+    store = nogoods.NogoodStore(1000)
+    narrowed = space.DiscreteSpace({constraints[0]._inputs[0]: domain.BitsetDomain([1, 2])})
+    solver.BacktrackingSearch(constraints, solver.Propagation.MAC, current_space=narrowed, backjumping=True,
+                              nogood_store=store).count_solutions()
+    with pytest.raises(ValueError):
+        solver.BacktrackingSearch(constraints, solver.Propagation.MAC, backjumping=True, nogood_store=store)
+
+
+def _random_problem(rng: random.Random, name: str) -> tuple[list, list, set]:
+    """
+    Small random problem of binary relations, a conjunction and an alldifferent, with its solutions found by brute force
+    """
+    vars = [variable.Variable(domain.BitsetDomain(range(4)), f"{name}_{i}") for i in range(5)]
+
+    def binary() -> relation.DiscreteRelation:
+        allowed = {(a, b) for a in range(4) for b in range(4) if rng.random() < 0.6}
+        return relation.DiscreteRelation(rng.sample(vars, 2), lambda a, b, allowed=allowed: (a, b) in allowed)
+
+    relations = [binary() for _ in range(4)]
+    relations.append(relation.ConjunctionRelation([binary(), binary()]))
+    relations.append(AllDifferentRelation(rng.sample(vars, 3)))
+    expected = set()
+    for values in itertools.product(range(4), repeat=len(vars)):
+        assign = assignment.Assignment(dict(zip(vars, values)))
+        if not any(rel.violated(assign) for rel in relations):
+            expected.add(values)
+    return vars, relations, expected
+
+
+_SEARCH_OPTIONS = [
+    dict,
+    lambda: {"variable_ordering": heuristics.DomWDeg()},
+    lambda: {"variable_ordering": heuristics.DomDeg(), "value_ordering": heuristics.LeastConstrainingValue()},
+    lambda: {"variable_ordering": heuristics.DomWDeg(), "restarts": 1, "seed": 3},
+    lambda: {"backjumping": True},
+    lambda: {"backjumping": True, "nogood_store": 50},
+]
+
+
+@pytest.mark.parametrize("propagation", list(solver.Propagation))
+@pytest.mark.parametrize("options", _SEARCH_OPTIONS)
+def test_search_modes_find_every_solution(propagation, options):
+    rng = random.Random(7)
+    for trial in range(15):
+        vars, relations, expected = _random_problem(rng, f"modes_{propagation.name}_{_SEARCH_OPTIONS.index(options)}_{trial}")
+        found = [tuple(sol[var] for var in vars) for sol in solver.solutions(relations, propagation, **options())]
+        assert len(found) == len(set(found))
+        assert set(found) == expected
+        assert solver.count_solutions(relations, propagation, **options()) == len(expected)
+        first = main.backtracking_solver(relations, propagation, **options())
+        assert (tuple(first[var] for var in vars) in expected) if expected else not first
+    # Five pigeons, four holes
+    holes = [variable.Variable(domain.BitsetDomain(range(4)), f"pigeons_{propagation.name}_{_SEARCH_OPTIONS.index(options)}_{i}") for i in range(5)]
+    pigeonhole = [relation.DiscreteRelation([a, b], operator.ne) for a, b in itertools.combinations(holes, 2)]
+    assert solver.count_solutions(pigeonhole, propagation, **options()) == 0
+    assert not main.backtracking_solver(pigeonhole, propagation, **options())
@@ -0,0 +1,13 @@
+import pickle
+import solver
+import stats
+from benchmarks import problems
+
+
+def test_recorded_relations_can_be_pickled():
+    constraints = problems.queens(5).constraints
+    with stats.SolverStats() as recorded:
+        assert solver.count_solutions(constraints) == 10
+        copies = pickle.loads(pickle.dumps(constraints))
+    assert recorded.predicate_calls > 0
+    assert solver.count_solutions(copies) == 10
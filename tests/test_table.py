@@ -0,0 +1,23 @@
+import itertools
+import random
+import domain
+import relation
+import solver
+import table
+import variable
+
+
+def test_tables_count_like_their_predicates():
+    rng = random.Random(0)
+    for trial in range(40):
+        vars = [variable.Variable(domain.BitsetDomain(range(4)), f"tables_{trial}_{i}") for i in range(4)]
+        tables, predicates = [], []
+        for _ in range(4):
+            scope = rng.sample(vars, 3)
+            allowed = rng.random() < 0.5
+            tuples = [t for t in itertools.product(range(4), repeat=3) if rng.random() < 0.35]
+            tables.append(table.TableRelation(scope, tuples, allowed))
+            predicates.append(relation.DiscreteRelation(scope, lambda *values, tuples=set(tuples), allowed=allowed: (values in tuples) == allowed))
+        expected = solver.count_solutions(predicates, solver.Propagation.NONE)
+        for propagation in solver.Propagation:
+            assert solver.count_solutions(tables, propagation) == expected
@@ -0,0 +1,26 @@
+import pytest
+import domain
+import relation
+import space
+import variable
+
+np = pytest.importorskip("numpy")
+import vectorized
+
+
+def test_chunks_stay_within_chunk_size():
+    vars = [variable.Variable(domain.BitsetDomain(range(40)), f"chunks_{i}") for i in range(3)]
+    sizes = []
+
+    def satisfies(a, b, c):
+        sizes.append(np.broadcast(a, b, c).size)
+        return (a + b) % 7 == c % 5
+
+    vectorized_relation = vectorized.VectorizedRelation(vars, satisfies, chunk_size=30)
+    plain = relation.DiscreteRelation(vars, lambda a, b, c: (a + b) % 7 == c % 5)
+    vectorized_space, plain_space = space.TrailedSpace(vars), space.TrailedSpace(vars)
+    vectorized_relation.revise(vectorized_space)
+    plain.revise(plain_space)
+    assert max(sizes) <= 30
+    assert all(set(vectorized_space[var]) == set(plain_space[var]) for var in vars)
+    assert sum(1 for _ in vectorized_relation.satisfying_assignments()) == sum(1 for _ in plain.satisfying_assignments())
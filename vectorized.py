@@ -0,0 +1,115 @@
+import itertools
+import variable
+import assignment
+import space
+from relation import DiscreteRelation
+from collections.abc import Callable, Iterator, Iterable
+from typing import Optional
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class VectorizedRelation(DiscreteRelation):
+    """
+    Relation whose predicate works on whole NumPy arrays at once
+    satisfies gets one array per input, broadcastable against each other, and returns a boolean mask
+    e.g. lambda a, b: a < b
+    The domain product is evaluated in chunks of at most chunk_size tuples, whatever the sizes of the domains
+    """
+
+    def __init__(self, variables: Iterable[variable.Variable], satisfies: Callable, chunk_size: int = 1 << 20):
+        if np is None:
+            raise ImportError("VectorizedRelation requires numpy")
+        # The same predicate still works on single values, it just returns a numpy bool
+        super().__init__(variables, satisfies)
+        self._chunk_size = chunk_size
+
+    def memoize(self, maxsize: Optional[int] = 4096, promote: bool = False) -> "VectorizedRelation":
+        raise TypeError("Vectorized predicates take whole arrays, which can't be cached by value")
+
+    def _masks(self, doms: list["np.ndarray"]) -> Iterator[tuple[tuple[int, ...], int, "np.ndarray"]]:
+        """
+        Yields (prefix, start, mask) for chunks of at most chunk_size tuples of the product of doms
+        The first len(prefix) domains are fixed to the values at those indices, and mask[i0, i1, ...] says
+        whether they along with doms[len(prefix)][start + i0], doms[len(prefix) + 1][i1], ... satisfy the relation
+        """
+        n = len(doms)
+        shape = tuple(len(dom) for dom in doms)
+        # The domains after the split axis are evaluated whole by broadcasting, those before it value by value
+        split = n - 1
+        rest = 1
+        while split > 0 and rest * shape[split] <= self._chunk_size:
+            rest *= shape[split]
+            split -= 1
+        rows = max(1, self._chunk_size // rest)
+        # Each domain gets its own axis so the predicate broadcasts over the product of the domains from split
+        grids = [dom.reshape([-1 if j == i else 1 for j in range(split, n)]) for i, dom in enumerate(doms[split:], split)]
+        for prefix in itertools.product(*(range(size) for size in shape[:split])):
+            fixed = [dom[k] for dom, k in zip(doms, prefix)]
+            for start in range(0, shape[split], rows):
+                chunk = fixed + [grids[0][start:start + rows]] + grids[1:]
+                mask = self._satisfies(*(chunk[i] for i in self._positions))
+                yield prefix, start, np.broadcast_to(np.asarray(mask, dtype=bool), (min(rows, shape[split] - start),) + shape[split + 1:])
+
+    @staticmethod
+    def _array(dom) -> "np.ndarray":
+        values = list(dom)
+        if all(isinstance(val, (int, float)) for val in values):
+            return np.array(values)
+        # Non-numeric values go in object arrays, which still broadcast
+        arr = np.empty(len(values), dtype=object)
+        arr[:] = values
+        return arr
+
+    def revise(self, given_space: space.TrailedSpace, modified: Optional[set[variable.Variable]] = None) -> list[variable.Variable]:
+        vars = self._vars
+        doms = [self._array(given_space[var]) for var in vars]
+        if any(len(dom) == 0 for dom in doms):
+            return []
+        n = len(doms)
+        supported = [np.zeros(len(dom), dtype=bool) for dom in doms]
+        for prefix, start, mask in self._masks(doms):
+            if not mask.any():
+                continue
+            for i, k in enumerate(prefix):
+                supported[i][k] = True
+            split = len(prefix)
+            for i in range(split, n):
+                axes = tuple(j for j in range(n - split) if j != i - split)
+                found = mask.any(axis=axes) if axes else mask
+                if i == split:
+                    supported[i][start:start + len(found)] |= found
+                else:
+                    supported[i] |= found
+
+        changed = []
+        for var, dom, sup in zip(vars, doms, supported):
+            if sup.all():
+                continue
+            for val in dom[~sup].tolist():
+                given_space.remove(var, val)
+            changed.append(var)
+        return changed
+
+    def revision_cost(self, given_space: space.Space) -> float:
+        # Vectorized evaluation is far cheaper per tuple than calling a Python predicate
+        return super().revision_cost(given_space) / 64
+
+    def satisfying_assignments(self, given_space: Optional[space.DiscreteSpace] = None) -> Iterator[assignment.Assignment]:
+        if given_space is None:
+            given_space = self._space_type()
+        vars = self._vars
+        doms = [self._array(given_space[var]) for var in vars]
+        if any(len(dom) == 0 for dom in doms):
+            return
+        for prefix, start, mask in self._masks(doms):
+            indices = np.nonzero(mask)
+            split = len(prefix)
+            # tolist turns numpy scalars back into plain Python values
+            columns = ([dom[k:k + 1].tolist() * len(indices[0]) for dom, k in zip(doms, prefix)] + [doms[split][indices[0] + start].tolist()]
+                       + [dom[index].tolist() for dom, index in zip(doms[split + 1:], indices[1:])])
+            for values in zip(*columns):
+                yield assignment.Assignment(dict(zip(vars, values)))